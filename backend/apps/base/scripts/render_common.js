@@ -0,0 +1,44 @@
+const sleep = (ms) => new Promise((r) => setTimeout(r, ms));
+
+const LAUNCH_OPTIONS = {
+  headless: true,
+  args: ["--no-sandbox", "--disable-setuid-sandbox"],
+};
+
+const PDF_OPTIONS = {
+  format: "A4",
+  printBackground: true,
+  margin: { top: "10mm", right: "10mm", bottom: "10mm", left: "10mm" },
+};
+
+// Carga el informe en `page` y devuelve el PDF (Buffer).
+// Compartido por el CLI (render_report_pdf.js) y el servicio (render_server.js).
+async function renderReport(page, url, { timeoutMs = 120000 } = {}) {
+  // Viewport grande para que el PDF salga bien
+  await page.setViewport({ width: 1440, height: 900, deviceScaleFactor: 2 });
+
+  // ✅ Tip: fuerza modo light/dark si quieres
+  // await page.emulateMediaFeatures([{ name: "prefers-color-scheme", value: "dark" }]);
+
+  // Cargar y esperar a que deje de cargar red
+  await page.goto(url, { waitUntil: "networkidle0", timeout: timeoutMs });
+
+  // Espera a que exista el contenedor principal del informe
+  await page.waitForSelector(".results-container", { timeout: Math.min(60000, timeoutMs) });
+
+  // ✅ OPCIÓN A (recomendada): esperar señal "PDF_READY" en el window
+  // Si no existe, cae a la opción B.
+  try {
+    await page.waitForFunction(
+      () => window.__PDF_READY__ === true,
+      { timeout: Math.min(60000, timeoutMs) }
+    );
+  } catch (e) {
+    // ✅ OPCIÓN B: espera extra (recharts + fuentes)
+    await sleep(1500);
+  }
+
+  return Buffer.from(await page.pdf(PDF_OPTIONS));
+}
+
+module.exports = { LAUNCH_OPTIONS, PDF_OPTIONS, renderReport, sleep };
@@ -0,0 +1,249 @@
+// Servicio de render de PDFs con un Chromium caliente.
+//
+//   POST /render  {"url": "..."}  -> 200 application/pdf
+//   GET  /health                  -> estado del pool
+//
+// - 1 navegador + pool de PDF_POOL_SIZE pestañas reutilizadas (sin arranque por PDF)
+// - cola acotada (PDF_QUEUE_MAX): si está llena -> 503 y Django responde "reintenta"
+// - timeout por job (PDF_JOB_TIMEOUT_MS): la pestaña se descarta y se crea otra
+// - cada pestaña se recicla tras PDF_PAGE_MAX_JOBS renders (memoria acotada)
+
+const http = require("http");
+const puppeteer = require("puppeteer");
+
+const { LAUNCH_OPTIONS, renderReport } = require("./render_common");
+
+const env = (name, fallback) => process.env[name] || fallback;
+
+const HOST = env("PDF_RENDERER_HOST", "0.0.0.0");
+const PORT = parseInt(env("PDF_RENDERER_PORT", "3001"), 10);
+const POOL_SIZE = Math.max(1, parseInt(env("PDF_POOL_SIZE", "2"), 10));
+const QUEUE_MAX = Math.max(0, parseInt(env("PDF_QUEUE_MAX", "8"), 10));
+const JOB_TIMEOUT_MS = parseInt(env("PDF_JOB_TIMEOUT_MS", "90000"), 10);
+const PAGE_MAX_JOBS = parseInt(env("PDF_PAGE_MAX_JOBS", "50"), 10);
+// solo se renderizan URLs del frontend (evita usar el servicio como proxy)
+const ALLOWED_URL_PREFIX = env("PDF_ALLOWED_URL_PREFIX", "");
+const MAX_BODY_BYTES = 16 * 1024;
+
+class QueueFullError extends Error {}
+class JobTimeoutError extends Error {}
+
+// =========================
+// Navegador
+// =========================
+let browserPromise = null;
+
+function getBrowser() {
+  if (!browserPromise) {
+    browserPromise = puppeteer.launch(LAUNCH_OPTIONS).then((browser) => {
+      browser.on("disconnected", () => {
+        console.error("[pdf] chromium desconectado, se relanza en el siguiente job");
+        browserPromise = null;
+        // las pestañas ociosas mueren con él; las ocupadas se descartan al liberarse
+        open -= idle.length;
+        idle.length = 0;
+      });
+      return browser;
+    });
+    browserPromise.catch(() => {
+      browserPromise = null;
+    });
+  }
+  return browserPromise;
+}
+
+// =========================
+// Pool de pestañas
+// =========================
+const idle = []; // [{ page, jobs }]
+const waiting = []; // resolvers de acquire()
+let open = 0; // pestañas vivas (idle + en uso)
+let busy = 0;
+
+async function acquire() {
+  const slot = idle.pop();
+  if (slot) return slot;
+
+  if (open < POOL_SIZE) {
+    open += 1;
+    try {
+      const browser = await getBrowser();
+      return { page: await browser.newPage(), jobs: 0 };
+    } catch (err) {
+      open -= 1;
+      throw err;
+    }
+  }
+
+  if (waiting.length >= QUEUE_MAX) {
+    throw new QueueFullError("cola de render llena");
+  }
+  return new Promise((resolve, reject) => waiting.push({ resolve, reject }));
+}
+
+function handOver() {
+  // hay hueco en el pool y alguien esperando
+  const next = waiting.shift();
+  if (next) acquire().then(next.resolve, next.reject);
+}
+
+async function release(slot, { discard }) {
+  slot.jobs += 1;
+  if (discard || slot.jobs >= PAGE_MAX_JOBS || slot.page.isClosed()) {
+    open -= 1;
+    slot.page.close().catch(() => {});
+  } else {
+    try {
+      // suelta el DOM / recharts del informe anterior
+      await slot.page.goto("about:blank");
+      const next = waiting.shift();
+      if (next) return next.resolve(slot);
+      idle.push(slot);
+      return;
+    } catch (err) {
+      open -= 1;
+      slot.page.close().catch(() => {});
+    }
+  }
+  handOver();
+}
+
+function withTimeout(promise, ms, onTimeout) {
+  let timer;
+  const timeout = new Promise((_, reject) => {
+    timer = setTimeout(() => {
+      onTimeout();
+      reject(new JobTimeoutError(`render > ${ms} ms`));
+    }, ms);
+  });
+  return Promise.race([promise, timeout]).finally(() => clearTimeout(timer));
+}
+
+async function render(url) {
+  const slot = await acquire();
+  busy += 1;
+  let discard = false;
+  try {
+    return await withTimeout(renderReport(slot.page, url, { timeoutMs: JOB_TIMEOUT_MS }), JOB_TIMEOUT_MS, () => {
+      // la pestaña queda en estado desconocido: fuera del pool
+      discard = true;
+      slot.page.close().catch(() => {});
+    });
+  } catch (err) {
+    discard = true;
+    throw err;
+  } finally {
+    busy -= 1;
+    await release(slot, { discard });
+  }
+}
+
+// =========================
+// HTTP
+// =========================
+function sendJson(res, statusCode, payload) {
+  const body = JSON.stringify(payload);
+  res.writeHead(statusCode, { "Content-Type": "application/json", "Content-Length": Buffer.byteLength(body) });
+  res.end(body);
+}
+
+function readJson(req) {
+  return new Promise((resolve, reject) => {
+    let size = 0;
+    const chunks = [];
+    req.on("data", (chunk) => {
+      size += chunk.length;
+      if (size > MAX_BODY_BYTES) {
+        reject(new Error("body demasiado grande"));
+        req.destroy();
+        return;
+      }
+      chunks.push(chunk);
+    });
+    req.on("end", () => {
+      try {
+        resolve(JSON.parse(Buffer.concat(chunks).toString("utf-8") || "{}"));
+      } catch (err) {
+        reject(err);
+      }
+    });
+    req.on("error", reject);
+  });
+}
+
+async function handleRender(req, res) {
+  let payload;
+  try {
+    payload = await readJson(req);
+  } catch (err) {
+    return sendJson(res, 400, { error: "JSON inválido" });
+  }
+
+  const url = typeof payload.url === "string" ? payload.url : "";
+  if (!/^https?:\/\//.test(url) || (ALLOWED_URL_PREFIX && !url.startsWith(ALLOWED_URL_PREFIX))) {
+    return sendJson(res, 400, { error: "url no permitida" });
+  }
+
+  const started = Date.now();
+  try {
+    const pdf = await render(url);
+    res.writeHead(200, {
+      "Content-Type": "application/pdf",
+      "Content-Length": pdf.length,
+      "X-Render-Ms": String(Date.now() - started),
+    });
+    res.end(pdf);
+  } catch (err) {
+    if (err instanceof QueueFullError) {
+      res.setHeader("Retry-After", "5");
+      return sendJson(res, 503, { error: err.message });
+    }
+    if (err instanceof JobTimeoutError) {
+      return sendJson(res, 504, { error: err.message });
+    }
+    console.error("[pdf] error renderizando", url, err);
+    return sendJson(res, 500, { error: String((err && err.message) || err) });
+  }
+}
+
+const server = http.createServer((req, res) => {
+  if (req.method === "POST" && req.url === "/render") {
+    return handleRender(req, res);
+  }
+  if (req.method === "GET" && req.url === "/health") {
+    return sendJson(res, 200, {
+      pool_size: POOL_SIZE,
+      open,
+      busy,
+      idle: idle.length,
+      queued: waiting.length,
+      queue_max: QUEUE_MAX,
+    });
+  }
+  return sendJson(res, 404, { error: "not found" });
+});
+
+// el job puede tardar más que el timeout por defecto de node
+server.requestTimeout = JOB_TIMEOUT_MS + 30000;
+
+server.listen(PORT, HOST, () => {
+  console.log(`[pdf] render server en ${HOST}:${PORT} (pool=${POOL_SIZE}, cola=${QUEUE_MAX})`);
+  // arranque en caliente: el primer PDF no paga el launch de Chromium
+  getBrowser().catch((err) => console.error("[pdf] no se pudo lanzar chromium", err));
+});
+
+async function shutdown() {
+  server.close();
+  for (const { reject } of waiting.splice(0)) reject(new Error("apagando"));
+  if (browserPromise) {
+    try {
+      await (await browserPromise).close();
+    } catch (err) {
+      // ya cerrado
+    }
+  }
+  process.exit(0);
+}
+
+process.on("SIGTERM", shutdown);
+process.on("SIGINT", shutdown);
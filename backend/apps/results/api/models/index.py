@@ -20,6 +20,12 @@ class Evaluation(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     completed_at = models.DateTimeField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # listado paginado por cursor (más recientes primero)
+            models.Index(fields=["-created_at", "-id"], name="results_eval_created_idx"),
+        ]
+
     def __str__(self):
         return f"{self.product_type} ({self.uuid})"
 
@@ -30,7 +36,14 @@ class InformeDataUsers(models.Model):
     nombre = models.CharField(max_length=255)
     email = models.EmailField()
     movil = models.CharField(max_length=20)
-    
+
+    class Meta:
+        indexes = [
+            # paginación keyset por (campo, id) en el listado de leads
+            models.Index(fields=["nombre", "id"], name="results_lead_nombre_id_idx"),
+            models.Index(fields=["email", "id"], name="results_lead_email_id_idx"),
+        ]
+
     def __str__(self):
         return f"{self.nombre} <{self.email}>"
 class EvaluationCriterion(models.Model):
@@ -64,6 +77,9 @@ class PromptRun(models.Model):
         related_name="prompt_runs",
     )
 
+    # posición dentro de la fase: permutación (PHASE1) o muestra del criterio (PHASE2), 0..4
+    slot = models.PositiveSmallIntegerField(null=True, blank=True)
+
     prompt_text = models.TextField()
     response_raw = models.TextField(null=True, blank=True)
 
@@ -77,8 +93,9 @@ class PromptRun(models.Model):
 
 
 class RankingItem(models.Model):
+    # sin índice propio: lo cubre results_item_run_pos_idx (prompt_run, position)
     prompt_run = models.ForeignKey(
-        PromptRun, on_delete=models.CASCADE, related_name="items"
+        PromptRun, on_delete=models.CASCADE, related_name="items", db_index=False
     )
 
     position = models.PositiveIntegerField()  # 1..5
@@ -86,6 +103,31 @@ class RankingItem(models.Model):
     model = models.CharField(max_length=255)
     raw_text = models.CharField(max_length=500)
 
+    # ✅ claves normalizadas (services/normalization.py), se rellenan al escribir:
+    #    GROUP BY / búsquedas por marca en SQL sin normalizar en Python
+    brand_key = models.CharField(max_length=255, blank=True, default="")
+    model_key = models.CharField(max_length=255, blank=True, default="")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["brand_key"], name="results_item_brand_key_idx"),
+            models.Index(fields=["prompt_run", "position"], name="results_item_run_pos_idx"),
+        ]
+
+    def fill_keys(self):
+        from apps.results.services.normalization import item_keys
+
+        self.brand_key, self.model_key = item_keys(self.brand, self.model)
+
+    def save(self, *args, **kwargs):
+        # siempre: si cambia brand/model las claves no pueden quedarse viejas
+        # (bulk_create / update() no pasan por aquí: persistence.py llama a fill_keys())
+        self.fill_keys()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            kwargs["update_fields"] = {*update_fields, "brand_key", "model_key"}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.brand} {self.model} ({self.position})"
 
@@ -108,3 +150,166 @@ class RankingSummary(models.Model):
         return f"{self.phase} {self.brand} ({self.evaluation.uuid})"
 
 
+
+
+class EvaluationJob(models.Model):
+    """
+    Cola de ejecuciones en Postgres.
+    Los workers (manage.py run_evaluation_worker) reclaman jobs con
+    SELECT ... FOR UPDATE SKIP LOCKED.
+    """
+
+    STATUS_CHOICES = [
+        ("QUEUED", "QUEUED"),
+        ("RUNNING", "RUNNING"),
+        ("DONE", "DONE"),
+        ("FAILED", "FAILED"),
+    ]
+
+    evaluation = models.ForeignKey(
+        Evaluation, on_delete=models.CASCADE, related_name="jobs"
+    )
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="QUEUED")
+    options = models.JSONField(default=dict, blank=True)
+
+    attempts = models.PositiveIntegerField(default=0)
+    worker_id = models.CharField(max_length=255, blank=True, default="")
+    error = models.TextField(null=True, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # solo los jobs pendientes: el índice que usa el worker al reclamar
+            models.Index(
+                fields=["created_at"],
+                name="results_job_queued_idx",
+                condition=models.Q(status="QUEUED"),
+            ),
+            models.Index(fields=["status", "heartbeat_at"], name="results_job_status_hb_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.status} job #{self.pk} ({self.evaluation.uuid})"
+
+
+class EvaluationEvent(models.Model):
+    """
+    Progreso de una ejecución (lo lee el stream SSE /events/).
+    kind: "start" | "run" (un PromptRun terminado) | "complete"
+    """
+
+    evaluation = models.ForeignKey(
+        Evaluation, on_delete=models.CASCADE, related_name="events"
+    )
+
+    kind = models.CharField(max_length=20)
+    payload = models.JSONField(default=dict, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["evaluation", "id"], name="results_event_eval_id_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.evaluation.uuid})"
+
+
+class CompletionCacheEntry(models.Model):
+    """
+    Caché de respuestas de completion_with_web_search (opt-in).
+    key = sha256(modelo + prompt normalizado + ventana de tiempo + variante)
+    """
+
+    key = models.CharField(max_length=64, unique=True)
+    model = models.CharField(max_length=100)
+
+    output_text = models.TextField()
+    sources = models.JSONField(default=list, blank=True)
+
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(db_index=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.model} {self.key[:12]} ({self.hits} hits)"
+
+
+class CompletionCacheStats(models.Model):
+    """Contadores diarios de hits/misses de la caché (compartidos entre workers)."""
+
+    day = models.DateField(unique=True)
+    hits = models.PositiveIntegerField(default=0)
+    misses = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.day}: {self.hits} hits / {self.misses} misses"
+
+
+class ReportSnapshot(models.Model):
+    """
+    Informe (build_report) materializado al terminar la evaluación en SUCCESS.
+    Si cambian las reglas de scoring se sube SCORING_VERSION y se reconstruye.
+    """
+
+    evaluation = models.OneToOneField(
+        Evaluation, on_delete=models.CASCADE, related_name="report_snapshot"
+    )
+    scoring_version = models.PositiveIntegerField()
+    payload = models.JSONField()
+    etag = models.CharField(max_length=80)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Snapshot {self.evaluation_id} v{self.scoring_version}"
+
+
+class BrandDailyRollup(models.Model):
+    """
+    Agregado diario entre evaluaciones (services/rollups.py) para tendencias
+    de marca sin recorrer RankingItem.
+    Una fila = una marca en (día, product_type, país, fase, criterio).
+    Al terminar una evaluación se recalcula su grupo (día, product_type, país).
+    """
+
+    day = models.DateField()
+    # claves normalizadas (clean_text + casefold); "" = sin país / PHASE1
+    product_type = models.CharField(max_length=255)
+    country = models.CharField(max_length=100, blank=True, default="")
+    phase = models.CharField(max_length=10)
+    criterion = models.CharField(max_length=255, blank=True, default="")
+
+    brand_key = models.CharField(max_length=255)
+    brand = models.CharField(max_length=255)
+
+    points = models.PositiveIntegerField(default=0)
+    appearances = models.PositiveIntegerField(default=0)
+    # runs en los que aparece la marca / runs del grupo (denominador de presencia)
+    runs = models.PositiveIntegerField(default=0)
+    total_runs = models.PositiveIntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["day", "product_type", "country", "phase", "criterion", "brand_key"],
+                name="results_rollup_unique",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["product_type", "country", "day"], name="results_rollup_pt_day_idx"),
+            models.Index(fields=["brand_key", "day"], name="results_rollup_brand_day_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.product_type} {self.phase} {self.brand} ({self.points})"
@@ -9,7 +9,10 @@ from apps.results.api.views.index import (
     EvaluationReportView,
     InformeDataUsersExportAPIView,
     InformeDataUsersAPIView,
-    EvaluationReportPDFView
+    EvaluationReportPDFView,
+    EvaluationEventsView,
+    EvaluationProgressView,
+    BrandAnalyticsView,
 )
 
 urlpatterns = [
@@ -19,8 +22,11 @@ urlpatterns = [
     path("results/create/", EvaluationCreateView.as_view(), name="evaluation-create"),
     path("results/<uuid:uuid>/", EvaluationDetailView.as_view(), name="evaluation-detail"),
     path("results/<uuid:uuid>/run/", RunEvaluationView.as_view(), name="evaluation-run"),
+    path("results/<uuid:uuid>/events/", EvaluationEventsView.as_view(), name="evaluation-events"),
+    path("results/<uuid:uuid>/progress/", EvaluationProgressView.as_view(), name="evaluation-progress"),
     path("results/<uuid:uuid>/report/", EvaluationReportView.as_view()),
      path("results/report/users/", InformeDataUsersAPIView.as_view(), name="results-report-users"),
        path("results/<uuid:uuid>/report/pdf/", EvaluationReportPDFView.as_view(), name="report-pdf"),
     path("results/report/users/export/", InformeDataUsersExportAPIView.as_view(), name="results-report-users-export"),
+    path("results/analytics/brands/", BrandAnalyticsView.as_view(), name="results-analytics-brands"),
 ]
\ No newline at end of file
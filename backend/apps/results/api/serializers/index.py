@@ -34,6 +34,7 @@ class PromptRunSerializer(serializers.ModelSerializer):
             "id",
             "phase",
             "criterion",
+            "slot",
             "prompt_text",
             "response_raw",
             "created_at",
@@ -66,6 +67,103 @@ class EvaluationSerializer(serializers.ModelSerializer):
         ]
 
 
+class PromptRunDetailSerializer(PromptRunSerializer):
+    """PromptRunSerializer recortable: context["run_fields"] = campos a devolver."""
+
+    def get_fields(self):
+        fields = super().get_fields()
+        keep = self.context.get("run_fields")
+        if keep is not None:
+            for name in list(fields):
+                if name not in keep:
+                    fields.pop(name)
+        return fields
+
+
+class EvaluationDetailSerializer(EvaluationSerializer):
+    """
+    Detalle con proyección (?fields= / ?include=): context["fields"] = campos
+    de primer nivel a devolver. Sin proyección se usa EvaluationSerializer.
+    """
+
+    SCALAR_FIELDS = (
+        "uuid",
+        "product_type",
+        "status",
+        "country",
+        "location",
+        "created_at",
+        "completed_at",
+    )
+
+    prompt_runs = PromptRunDetailSerializer(many=True, read_only=True)
+
+    class Meta(EvaluationSerializer.Meta):
+        fields = [
+            "uuid",
+            "product_type",
+            "status",
+            "country",
+            "location",
+            "created_at",
+            "completed_at",
+            "criteria",
+            "prompt_runs",
+            "summary",
+        ]
+
+    def get_fields(self):
+        fields = super().get_fields()
+        keep = self.context.get("fields")
+        if keep is not None:
+            for name in list(fields):
+                if name not in keep:
+                    fields.pop(name)
+        return fields
+
+
+class EvaluationListSerializer(serializers.ModelSerializer):
+    """
+    Fila ligera para el listado: sin prompts ni respuestas.
+    criteria / prompt_runs / summary solo si se piden en context["include"]
+    (la vista hace el prefetch correspondiente).
+    """
+
+    INCLUDABLE = ("criteria", "prompt_runs", "summary")
+
+    criteria_count = serializers.IntegerField(read_only=True)
+    runs_count = serializers.IntegerField(read_only=True)
+
+    criteria = EvaluationCriterionSerializer(many=True, read_only=True)
+    prompt_runs = PromptRunSerializer(many=True, read_only=True)
+    summary = RankingSummarySerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Evaluation
+        fields = [
+            "uuid",
+            "product_type",
+            "status",
+            "country",
+            "location",
+            "created_at",
+            "completed_at",
+            "criteria_count",
+            "runs_count",
+            "criteria",
+            "prompt_runs",
+            "summary",
+        ]
+
+    def get_fields(self):
+        fields = super().get_fields()
+        include = self.context.get("include", ())
+        for name in self.INCLUDABLE:
+            if name not in include:
+                fields.pop(name, None)
+        return fields
+
+
 class EvaluationCreateSerializer(serializers.Serializer):
     product_type = serializers.CharField()
     criteria = serializers.ListField(
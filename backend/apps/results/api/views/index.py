@@ -1,6 +1,3 @@
-from itertools import permutations
-import random
-
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 
@@ -8,7 +5,6 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 
-from toon_format import decode
 from collections import Counter
 from apps.results.api.models.index import (
     Evaluation,
@@ -21,18 +17,22 @@ from django.db import transaction
 from apps.results.api.serializers.index import (
     EvaluationSerializer,
     EvaluationCreateSerializer,
+    EvaluationListSerializer,
+    EvaluationDetailSerializer,
 )
-
-from apps.results.services.prompts import (
-    prompt_toon_phase1,
-    prompt_toon_phase2,
+from django.db.models import Count, IntegerField, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce
+from rest_framework.pagination import CursorPagination
+
+from apps.results.services.runner import EvaluationRunError, execute_evaluation
+from apps.results.services.jobs import clear_evaluation_results, enqueue_evaluation
+from apps.results.services.progress import (
+    aiter_evaluation_events,
+    clear_events,
+    evaluation_progress,
+    iter_evaluation_events,
 )
 
-from apps.results.services.scoring import compute_brand_summary
-from apps.results.services.parse_ranking import parse_ranking
-
-from apps.results.utils.open_ai_client import completion_with_web_search
-
 
 
 from django.http import HttpResponse
@@ -46,6 +46,7 @@ from rest_framework.filters import SearchFilter, OrderingFilter
 from django_filters.rest_framework import DjangoFilterBackend
 
 from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Font, Alignment
 from openpyxl.utils import get_column_letter
 
@@ -54,40 +55,57 @@ from apps.results.api.serializers.index import InformeDataUsersCreateSerializer,
 
 
 from apps.results.api.models.index import Evaluation
-from apps.results.services.report import build_report
+from apps.results.services.evaluation_cache import get_or_build, invalidate_evaluation_cache
+from apps.results.services.lead_pagination import (
+    InvalidCursor,
+    count_leads,
+    get_count_mode,
+    get_lead_ordering,
+    keyset_page,
+)
+from apps.results.services.lead_search import lead_search_q
+from apps.results.services import rollups
+from apps.results.services import pdf_cache
+from apps.results.services.pdf_renderer import (
+    PdfRenderError,
+    PdfRendererBusy,
+    get_renderer,
+    render_report_pdf,
+    render_report_pdf_native,
+)
+from apps.results.services.scoring import SCORING_VERSION
+from apps.results.services.snapshots import (
+    etag_matches,
+    get_report_payload,
+    get_snapshot_row,
+    invalidate_report_snapshot,
+)
 
 
 
-import os
+import csv
+import json
 import tempfile
-import subprocess
+from datetime import date, timedelta
 
 from django.conf import settings
-from django.http import FileResponse, HttpResponse
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
 from rest_framework.views import APIView
 from rest_framework.permissions import AllowAny
+from rest_framework.renderers import BaseRenderer, JSONRenderer
 
-# ✅ helper para seleccionar 5 permutaciones sin repetir el mismo inicio
-def select_permutations_unique_start(permutations_list, count=5):
-    selected = []
-    used_first = set()
+def _is_truthy(value) -> bool:
+    return str(value).strip().lower() in {"1", "true", "yes", "on"}
 
-    random.shuffle(permutations_list)
 
-    for perm in permutations_list:
-        if perm[0] not in used_first:
-            selected.append(perm)
-            used_first.add(perm[0])
-        if len(selected) == count:
-            break
+def _run_option(request, name):
+    """Opción de ejecución: query string primero, luego body JSON."""
+    value = request.query_params.get(name)
+    if value is None and hasattr(request.data, "get"):
+        value = request.data.get(name)
+    return value
 
-    for perm in permutations_list:
-        if perm not in selected:
-            selected.append(perm)
-        if len(selected) == count:
-            break
-
-    return selected
 
 class EvaluationCreateView(APIView):
     def post(self, request):
@@ -97,47 +115,227 @@ class EvaluationCreateView(APIView):
         country = serializer.validated_data.get("country", "").strip() or None
         location = serializer.validated_data.get("location", "").strip() or None
 
-        evaluation = Evaluation.objects.create(
-            product_type=serializer.validated_data["product_type"],
-            status="PENDING",
-            country=country,
-            location=location,
-        )
-
-        for idx, c in enumerate(serializer.validated_data["criteria"], start=1):
-            EvaluationCriterion.objects.create(
-                evaluation=evaluation,
-                name=c,
-                order=idx,
+        # ✅ evaluación + criterios: 2 INSERT en una sola transacción
+        with transaction.atomic():
+            evaluation = Evaluation.objects.create(
+                product_type=serializer.validated_data["product_type"],
+                status="PENDING",
+                country=country,
+                location=location,
             )
 
+            EvaluationCriterion.objects.bulk_create([
+                EvaluationCriterion(
+                    evaluation=evaluation,
+                    name=c,
+                    order=idx,
+                )
+                for idx, c in enumerate(serializer.validated_data["criteria"], start=1)
+            ])
+
         return Response(
             {"uuid": str(evaluation.uuid), "status": evaluation.status},
             status=status.HTTP_201_CREATED,
         )
 
 
+# ?include= del detalle. items / bodies implican runs.
+DETAIL_INCLUDES = ("criteria", "runs", "items", "bodies", "summary")
+RUN_LIGHT_FIELDS = ("id", "phase", "criterion", "slot", "created_at")
+RUN_BODY_FIELDS = ("prompt_text", "response_raw")
+ITEM_FIELDS = ("id", "prompt_run", "position", "brand", "model", "raw_text")
+
+
+def _split_param(request, name):
+    raw = request.query_params.get(name)
+    if raw is None:
+        return None
+    return [p for p in dict.fromkeys(p.strip() for p in raw.split(",")) if p]
+
+
+def _detail_plan(request):
+    """
+    None -> salida completa de siempre. Si no, dict con:
+      scalar (campos de evaluación), include (relaciones) y la clave de caché.
+    ?fields= también acepta criteria / runs / summary como atajo de include.
+    """
+    fields = _split_param(request, "fields")
+    include = _split_param(request, "include")
+    if fields is None and include is None:
+        return None
+
+    fields = fields or []
+    include = {name for name in (include or []) + fields if name in DETAIL_INCLUDES}
+    if include & {"items", "bodies"}:
+        include.add("runs")
+
+    scalar = [f for f in fields if f in EvaluationDetailSerializer.SCALAR_FIELDS]
+    if not scalar:
+        scalar = list(EvaluationDetailSerializer.SCALAR_FIELDS)
+
+    return {
+        "scalar": scalar,
+        "include": include,
+        "cache_kind": f"detail:{','.join(scalar)}:{','.join(sorted(include))}",
+    }
+
+
+def _runs_prefetch(with_bodies: bool, with_items: bool):
+    """Un prefetch (runs) + otro opcional (items), con only() para no traer de más."""
+    run_fields = ["evaluation", *RUN_LIGHT_FIELDS] + (list(RUN_BODY_FIELDS) if with_bodies else [])
+    runs_qs = PromptRun.objects.only(*run_fields).order_by("id")
+    if with_items:
+        runs_qs = runs_qs.prefetch_related(
+            Prefetch("items", queryset=RankingItem.objects.only(*ITEM_FIELDS).order_by("position"))
+        )
+    return Prefetch("prompt_runs", queryset=runs_qs)
+
+
 class EvaluationDetailView(APIView):
     """
     GET /api/results/<uuid>/
+
+    Sin parámetros: el JSON completo de siempre (criterios, runs con prompt
+    y respuesta, items y summary), con un plan de consultas constante.
+
+    Proyección:
+      ?fields=uuid,status,completed_at  -> solo esos campos de la evaluación
+      ?include=criteria,runs,items,bodies,summary
+        runs   -> runs ligeros (sin prompt_text / response_raw)
+        items  -> + items de cada run
+        bodies -> + prompt_text / response_raw
+    Caso típico del frontend: ?fields=uuid,status,completed_at&include=summary
     """
 
     def get(self, request, uuid):
-        evaluation = get_object_or_404(Evaluation, uuid=uuid)
-        serializer = EvaluationSerializer(evaluation)
-        return Response(serializer.data)
+        plan = _detail_plan(request)
+
+        if plan is None:
+            def build():
+                qs = Evaluation.objects.prefetch_related(
+                    Prefetch("criteria", queryset=EvaluationCriterion.objects.order_by("order")),
+                    _runs_prefetch(with_bodies=True, with_items=True),
+                    Prefetch("summary", queryset=RankingSummary.objects.order_by("id")),
+                )
+                return EvaluationSerializer(get_object_or_404(qs, uuid=uuid)).data
+
+            return Response(get_or_build(uuid, "detail", build))
+
+        include = plan["include"]
+
+        def build():
+            qs = Evaluation.objects.only("id", *plan["scalar"])
+            if "criteria" in include:
+                qs = qs.prefetch_related(
+                    Prefetch("criteria", queryset=EvaluationCriterion.objects.order_by("order"))
+                )
+            if "runs" in include:
+                qs = qs.prefetch_related(
+                    _runs_prefetch(with_bodies="bodies" in include, with_items="items" in include)
+                )
+            if "summary" in include:
+                qs = qs.prefetch_related(
+                    Prefetch("summary", queryset=RankingSummary.objects.order_by("id"))
+                )
+
+            run_fields = set(RUN_LIGHT_FIELDS)
+            if "bodies" in include:
+                run_fields.update(RUN_BODY_FIELDS)
+            if "items" in include:
+                run_fields.add("items")
+
+            fields = set(plan["scalar"])
+            fields.update({"runs": "prompt_runs"}.get(name, name) for name in include & {"criteria", "runs", "summary"})
+
+            serializer = EvaluationDetailSerializer(
+                get_object_or_404(qs, uuid=uuid),
+                context={"request": request, "fields": fields, "run_fields": run_fields},
+            )
+            return serializer.data
+
+        return Response(get_or_build(uuid, plan["cache_kind"], build))
+
+
+class EvaluationCursorPagination(CursorPagination):
+    # cursor sobre (created_at, id) con índice -> coste constante por página
+    ordering = ("-created_at", "-id")
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+
+# ?include= -> (campo del serializer, prefetch)
+LIST_INCLUDES = {
+    "criteria": ("criteria", Prefetch("criteria", queryset=EvaluationCriterion.objects.order_by("order"))),
+    "runs": (
+        "prompt_runs",
+        Prefetch(
+            "prompt_runs",
+            queryset=PromptRun.objects.order_by("slot", "created_at", "id").prefetch_related(
+                Prefetch("items", queryset=RankingItem.objects.order_by("position"))
+            ),
+        ),
+    ),
+    "summary": ("summary", Prefetch("summary", queryset=RankingSummary.objects.order_by("id"))),
+}
+LIST_INCLUDES["prompt_runs"] = LIST_INCLUDES["runs"]
+
+
+def _parse_include(request, includes) -> list:
+    """
+    Nombres de ?include= válidos, uno por relación: runs y prompt_runs son
+    alias del mismo Prefetch y Django no admite registrarlo dos veces.
+    """
+    raw = request.query_params.get("include") or ""
+    by_relation = {}
+    for name in (p.strip() for p in raw.split(",")):
+        if name in includes:
+            by_relation.setdefault(includes[name][0], name)
+    return list(by_relation.values())
+
+
+def _count_subquery(model):
+    """COUNT correlacionado: solo se calcula para las filas de la página."""
+    return Coalesce(
+        Subquery(
+            model.objects.filter(evaluation=OuterRef("pk"))
+            .order_by()
+            .values("evaluation")
+            .annotate(n=Count("id"))
+            .values("n")[:1],
+            output_field=IntegerField(),
+        ),
+        0,
+    )
 
 
 class EvaluationListView(APIView):
     """
-    GET /api/results/
-    Lista todas las evaluaciones
+    GET /api/results/?page_size=20&cursor=...
+    Lista paginada (cursor) y ligera: uuid, producto, estado, geo, fechas y contadores.
+
+    ?include=criteria,runs,summary añade los datos anidados (con prefetch).
     """
 
     def get(self, request):
-        evaluations = Evaluation.objects.all().order_by("-created_at")
-        serializer = EvaluationSerializer(evaluations, many=True)
-        return Response(serializer.data)
+        include = _parse_include(request, LIST_INCLUDES)
+
+        evaluations = Evaluation.objects.annotate(
+            criteria_count=_count_subquery(EvaluationCriterion),
+            runs_count=_count_subquery(PromptRun),
+        )
+        for name in include:
+            evaluations = evaluations.prefetch_related(LIST_INCLUDES[name][1])
+
+        paginator = EvaluationCursorPagination()
+        page = paginator.paginate_queryset(evaluations, request, view=self)
+
+        serializer = EvaluationListSerializer(
+            page,
+            many=True,
+            context={"request": request, "include": {LIST_INCLUDES[name][0] for name in include}},
+        )
+        return paginator.get_paginated_response(serializer.data)
 
 
 class JsonToToonView(APIView):
@@ -159,9 +357,33 @@ class JsonToToonView(APIView):
 
 
 class RunEvaluationView(APIView):
+    """
+    POST /api/results/<uuid>/run/
+
+    Por defecto encola un job y responde 202 al instante; la ejecución la hace
+    un worker (manage.py run_evaluation_worker).
+    Con EVALUATION_BACKGROUND_JOBS=False se ejecuta dentro de la request (dev).
+
+    ?resume=1 (o {"resume": true}): conserva los runs válidos y solo repite
+    los prompts que faltan o fallaron.
+
+    ?cache=1|0: fuerza usar / saltar la caché de respuestas (por defecto settings).
+    ?cache_samples=bypass|per_sample|shared: qué hacer con las 5 muestras
+    repetidas de PHASE2 (bypass conserva la diversidad del muestreo).
+    """
 
     def post(self, request, uuid):
 
+        background = getattr(settings, "EVALUATION_BACKGROUND_JOBS", True)
+        resume = _is_truthy(_run_option(request, "resume"))
+
+        cache = _run_option(request, "cache")
+        options = {
+            "resume": resume,
+            "cache": None if cache in (None, "") else _is_truthy(cache),
+            "cache_samples": _run_option(request, "cache_samples") or None,
+        }
+
         # ==========================
         # ✅ LOCK POR UUID (evita dobles ejecuciones)
         # ==========================
@@ -176,155 +398,49 @@ class RunEvaluationView(APIView):
                 )
 
             # ✅ Reset seguro antes de correr
+            # (grupo del rollup antes del reset: deja de contar esta evaluación)
+            previous_group = rollups.rollup_group(evaluation)
             evaluation.status = "PROCESSING"
             evaluation.completed_at = None
             evaluation.save()
-
-            # ✅ Limpiar runs anteriores dentro del lock
-            PromptRun.objects.filter(evaluation=evaluation).delete()
-            RankingItem.objects.filter(prompt_run__evaluation=evaluation).delete()
-            RankingSummary.objects.filter(evaluation=evaluation).delete()
+            # ✅ caché de informe/detalle: versión nueva al confirmar
+            transaction.on_commit(lambda: invalidate_evaluation_cache(evaluation))
+            if previous_group is not None:
+                transaction.on_commit(lambda: rollups.safe_refresh_rollup_group(previous_group))
+
+            # ✅ Limpiar runs anteriores dentro del lock (salvo resume)
+            if not resume:
+                clear_evaluation_results(evaluation)
+            clear_events(evaluation)
+            invalidate_report_snapshot(evaluation)
+
+            # ✅ El job se crea en la misma transacción que el PROCESSING
+            if background:
+                job = enqueue_evaluation(evaluation, options)
+
+        if background:
+            return Response(
+                {"status": evaluation.status, "uuid": str(evaluation.uuid), "job_id": job.id},
+                status=status.HTTP_202_ACCEPTED,
+            )
 
         # ==========================
-        # ✅ Ya salimos del lock, empieza el proceso real
+        # ✅ Modo inline: ya salimos del lock, empieza el proceso real
         # ==========================
 
         try:
-            criteria_qs = evaluation.criteria.all().order_by("order")
-            criteria = [c.name for c in criteria_qs]
-
-            if len(criteria) < 2:
-                evaluation.status = "ERROR"
-                evaluation.save()
-                return Response(
-                    {"error": "Se requieren mínimo 2 criterios"},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-
-            # =========================
-            # ✅ PHASE 1 (5 permutaciones)
-            # =========================
-            all_perms = list(permutations(criteria, len(criteria)))
-            selected_perms = select_permutations_unique_start(all_perms, 5)
-
-            for perm in selected_perms:
-                criteria_str = ", ".join(perm)
-
-                prompt = prompt_toon_phase1(
-                    evaluation.product_type,
-                    criteria_str,
-                    country=evaluation.country,
-                    location=evaluation.location
-                )
-
-                toon_text, sources = completion_with_web_search(prompt)
-
-                try:
-                    decoded = decode(toon_text)
-                except Exception as e:
-                    evaluation.status = "ERROR"
-                    evaluation.save()
-                    return Response(
-                        {"error": "TOON inválido PHASE1", "toon": toon_text, "details": str(e)},
-                        status=status.HTTP_400_BAD_REQUEST,
-                    )
-
-                parsed = parse_ranking(decoded)
-                if not parsed or len(parsed) != 5:
-                    evaluation.status = "ERROR"
-                    evaluation.save()
-                    return Response(
-                        {"error": "ranking inválido PHASE1", "decoded": decoded, "toon": toon_text},
-                        status=status.HTTP_400_BAD_REQUEST,
-                    )
-
-                run = PromptRun.objects.create(
-                    evaluation=evaluation,
-                    phase="PHASE1",
-                    prompt_text=prompt,
-                    response_raw=toon_text,
-                    sources=sources,
-                )
-
-                for item in parsed:
-                    RankingItem.objects.create(
-                        prompt_run=run,
-                        position=item["position"],
-                        brand=item["brand"],
-                        model=item["model"],
-                        raw_text=item["raw_text"],
-                    )
-
-            compute_brand_summary(evaluation, phase="PHASE1")
-
-            # =========================
-            # ✅ PHASE 2 (5 prompts por criterio SIEMPRE)
-            # =========================
-            for criterion_obj in criteria_qs:
-                for _ in range(5):
-
-                    prompt = prompt_toon_phase2(
-                        evaluation.product_type,
-                        criterion_obj.name,
-                        country=evaluation.country,
-                        location=evaluation.location
-                    )
-
-                    toon_text, sources = completion_with_web_search(prompt)
-
-                    try:
-                        decoded = decode(toon_text)
-                    except Exception as e:
-                        evaluation.status = "ERROR"
-                        evaluation.save()
-                        return Response(
-                            {"error": "TOON inválido PHASE2", "toon": toon_text, "details": str(e)},
-                            status=status.HTTP_400_BAD_REQUEST,
-                        )
-
-                    parsed = parse_ranking(decoded)
-                    if not parsed or len(parsed) != 5:
-                        evaluation.status = "ERROR"
-                        evaluation.save()
-                        return Response(
-                            {"error": "ranking inválido PHASE2", "decoded": decoded, "toon": toon_text},
-                            status=status.HTTP_400_BAD_REQUEST,
-                        )
-
-                    run = PromptRun.objects.create(
-                        evaluation=evaluation,
-                        phase="PHASE2",
-                        criterion=criterion_obj,
-                        prompt_text=prompt,
-                        response_raw=toon_text,
-                        sources=sources,
-                    )
-
-                    for item in parsed:
-                        RankingItem.objects.create(
-                            prompt_run=run,
-                            position=item["position"],
-                            brand=item["brand"],
-                            model=item["model"],
-                            raw_text=item["raw_text"],
-                        )
-
-                compute_brand_summary(evaluation, phase="PHASE2", criterion=criterion_obj)
-
-            # ✅ SUCCESS
-            evaluation.status = "SUCCESS"
-            evaluation.completed_at = timezone.now()
-            evaluation.save()
+            execute_evaluation(evaluation, **options)
 
             return Response(
                 {"status": evaluation.status, "uuid": str(evaluation.uuid)},
                 status=status.HTTP_200_OK,
             )
 
+        except EvaluationRunError as e:
+            return Response(e.payload, status=e.http_status)
+
         except Exception as e:
-            # ✅ Cualquier fallo inesperado → marca ERROR
-            evaluation.status = "ERROR"
-            evaluation.save()
+            # ✅ Cualquier fallo inesperado → ya marcado ERROR por el runner
             return Response(
                 {"error": "Error inesperado ejecutando evaluación", "details": str(e)},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -332,16 +448,123 @@ class RunEvaluationView(APIView):
 
 
 
-class EvaluationReportView(APIView):
+class EventStreamRenderer(BaseRenderer):
+    media_type = "text/event-stream"
+    format = "sse"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # solo se usa para errores (404); el stream va por StreamingHttpResponse
+        return json.dumps(data, ensure_ascii=False).encode(self.charset)
+
+
+def _last_event_id(request) -> int:
+    value = request.headers.get("Last-Event-ID") or request.GET.get("last_event_id") or 0
+    try:
+        return max(0, int(value))
+    except (TypeError, ValueError):
+        return 0
+
+
+class EvaluationEventsView(APIView):
+    """
+    GET /api/results/<uuid>/events/
+    Server-Sent Events con el progreso de la ejecución:
+      - start:    {total, resume}
+      - run:      {phase, criterion, slot, latency, valid, done, total}
+      - ping:     {} (keepalive)
+      - complete: {status, completed_at}
+    Soporta Last-Event-ID (o ?last_event_id=) para reconectar sin perder eventos.
+    En producción nginx lo envía al proceso ASGI (servicio "events"): ahí el
+    stream es async y no ocupa un worker de gunicorn.
+    """
+    permission_classes = [AllowAny]
+    renderer_classes = [EventStreamRenderer, JSONRenderer]
+
     def get(self, request, uuid):
+        evaluation_id = (
+            Evaluation.objects.filter(uuid=uuid).values_list("id", flat=True).first()
+        )
+        if evaluation_id is None:
+            return Response({"error": "Evaluation no encontrada"}, status=status.HTTP_404_NOT_FOUND)
+
+        last_event_id = _last_event_id(request)
+        if isinstance(request._request, ASGIRequest):
+            stream = aiter_evaluation_events(evaluation_id, last_event_id)
+        else:
+            stream = iter_evaluation_events(evaluation_id, last_event_id)
+
+        resp = StreamingHttpResponse(stream, content_type="text/event-stream")
+        resp["Cache-Control"] = "no-cache"
+        # nginx: no bufferizar el stream
+        resp["X-Accel-Buffering"] = "no"
+        return resp
+
+
+class EvaluationProgressView(APIView):
+    """
+    GET /api/results/<uuid>/progress/?last_event_id=N
+    Polling barato (fallback del stream): eventos con id > N y si ya terminó.
+      {events: [{id, kind, data}], last_event_id, finished, status}
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request, uuid):
+        evaluation_id = (
+            Evaluation.objects.filter(uuid=uuid).values_list("id", flat=True).first()
+        )
+        if evaluation_id is None:
+            return Response({"error": "Evaluation no encontrada"}, status=status.HTTP_404_NOT_FOUND)
+
+        resp = Response(evaluation_progress(evaluation_id, _last_event_id(request)))
+        resp["Cache-Control"] = "no-cache"
+        return resp
+
+
+def get_cached_report(uuid):
+    """(etag, build_report) vía caché por evaluación -> snapshot -> build. Http404 si no existe."""
+
+    def build():
+        row = get_snapshot_row(uuid)
+        if row is not None:
+            return row
         evaluation = get_object_or_404(Evaluation, uuid=uuid)
-        return Response(build_report(evaluation), status=status.HTTP_200_OK)
+        payload, etag = get_report_payload(evaluation)
+        return etag, payload
+
+    # la versión de scoring va en la clave: tras subirla no se sirve lo viejo
+    return get_or_build(uuid, f"report-v{SCORING_VERSION}", build)
+
+
+class EvaluationReportView(APIView):
+    """
+    GET /api/results/<uuid>/report/
+
+    Evaluaciones en SUCCESS: sirve el ReportSnapshot (1 consulta) con ETag;
+    If-None-Match igual -> 304 sin cuerpo.
+    Delante va la caché por evaluación (local + compartida): en caliente
+    no toca la DB.
+    """
+
+    def get(self, request, uuid):
+        etag, payload = get_cached_report(uuid)
+
+        if etag_matches(request.headers.get("If-None-Match", ""), etag):
+            resp = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            resp = Response(payload, status=status.HTTP_200_OK)
+
+        resp["ETag"] = etag
+        # ✅ se puede cachear pero siempre revalidando (un rerun cambia el informe)
+        resp["Cache-Control"] = "no-cache"
+        return resp
 
 
 def apply_filters(request, qs):
     """
     Filtros soportados (query params):
-      - search: busca en nombre/email/movil/evaluation_uuid
+      - search: busca en nombre/email/movil y uuid de la evaluación
+        (uuid completo o prefijo hex)
       - nombre, email, movil: icontains
       - uuid: filtro exacto por evaluation.uuid
       - ordering: id | -id | nombre | -nombre | email | -email
@@ -363,22 +586,13 @@ def apply_filters(request, qs):
         qs = qs.filter(movil__icontains=movil)
 
     if search:
-        # search global
-        qs = qs.filter(
-            nombre__icontains=search
-        ) | qs.filter(
-            email__icontains=search
-        ) | qs.filter(
-            movil__icontains=search
-        ) | qs.filter(
-            evaluation__uuid__icontains=search
-        )
+        # search global: un solo WHERE (trigram en PostgreSQL, ver services/lead_search.py)
+        qs = qs.filter(lead_search_q(search))
+
+    return qs.order_by(get_lead_ordering(request.GET.get("ordering")))
 
-    ordering = (request.GET.get("ordering") or "-id").strip()
-    allowed = {"id", "-id", "nombre", "-nombre", "email", "-email"}
-    if ordering not in allowed:
-        ordering = "-id"
-    return qs.order_by(ordering)
+
+LEAD_FILTER_PARAMS = ("search", "nombre", "email", "movil", "uuid")
 
 
 class InformeDataUsersAPIView(APIView):
@@ -388,25 +602,57 @@ class InformeDataUsersAPIView(APIView):
         """
         LIST con paginación simple:
           GET /api/results/report/users/?page=1&page_size=20&search=...
+
+        Keyset (coste constante en páginas profundas):
+          GET /api/results/report/users/?cursor=&page_size=20&ordering=-id
+          -> {"next_cursor": "..."}; siguiente página con ?cursor=<next_cursor>
+
+        ?count=exact|estimate|none (por defecto exact con page, estimate con cursor)
         """
         qs = InformeDataUsers.objects.select_related("evaluation").all()
 
         qs = apply_filters(request, qs)
+        filtered = any((request.GET.get(name) or "").strip() for name in LEAD_FILTER_PARAMS)
+
+        try:
+            page_size = int(request.GET.get("page_size", "20"))
+        except ValueError:
+            page_size = 20
+        page_size = min(max(1, page_size), 200)
+
+        # ==========================
+        # ✅ Keyset (cursor)
+        # ==========================
+        if "cursor" in request.GET:
+            ordering = get_lead_ordering(request.GET.get("ordering"))
+            try:
+                rows, next_cursor = keyset_page(
+                    qs, ordering, page_size, cursor=request.GET.get("cursor") or None
+                )
+            except InvalidCursor as e:
+                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+            counts = count_leads(qs, get_count_mode(request.GET.get("count"), "estimate"), filtered)
+            serializer = InformeDataUsersListSerializer(rows, many=True)
+            return Response(
+                {
+                    **counts,
+                    "page_size": page_size,
+                    "next_cursor": next_cursor,
+                    "results": serializer.data,
+                },
+                status=status.HTTP_200_OK,
+            )
 
         # paginación
         try:
             page = int(request.GET.get("page", "1"))
         except ValueError:
             page = 1
-        try:
-            page_size = int(request.GET.get("page_size", "20"))
-        except ValueError:
-            page_size = 20
 
         page = max(1, page)
-        page_size = min(max(1, page_size), 200)
 
-        total = qs.count()
+        counts = count_leads(qs, get_count_mode(request.GET.get("count"), "exact"), filtered)
         start = (page - 1) * page_size
         end = start + page_size
         rows = qs[start:end]
@@ -414,7 +660,7 @@ class InformeDataUsersAPIView(APIView):
         serializer = InformeDataUsersListSerializer(rows, many=True)
         return Response(
             {
-                "count": total,
+                **counts,
                 "page": page,
                 "page_size": page_size,
                 "results": serializer.data,
@@ -442,98 +688,239 @@ class InformeDataUsersAPIView(APIView):
         )
 
 
+LEAD_EXPORT_HEADERS = ["ID", "Evaluation UUID", "Nombre", "Email", "Móvil"]
+LEAD_EXPORT_WIDTHS = [8, 40, 28, 34, 18]
+LEAD_EXPORT_CHUNK = 2000
+
+
+class _Echo:
+    """csv.writer escribe aquí y devolvemos la línea tal cual (sin buffer)."""
+
+    def write(self, value):
+        return value
+
+
+def _iter_lead_rows(qs):
+    # tuplas directas de la DB, por bloques (sin instancias ni select_related)
+    rows = qs.values_list("id", "evaluation__uuid", "nombre", "email", "movil")
+    for lead_id, ev_uuid, nombre, email, movil in rows.iterator(chunk_size=LEAD_EXPORT_CHUNK):
+        yield [lead_id, str(ev_uuid) if ev_uuid else "", nombre, email, movil or ""]
+
+
+def _stream_leads_csv(qs):
+    writer = csv.writer(_Echo())
+    yield "\ufeff" + writer.writerow(LEAD_EXPORT_HEADERS)  # BOM -> Excel abre bien los acentos
+
+    batch = []
+    for row in _iter_lead_rows(qs):
+        batch.append(writer.writerow(row))
+        if len(batch) >= 500:
+            yield "".join(batch)
+            batch = []
+    if batch:
+        yield "".join(batch)
+
+
+def _write_leads_xlsx(qs, fileobj):
+    """Workbook write-only: las filas van a disco, memoria constante."""
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Leads Informe")
+
+    for i, w in enumerate(LEAD_EXPORT_WIDTHS, start=1):
+        ws.column_dimensions[get_column_letter(i)].width = w
+    ws.freeze_panes = "A2"
+
+    header = []
+    for title in LEAD_EXPORT_HEADERS:
+        c = WriteOnlyCell(ws, value=title)
+        c.font = Font(bold=True)
+        c.alignment = Alignment(vertical="center")
+        header.append(c)
+    ws.append(header)
+
+    count = 0
+    for row in _iter_lead_rows(qs):
+        ws.append(row)
+        count += 1
+
+    ws.auto_filter.ref = f"A1:{get_column_letter(len(LEAD_EXPORT_HEADERS))}{count + 1}"
+    wb.save(fileobj)
+
+
 class InformeDataUsersExportAPIView(APIView):
     permission_classes = [AllowAny]
 
     def get(self, request):
         """
-        Excel:
+        Excel (por defecto) o CSV:
           GET /api/results/report/users/export/?search=...&uuid=...
+          GET /api/results/report/users/export/?type=csv   -> streaming inmediato
+        Ambos en memoria constante (filas por bloques con iterator()).
         """
-        qs = InformeDataUsers.objects.select_related("evaluation").all()
+        qs = InformeDataUsers.objects.all()
         qs = apply_filters(request, qs)
 
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Leads Informe"
-
-        headers = ["ID", "Evaluation UUID", "Nombre", "Email", "Móvil"]
-        ws.append(headers)
-
-        header_font = Font(bold=True)
-        for col_idx in range(1, len(headers) + 1):
-            c = ws.cell(row=1, column=col_idx)
-            c.font = header_font
-            c.alignment = Alignment(vertical="center")
-
-        for row in qs.iterator():
-            ws.append(
-                [
-                    row.id,
-                    str(row.evaluation.uuid) if row.evaluation_id else "",
-                    row.nombre,
-                    row.email,
-                    row.movil or "",
-                ]
-            )
-
-        ws.auto_filter.ref = ws.dimensions
-        ws.freeze_panes = "A2"
+        stamp = now().strftime("%Y%m%d_%H%M")
 
-        widths = [8, 40, 28, 34, 18]
-        for i, w in enumerate(widths, start=1):
-            ws.column_dimensions[get_column_letter(i)].width = w
+        if (request.query_params.get("type") or "").lower() == "csv":
+            resp = StreamingHttpResponse(_stream_leads_csv(qs), content_type="text/csv; charset=utf-8")
+            resp["Content-Disposition"] = f'attachment; filename="leads_informe_{stamp}.csv"'
+            resp["X-Accel-Buffering"] = "no"
+            return resp
 
-        filename = f"leads_informe_{now().strftime('%Y%m%d_%H%M')}.xlsx"
-        resp = HttpResponse(
-            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        # XLSX es un zip: se termina en un fichero temporal y se envía por bloques
+        # (TemporaryFile se borra solo al cerrarlo FileResponse)
+        tmp = tempfile.TemporaryFile(suffix=".xlsx")
+        _write_leads_xlsx(qs, tmp)
+        tmp.seek(0)
+
+        return FileResponse(
+            tmp,
+            as_attachment=True,
+            filename=f"leads_informe_{stamp}.xlsx",
+            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
         )
-        resp["Content-Disposition"] = f'attachment; filename="{filename}"'
-        wb.save(resp)
-        return resp
+
+
 class EvaluationReportPDFView(APIView):
     """
-    GET /api/results/<uuid>/report/pdf/
-    Genera PDF renderizando el frontend con Puppeteer.
+    GET /api/results/<uuid>/report/pdf/?renderer=browser|native
+
+    browser (default, settings.REPORT_PDF_RENDERER): renderiza el frontend con
+    Puppeteer (servicio render_server.js si PDF_RENDERER_URL, si no subprocess).
+    native: reportlab en proceso desde build_report, sin navegador ni frontend.
     """
     permission_classes = [AllowAny]
 
     def get(self, request, uuid):
-        # URL del frontend accesible desde backend
-        front_base = getattr(settings, "FRONTEND_BASE_URL", "http://localhost:3000")
-        report_url = f"{front_base}/results/{uuid}?pdf=1"
+        renderer = get_renderer(request.GET.get("renderer"))
+        if renderer == "native":
+            render = lambda: render_report_pdf_native(get_cached_report(uuid)[1])
+        else:
+            render = lambda: render_report_pdf(uuid)
+
+        # ✅ evaluaciones en SUCCESS: PDF cacheado en MEDIA_ROOT/report_pdfs
+        key = pdf_cache.cacheable_key(uuid, renderer)
+        etag = pdf_cache.etag_for(key) if key else None
+
+        if etag and etag_matches(request.headers.get("If-None-Match", ""), etag):
+            resp = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+            resp["ETag"] = etag
+            return resp
+
+        try:
+            path, pdf = pdf_cache.get_or_render(uuid, key, render)
+        except PdfRendererBusy as e:
+            resp = HttpResponse(str(e), status=503, content_type="text/plain")
+            resp["Retry-After"] = e.retry_after
+            return resp
+        except PdfRenderError as e:
+            return HttpResponse(str(e), status=e.status, content_type="text/plain")
+
+        filename = f"informe_goaiso_{uuid}.pdf"
+        if path is not None:
+            resp = pdf_cache.file_response(path, filename)
+        else:
+            resp = HttpResponse(pdf, content_type="application/pdf")
+            resp["Content-Disposition"] = f'attachment; filename="{filename}"'
+
+        if etag:
+            resp["ETag"] = etag
+            resp["Cache-Control"] = "no-cache"
+        return resp
+
+
+
+ANALYTICS_DEFAULT_DAYS = 90
+ANALYTICS_MAX_DAYS = 730
+
+
+def _parse_day(value, default):
+    value = (value or "").strip()
+    if not value:
+        return default
+    return date.fromisoformat(value)
+
 
-        script_path = os.path.join(settings.BASE_DIR, "apps","base","scripts", "render_report_pdf.js")
+class BrandAnalyticsView(APIView):
+    """
+    GET /api/results/analytics/brands/
+
+    Tendencia de marcas entre evaluaciones, desde BrandDailyRollup
+    (ver services/rollups.py), nunca desde RankingItem.
 
-        # Archivo temporal
-        tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf")
-        out_path = tmp.name
-        tmp.close()
+      ?product_type=zapatillas running&country=España
+      &date_from=2026-01-01&date_to=2026-03-31   (por defecto últimos 90 días)
+      &phase=PHASE1|PHASE2&criterion=precio
+      &brand=nike,adidas                          (si no: top `limit` por puntos)
+      &granularity=day|week|month&limit=10
+    """
+    permission_classes = [AllowAny]
 
+    def get(self, request):
         try:
-            # Ejecuta Node + Puppeteer
-            completed = subprocess.run(
-                ["node", script_path, report_url, out_path],
-                capture_output=True,
-                text=True,
-                check=True,
+            date_to = _parse_day(request.GET.get("date_to"), timezone.localdate())
+            date_from = _parse_day(
+                request.GET.get("date_from"), date_to - timedelta(days=ANALYTICS_DEFAULT_DAYS - 1)
+            )
+        except ValueError:
+            return Response(
+                {"error": "date_from / date_to deben ser YYYY-MM-DD"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if date_from > date_to:
+            return Response({"error": "date_from > date_to"}, status=status.HTTP_400_BAD_REQUEST)
+        if (date_to - date_from).days >= ANALYTICS_MAX_DAYS:
+            return Response(
+                {"error": f"Rango máximo: {ANALYTICS_MAX_DAYS} días"},
+                status=status.HTTP_400_BAD_REQUEST,
             )
 
-            filename = f"informe_goaiso_{uuid}.pdf"
-            resp = FileResponse(open(out_path, "rb"), content_type="application/pdf")
-            resp["Content-Disposition"] = f'attachment; filename="{filename}"'
-            return resp
+        phase = (request.GET.get("phase") or "PHASE1").strip().upper()
+        if phase not in ("PHASE1", "PHASE2"):
+            return Response({"error": "phase debe ser PHASE1 o PHASE2"}, status=status.HTTP_400_BAD_REQUEST)
 
-        except subprocess.CalledProcessError as e:
-            return HttpResponse(
-                "Error generando PDF.\n\nSTDOUT:\n"
-                + (e.stdout or "")
-                + "\n\nSTDERR:\n"
-                + (e.stderr or ""),
-                status=500,
-                content_type="text/plain",
-            )
-        finally:
-            # (Opcional) borrar el archivo luego con un cleanup job
-            # No lo borro aquí por seguridad con FileResponse en algunos entornos.
-            pass
\ No newline at end of file
+        granularity = (request.GET.get("granularity") or "day").strip().lower()
+        if granularity not in rollups.GRANULARITIES:
+            granularity = "day"
+
+        try:
+            limit = int(request.GET.get("limit", rollups.DEFAULT_LIMIT))
+        except ValueError:
+            limit = rollups.DEFAULT_LIMIT
+        limit = min(max(1, limit), rollups.MAX_LIMIT)
+
+        product_type = (request.GET.get("product_type") or "").strip()
+        # sin ?country -> todos los países; ?country= (vacío) -> evaluaciones sin país
+        country = request.GET.get("country")
+        criterion = (request.GET.get("criterion") or "").strip()
+        brands = [b for b in (request.GET.get("brand") or "").split(",") if b.strip()]
+
+        data = rollups.brand_trends(
+            date_from=date_from,
+            date_to=date_to,
+            product_type=product_type,
+            country=country,
+            phase=phase,
+            criterion=criterion,
+            brands=brands,
+            granularity=granularity,
+            limit=limit,
+        )
+        return Response(
+            {
+                "filters": {
+                    "product_type": product_type,
+                    "country": country,
+                    "phase": phase,
+                    "criterion": criterion,
+                    "brand": brands,
+                    "date_from": date_from.isoformat(),
+                    "date_to": date_to.isoformat(),
+                    "granularity": granularity,
+                    "limit": limit,
+                },
+                **data,
+            },
+            status=status.HTTP_200_OK,
+        )
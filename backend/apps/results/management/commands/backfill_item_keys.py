@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.results.api.models.index import RankingItem
+from apps.results.services.normalization import item_keys
+
+
+class Command(BaseCommand):
+    help = (
+        "Rellena RankingItem.brand_key / model_key en filas antiguas, por lotes de id "
+        "(idempotente, se puede interrumpir y relanzar)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=2000, help="Filas por lote / transacción")
+        parser.add_argument("--all", action="store_true", help="Recalcular también las que ya tienen clave")
+
+    def handle(self, *args, **options):
+        chunk_size = max(1, options["chunk_size"])
+
+        qs = RankingItem.objects.all()
+        if not options["all"]:
+            qs = qs.filter(brand_key="", model_key="")
+
+        last_id = 0
+        scanned = updated = 0
+        while True:
+            # keyset por id: cada lote cuesta lo mismo aunque la tabla sea enorme
+            rows = list(qs.filter(id__gt=last_id).order_by("id").values_list("id", "brand", "model")[:chunk_size])
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            scanned += len(rows)
+
+            changed = []
+            for item_id, brand, model in rows:
+                brand_key, model_key = item_keys(brand, model)
+                if brand_key or model_key or options["all"]:
+                    changed.append(RankingItem(id=item_id, brand_key=brand_key, model_key=model_key))
+
+            if changed:
+                with transaction.atomic():
+                    RankingItem.objects.bulk_update(changed, ["brand_key", "model_key"])
+                updated += len(changed)
+
+            self.stdout.write(f"[backfill] hasta id {last_id}: {updated}/{scanned} actualizadas")
+
+        self.stdout.write(f"[backfill] fin: {updated} filas actualizadas de {scanned} revisadas")
@@ -0,0 +1,100 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from toon_format import decode
+
+from apps.results.services.parse_ranking import parse_ranking, parse_toon_ranking5
+from apps.results.utils.attempt_log import build_sink
+
+SAMPLE_BRANDS = [
+    "Nike | Pegasus 41",
+    "Adidas | Adizero Boston 12",
+    "ASICS | Novablast 4",
+    "Hoka | Clifton 9",
+    "New Balance | Fresh Foam X 1080v13",
+    "Brooks | Ghost 16",
+    "Saucony | Endorphin Speed 4",
+    "On | Cloudmonster",
+]
+
+
+def _legacy(text):
+    """Camino anterior: decode en el cliente (validar) + decode en el runner + parse_ranking."""
+    try:
+        decoded = decode(text)
+        if not (isinstance(decoded.get("ranking"), list) and len(decoded["ranking"]) == 5):
+            return None
+        return parse_ranking(decode(text))
+    except Exception:
+        return None
+
+
+def _generic(text):
+    try:
+        decoded = decode(text)
+        ranking = decoded.get("ranking") if isinstance(decoded, dict) else None
+        if not isinstance(ranking, list) or len(ranking) != 5:
+            return None
+        return parse_ranking(decoded)
+    except Exception:
+        return None
+
+
+class Command(BaseCommand):
+    help = "Compara el parser de ranking[5] de una pasada con toon_format.decode (tiempos y resultados)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=20_000, help="Respuestas parseadas por variante")
+        parser.add_argument("--from-log", action="store_true", help="Usar respuestas reales del log de intentos")
+        parser.add_argument("--limit", type=int, default=2_000, help="Máximo de respuestas leídas del log")
+
+    def _samples(self, options):
+        if options["from_log"]:
+            samples = []
+            for record in build_sink().read():
+                if record.get("output_text"):
+                    samples.append(record["output_text"])
+                if len(samples) >= options["limit"]:
+                    break
+            if samples:
+                return samples
+            self.stderr.write("[bench] log de intentos vacío, usando respuestas sintéticas")
+
+        rng = random.Random(42)
+        samples = ["ranking[5]: " + ",".join(rng.sample(SAMPLE_BRANDS, 5)) for _ in range(200)]
+        # casos que van por el decoder genérico o son inválidos
+        samples += [
+            'ranking[5]: "Nike, Inc | Pegasus",Adidas | Boston,ASICS | Nova,Hoka | Clifton,On | Cloud',
+            "ranking[5|]: Nike | Pegasus|Adidas | Boston|ASICS | Nova|Hoka | Clifton|On | Cloud",
+            "ranking[5]: Nike | Pegasus,Adidas | Boston",
+            "Lo siento, no puedo ayudar con eso.",
+        ]
+        return samples
+
+    def handle(self, *args, **options):
+        samples = self._samples(options)
+        iterations = max(1, options["iterations"])
+
+        mismatches = 0
+        for text in samples:
+            if parse_toon_ranking5(text) != _generic(text):
+                mismatches += 1
+
+        variants = [
+            ("legacy (2x decode)", _legacy),
+            ("generic (1x decode)", _generic),
+            ("single-pass", parse_toon_ranking5),
+        ]
+        timings = {}
+        for name, fn in variants:
+            start = time.perf_counter()
+            for i in range(iterations):
+                fn(samples[i % len(samples)])
+            timings[name] = (time.perf_counter() - start) / iterations * 1e6
+
+        self.stdout.write(f"[bench] {len(samples)} respuestas distintas, {iterations} parseos por variante")
+        baseline = timings["legacy (2x decode)"]
+        for name, micros in timings.items():
+            self.stdout.write(f"  {name:<20} {micros:8.1f} µs/respuesta  x{baseline / micros:5.1f}")
+        self.stdout.write(f"[bench] resultados distintos single-pass vs decode: {mismatches}")
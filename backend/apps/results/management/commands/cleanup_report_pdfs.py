@@ -0,0 +1,32 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from apps.results.services import pdf_cache
+
+
+class Command(BaseCommand):
+    help = (
+        "Caché de PDFs del informe: expulsión por edad/tamaño, limpieza de "
+        "temporales huérfanos y estadísticas. Pensado para cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clear", action="store_true", help="Vaciar la caché entera")
+        parser.add_argument(
+            "--temp-max-age",
+            type=int,
+            default=pdf_cache.TEMP_MAX_AGE_SECONDS,
+            help="Edad mínima (segundos) para borrar un temporal huérfano",
+        )
+
+    def handle(self, *args, **options):
+        if options["clear"]:
+            self.stdout.write(f"[pdf cache] {pdf_cache.clear()} PDFs borrados")
+        else:
+            self.stdout.write(f"[pdf cache] {pdf_cache.evict()} PDFs expulsados")
+
+        removed = pdf_cache.cleanup_temp_files(max_age_seconds=max(0, options["temp_max_age"]))
+        self.stdout.write(f"[pdf cache] {removed} temporales huérfanos borrados")
+
+        self.stdout.write(json.dumps(pdf_cache.stats(), indent=2))
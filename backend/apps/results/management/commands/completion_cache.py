@@ -0,0 +1,23 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from apps.results.utils import response_cache
+
+
+class Command(BaseCommand):
+    help = "Caché de respuestas de web_search: estadísticas, purga de expiradas/LRU o vaciado."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=7, help="Días de contadores a mostrar")
+        parser.add_argument("--evict", action="store_true", help="Borrar expiradas y recortar a MAX_ENTRIES")
+        parser.add_argument("--clear", action="store_true", help="Vaciar la caché entera")
+
+    def handle(self, *args, **options):
+        if options["clear"]:
+            self.stdout.write(f"[cache] {response_cache.clear()} entradas borradas")
+        elif options["evict"]:
+            self.stdout.write(f"[cache] {response_cache.evict()} entradas eliminadas")
+
+        stats = response_cache.stats(days=max(1, options["days"]))
+        self.stdout.write(json.dumps(stats, indent=2))
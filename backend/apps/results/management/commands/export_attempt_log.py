@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from apps.results.utils.attempt_log import build_sink, export_xlsx
+
+
+class Command(BaseCommand):
+    help = "Exporta el log de intentos de web_search (jsonl/sqlite) a un Excel."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", default="websearch_logs.xlsx", help="Ruta del .xlsx a generar")
+        parser.add_argument("--backend", default=None, help="jsonl | sqlite (por defecto settings)")
+        parser.add_argument("--path", default=None, help="Fichero del log (por defecto settings)")
+        parser.add_argument("--evaluation", default="", help="Solo los intentos de esta evaluación (uuid)")
+
+    def handle(self, *args, **options):
+        records = build_sink(options["backend"], options["path"]).read()
+
+        if options["evaluation"]:
+            records = (r for r in records if r.get("evaluation_uuid") == options["evaluation"])
+
+        count = export_xlsx(records, options["output"])
+        self.stdout.write(f"[attempt log] {count} intentos -> {options['output']}")
@@ -0,0 +1,37 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.results.services.rollups import groups_in_range, refresh_rollup_group
+
+
+def _day(value):
+    try:
+        return date.fromisoformat(value) if value else None
+    except ValueError:
+        raise CommandError(f"Fecha no válida (YYYY-MM-DD): {value}")
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula BrandDailyRollup desde RankingItem: backfill inicial, "
+        "o reparar días tras un fallo / cambio de normalización."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--since", help="Primer día (YYYY-MM-DD, incluido)")
+        parser.add_argument("--until", help="Último día (YYYY-MM-DD, incluido)")
+
+    def handle(self, *args, **options):
+        since, until = _day(options["since"]), _day(options["until"])
+
+        groups = sorted(groups_in_range(since, until))
+        rows = failed = 0
+        for group in groups:
+            try:
+                rows += refresh_rollup_group(group)
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f"[rollups] {group}: {e}")
+
+        self.stdout.write(f"[rollups] {len(groups)} grupos (día, product_type, país), {rows} filas, {failed} con error")
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from apps.results.api.models.index import Evaluation
+from apps.results.services.scoring import SCORING_VERSION
+from apps.results.services.snapshots import store_report_snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstruye los ReportSnapshot de evaluaciones en SUCCESS que no tienen "
+        "snapshot o lo tienen con otra SCORING_VERSION."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true", help="Reconstruir todos, aunque estén al día")
+        parser.add_argument("--uuid", action="append", default=[], help="Solo esta evaluación (repetible)")
+
+    def handle(self, *args, **options):
+        qs = Evaluation.objects.filter(status="SUCCESS").order_by("id")
+
+        if options["uuid"]:
+            qs = qs.filter(uuid__in=options["uuid"])
+        if not options["all"]:
+            qs = qs.exclude(report_snapshot__scoring_version=SCORING_VERSION)
+
+        done = failed = 0
+        for evaluation in qs.iterator():
+            try:
+                store_report_snapshot(evaluation)
+                done += 1
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f"[snapshots] {evaluation.uuid}: {e}")
+
+        self.stdout.write(f"[snapshots] v{SCORING_VERSION}: {done} reconstruidos, {failed} con error")
@@ -0,0 +1,62 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.results.services.jobs import (
+    default_worker_id,
+    process_next_job,
+    requeue_stale_jobs,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Worker de evaluaciones: reclama jobs de la cola (FOR UPDATE SKIP LOCKED) "
+        "y los ejecuta. Se pueden lanzar tantos procesos/nodos como se quiera."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--worker-id", default="", help="Identificador del worker (por defecto host:pid)")
+        parser.add_argument("--poll-interval", type=float, default=2.0, help="Segundos de espera con la cola vacía")
+        parser.add_argument("--burst", action="store_true", help="Salir cuando la cola quede vacía")
+        parser.add_argument("--max-jobs", type=int, default=0, help="Salir tras N jobs (0 = sin límite)")
+
+    def handle(self, *args, **options):
+        worker_id = options["worker_id"] or default_worker_id()
+        poll_interval = max(0.1, options["poll_interval"])
+        max_jobs = max(0, options["max_jobs"])
+
+        self._stopping = False
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGINT, self._request_stop)
+
+        self.stdout.write(f"[worker {worker_id}] arrancado")
+
+        done = 0
+        last_recovery = 0.0
+
+        while not self._stopping:
+            # ✅ recuperar jobs de workers caídos (como mucho cada 30s)
+            if time.monotonic() - last_recovery > 30:
+                requeue_stale_jobs()
+                last_recovery = time.monotonic()
+
+            job = process_next_job(worker_id)
+
+            if job is None:
+                if options["burst"]:
+                    break
+                time.sleep(poll_interval)
+                continue
+
+            done += 1
+            self.stdout.write(f"[worker {worker_id}] job {job.pk} -> {job.status}")
+            if max_jobs and done >= max_jobs:
+                break
+
+        self.stdout.write(f"[worker {worker_id}] parado ({done} jobs)")
+
+    def _request_stop(self, signum, frame):
+        # termina el job en curso y sale
+        self._stopping = True
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 00:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("results", "0010_evaluationjob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="promptrun",
+            name="slot",
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+    ]
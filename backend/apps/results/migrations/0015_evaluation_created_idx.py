@@ -0,0 +1,19 @@
+# Generated by Django 6.0 on 2026-10-18 01:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("results", "0014_reportsnapshot"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="evaluation",
+            index=models.Index(
+                fields=["-created_at", "-id"], name="results_eval_created_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 6.0 on 2026-10-18 01:10
+
+from django.db import migrations
+
+# Índices GIN trigram sobre UPPER(col::text): la expresión exacta que genera
+# Django para icontains en PostgreSQL (UPPER("col"::text) LIKE UPPER(%s)).
+TRGM_INDEXES = [
+    ("results_lead_nombre_trgm", "nombre"),
+    ("results_lead_email_trgm", "email"),
+    ("results_lead_movil_trgm", "movil"),
+]
+TABLE = "results_informedatausers"
+
+
+def create_trgm_indexes(apps, schema_editor):
+    # Solo PostgreSQL; en SQLite (tests/local) la búsqueda funciona sin índice
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for name, column in TRGM_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{name}" '
+            f'ON "{TABLE}" USING gin ((UPPER("{column}"::text)) gin_trgm_ops)'
+        )
+
+
+def drop_trgm_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, _ in TRGM_INDEXES:
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"')
+
+
+class Migration(migrations.Migration):
+
+    # CONCURRENTLY no puede ir dentro de una transacción
+    atomic = False
+
+    dependencies = [
+        ("results", "0015_evaluation_created_idx"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trgm_indexes, drop_trgm_indexes),
+    ]
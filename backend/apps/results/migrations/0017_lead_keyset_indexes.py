@@ -0,0 +1,25 @@
+# Generated by Django 6.0 on 2026-10-18 01:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("results", "0016_lead_search_trgm"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="informedatausers",
+            index=models.Index(
+                fields=["nombre", "id"], name="results_lead_nombre_id_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="informedatausers",
+            index=models.Index(
+                fields=["email", "id"], name="results_lead_email_id_idx"
+            ),
+        ),
+    ]
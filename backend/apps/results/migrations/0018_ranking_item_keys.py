@@ -0,0 +1,87 @@
+# Generated by Django 6.0 on 2026-10-18 01:16
+
+from django.db import migrations, models
+
+# RankingItem es la tabla más grande: en PostgreSQL los índices se crean
+# CONCURRENTLY (sin bloquear escrituras durante el deploy), como en 0016.
+INDEXES = [
+    models.Index(fields=["brand_key"], name="results_item_brand_key_idx"),
+    models.Index(fields=["prompt_run", "position"], name="results_item_run_pos_idx"),
+]
+
+
+def _fk_index_names(schema_editor, model):
+    # índice propio de la FK prompt_run_id (el compuesto no cuenta: otras columnas)
+    return schema_editor._constraint_names(
+        model, ["prompt_run_id"], index=True, unique=False, primary_key=False
+    )
+
+
+def create_indexes(apps, schema_editor):
+    model = apps.get_model("results", "RankingItem")
+    if schema_editor.connection.vendor != "postgresql":
+        # SQLite (tests/local): índices normales; el de la FK se queda, no molesta
+        for index in INDEXES:
+            schema_editor.add_index(model, index)
+        return
+
+    for index in INDEXES:
+        schema_editor.add_index(model, index, concurrently=True)
+    # (prompt_run, position) cubre las búsquedas por prompt_run: el de la FK sobra
+    for name in _fk_index_names(schema_editor, model):
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"')
+
+
+def drop_indexes(apps, schema_editor):
+    model = apps.get_model("results", "RankingItem")
+    if schema_editor.connection.vendor != "postgresql":
+        for index in INDEXES:
+            schema_editor.remove_index(model, index)
+        return
+
+    table = model._meta.db_table
+    name = schema_editor._create_index_name(table, ["prompt_run_id"])
+    schema_editor.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{name}" ON "{table}" ("prompt_run_id")')
+    for index in INDEXES:
+        schema_editor.remove_index(model, index, concurrently=True)
+
+
+class Migration(migrations.Migration):
+
+    # CONCURRENTLY no puede ir dentro de una transacción
+    atomic = False
+
+    dependencies = [
+        ("results", "0017_lead_keyset_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="rankingitem",
+            name="brand_key",
+            field=models.CharField(blank=True, default="", max_length=255),
+        ),
+        migrations.AddField(
+            model_name="rankingitem",
+            name="model_key",
+            field=models.CharField(blank=True, default="", max_length=255),
+        ),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                *[migrations.AddIndex(model_name="rankingitem", index=index) for index in INDEXES],
+                migrations.AlterField(
+                    model_name="rankingitem",
+                    name="prompt_run",
+                    field=models.ForeignKey(
+                        db_index=False,
+                        on_delete=models.deletion.CASCADE,
+                        related_name="items",
+                        to="results.promptrun",
+                    ),
+                ),
+            ],
+            database_operations=[
+                migrations.RunPython(create_indexes, drop_indexes),
+            ],
+        ),
+    ]
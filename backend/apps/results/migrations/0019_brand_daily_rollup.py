@@ -0,0 +1,63 @@
+# Generated by Django 6.0 on 2026-10-18 01:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("results", "0018_ranking_item_keys"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BrandDailyRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                ("product_type", models.CharField(max_length=255)),
+                ("country", models.CharField(blank=True, default="", max_length=100)),
+                ("phase", models.CharField(max_length=10)),
+                ("criterion", models.CharField(blank=True, default="", max_length=255)),
+                ("brand_key", models.CharField(max_length=255)),
+                ("brand", models.CharField(max_length=255)),
+                ("points", models.PositiveIntegerField(default=0)),
+                ("appearances", models.PositiveIntegerField(default=0)),
+                ("runs", models.PositiveIntegerField(default=0)),
+                ("total_runs", models.PositiveIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["product_type", "country", "day"],
+                        name="results_rollup_pt_day_idx",
+                    ),
+                    models.Index(
+                        fields=["brand_key", "day"], name="results_rollup_brand_day_idx"
+                    ),
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=(
+                            "day",
+                            "product_type",
+                            "country",
+                            "phase",
+                            "criterion",
+                            "brand_key",
+                        ),
+                        name="results_rollup_unique",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,132 @@
+"""
+Caché de respuestas por evaluación (informe, detalle...).
+
+- Puntero de versión en la caché compartida:
+      eval:<uuid>:v = "<status>:<completed_at>:<token>"
+  Se regenera (token nuevo) al empezar un run, al persistir runs/summaries
+  y al cambiar el estado -> invalidación precisa, sin borrar nada.
+- Los payloads van bajo eval:<uuid>:<kind>:<versión> y son inmutables, así
+  que la capa local (locmem, por proceso) puede guardarlos sin riesgo:
+  un cambio de versión simplemente deja de apuntar a ellos.
+- Lectura caliente: 1 get del puntero + 1 get local -> ni ORM ni serializer.
+"""
+
+from __future__ import annotations
+
+import logging
+import uuid as uuid_lib
+from typing import Any, Callable, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import InvalidCacheBackendError
+
+from apps.results.api.models.index import Evaluation
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 3600
+DEFAULT_SHARED_ALIAS = "default"
+DEFAULT_LOCAL_ALIAS = "local"
+
+_MISSING = object()
+
+
+def _shared_cache():
+    return caches[getattr(settings, "EVALUATION_CACHE_ALIAS", DEFAULT_SHARED_ALIAS)]
+
+
+def _local_cache():
+    alias = getattr(settings, "EVALUATION_CACHE_LOCAL_ALIAS", DEFAULT_LOCAL_ALIAS)
+    if not alias:
+        return None
+    try:
+        return caches[alias]
+    except InvalidCacheBackendError:
+        return None
+
+
+def _timeout() -> int:
+    return int(getattr(settings, "EVALUATION_CACHE_TIMEOUT", DEFAULT_TIMEOUT))
+
+
+def _pointer_key(uuid) -> str:
+    return f"eval:{uuid}:v"
+
+
+def _payload_key(uuid, kind: str, version: str) -> str:
+    return f"eval:{uuid}:{kind}:{version}"
+
+
+def _new_version(status: str, completed_at) -> str:
+    stamp = completed_at.isoformat() if completed_at else "-"
+    return f"{status}:{stamp}:{uuid_lib.uuid4().hex[:12]}"
+
+
+# =========================
+# Versión / invalidación
+# =========================
+def invalidate_evaluation_cache(evaluation) -> None:
+    """Apunta a una versión nueva: todo lo cacheado de la evaluación deja de valer."""
+    try:
+        _shared_cache().set(
+            _pointer_key(evaluation.uuid),
+            _new_version(evaluation.status, evaluation.completed_at),
+            timeout=None,
+        )
+    except Exception as e:
+        # sin caché compartida no hay nada que invalidar que importe más que el run
+        logger.warning(f"[EVAL CACHE] invalidación {evaluation.uuid}: {e}")
+
+
+def current_version(uuid) -> Optional[str]:
+    """Versión vigente; si no hay puntero se crea desde la DB. None si no existe."""
+    shared = _shared_cache()
+    version = shared.get(_pointer_key(uuid))
+    if version is not None:
+        return version
+
+    row = Evaluation.objects.filter(uuid=uuid).values_list("status", "completed_at").first()
+    if row is None:
+        return None
+
+    # add: si otro proceso acaba de invalidar, no pisamos su versión
+    shared.add(_pointer_key(uuid), _new_version(*row), timeout=None)
+    return shared.get(_pointer_key(uuid))
+
+
+# =========================
+# Lectura
+# =========================
+def get_or_build(uuid, kind: str, builder: Callable[[], Any]) -> Any:
+    """
+    Devuelve el payload `kind` de la evaluación desde la caché local, luego la
+    compartida, y si no, lo construye con `builder()` y lo guarda en ambas.
+    `builder` debe lanzar Http404 (get_object_or_404) si no existe.
+    """
+    try:
+        version = current_version(uuid)
+    except Exception as e:
+        logger.warning(f"[EVAL CACHE] lectura {uuid}: {e}")
+        return builder()
+
+    if version is None:
+        return builder()
+
+    key = _payload_key(uuid, kind, version)
+    local = _local_cache()
+
+    if local is not None:
+        value = local.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+    shared = _shared_cache()
+    value = shared.get(key, _MISSING)
+    if value is _MISSING:
+        value = builder()
+        shared.set(key, value, timeout=_timeout())
+
+    if local is not None:
+        local.set(key, value)
+    return value
@@ -0,0 +1,203 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import socket
+import threading
+from datetime import timedelta
+from typing import Optional
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+
+from apps.results.api.models.index import (
+    EvaluationJob,
+    PromptRun,
+    RankingItem,
+    RankingSummary,
+)
+from apps.results.services.evaluation_cache import invalidate_evaluation_cache
+from apps.results.services.progress import record_complete_event
+from apps.results.services.runner import EvaluationRunError, execute_evaluation
+
+logger = logging.getLogger(__name__)
+
+# Un job RUNNING sin heartbeat en este tiempo se considera huérfano (worker caído)
+DEFAULT_STALE_SECONDS = 300
+DEFAULT_HEARTBEAT_SECONDS = 30
+DEFAULT_MAX_ATTEMPTS = 2
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def clear_evaluation_results(evaluation):
+    """
+    Borra runs, items y summaries de una evaluación (antes de (re)ejecutarla).
+    """
+    RankingItem.objects.filter(prompt_run__evaluation=evaluation).delete()
+    PromptRun.objects.filter(evaluation=evaluation).delete()
+    RankingSummary.objects.filter(evaluation=evaluation).delete()
+
+
+# =========================
+# Encolar / reclamar
+# =========================
+def enqueue_evaluation(evaluation, options: Optional[dict] = None) -> EvaluationJob:
+    """
+    Crea el job. Llamar dentro de la misma transacción que pone la evaluación
+    en PROCESSING, así el worker nunca ve uno sin el otro.
+    """
+    return EvaluationJob.objects.create(evaluation=evaluation, options=options or {})
+
+
+def claim_next_job(worker_id: str) -> Optional[EvaluationJob]:
+    """
+    Reclama el job QUEUED más antiguo.
+    SKIP LOCKED -> varios workers (y nodos) compiten sin bloquearse entre sí.
+    """
+    with transaction.atomic():
+        job = (
+            EvaluationJob.objects.select_for_update(skip_locked=True)
+            .filter(status="QUEUED")
+            .order_by("created_at", "id")
+            .first()
+        )
+        if job is None:
+            return None
+
+        now = timezone.now()
+        job.status = "RUNNING"
+        job.worker_id = worker_id
+        job.attempts += 1
+        job.started_at = now
+        job.heartbeat_at = now
+        job.error = None
+        job.save(update_fields=["status", "worker_id", "attempts", "started_at", "heartbeat_at", "error"])
+
+    return job
+
+
+def requeue_stale_jobs(stale_seconds: Optional[int] = None, max_attempts: Optional[int] = None) -> int:
+    """
+    Jobs RUNNING cuyo worker dejó de dar señales:
+    - si le quedan intentos -> vuelven a QUEUED
+    - si no -> FAILED y la evaluación a ERROR
+    """
+    stale_seconds = stale_seconds or getattr(settings, "EVALUATION_JOB_STALE_SECONDS", DEFAULT_STALE_SECONDS)
+    max_attempts = max_attempts or getattr(settings, "EVALUATION_JOB_MAX_ATTEMPTS", DEFAULT_MAX_ATTEMPTS)
+    limit = timezone.now() - timedelta(seconds=stale_seconds)
+
+    recovered = 0
+    with transaction.atomic():
+        stale = (
+            EvaluationJob.objects.select_for_update(skip_locked=True)
+            .select_related("evaluation")
+            .filter(status="RUNNING", heartbeat_at__lt=limit)
+        )
+        for job in stale:
+            if job.attempts < max_attempts:
+                job.status = "QUEUED"
+                job.worker_id = ""
+                job.save(update_fields=["status", "worker_id"])
+                logger.warning(f"[JOBS] job {job.pk} huérfano -> QUEUED")
+            else:
+                job.status = "FAILED"
+                job.error = "Worker perdido (sin heartbeat)"
+                job.finished_at = timezone.now()
+                job.save(update_fields=["status", "error", "finished_at"])
+                job.evaluation.status = "ERROR"
+                job.evaluation.save(update_fields=["status"])
+                transaction.on_commit(lambda ev=job.evaluation: invalidate_evaluation_cache(ev))
+                record_complete_event(job.evaluation)
+                logger.error(f"[JOBS] job {job.pk} huérfano sin intentos -> FAILED")
+            recovered += 1
+
+    return recovered
+
+
+# =========================
+# Ejecutar
+# =========================
+class _Heartbeat(threading.Thread):
+    """
+    Actualiza heartbeat_at mientras el job corre (con su propia conexión).
+    """
+
+    def __init__(self, job_id: int, interval: float):
+        super().__init__(daemon=True)
+        self.job_id = job_id
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        try:
+            while not self._stop_event.wait(self.interval):
+                EvaluationJob.objects.filter(pk=self.job_id, status="RUNNING").update(
+                    heartbeat_at=timezone.now()
+                )
+        except Exception as e:
+            logger.warning(f"[JOBS] heartbeat job {self.job_id}: {e}")
+        finally:
+            connection.close()
+
+    def stop(self):
+        self._stop_event.set()
+        self.join(timeout=5)
+
+
+def run_job(job: EvaluationJob) -> EvaluationJob:
+    """
+    Ejecuta un job ya reclamado y deja job + evaluación en estado final.
+    """
+    evaluation = job.evaluation
+    options = job.options or {}
+
+    heartbeat = _Heartbeat(
+        job.pk, getattr(settings, "EVALUATION_JOB_HEARTBEAT_SECONDS", DEFAULT_HEARTBEAT_SECONDS)
+    )
+    heartbeat.start()
+
+    try:
+        # reintento tras caída de un worker: se reaprovecha lo ya persistido
+        execute_evaluation(
+            evaluation,
+            concurrency=options.get("concurrency"),
+            mode=options.get("mode"),
+            resume=bool(options.get("resume")) or job.attempts > 1,
+            cache=options.get("cache"),
+            cache_samples=options.get("cache_samples"),
+        )
+        job.status = "DONE"
+
+    except EvaluationRunError as e:
+        job.status = "FAILED"
+        job.error = json.dumps(e.payload, ensure_ascii=False, default=str)
+
+    except Exception as e:
+        logger.exception(f"[JOBS] job {job.pk} falló")
+        job.status = "FAILED"
+        job.error = str(e)
+
+    finally:
+        heartbeat.stop()
+
+    job.finished_at = timezone.now()
+    job.save(update_fields=["status", "error", "finished_at"])
+    return job
+
+
+def process_next_job(worker_id: str) -> Optional[EvaluationJob]:
+    close_old_connections()
+    job = claim_next_job(worker_id)
+    if job is None:
+        return None
+
+    logger.info(f"[JOBS] {worker_id} ejecuta job {job.pk} ({job.evaluation.uuid})")
+    run_job(job)
+    logger.info(f"[JOBS] job {job.pk} -> {job.status}")
+    close_old_connections()
+    return job
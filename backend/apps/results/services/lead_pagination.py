@@ -0,0 +1,142 @@
+"""
+Paginación de leads (InformeDataUsers).
+
+- Keyset (cursor): WHERE (campo, id) < (último campo, último id) ORDER BY campo, id
+  LIMIT n+1 -> la página 1000 cuesta lo mismo que la primera (índices campo,id).
+- Conteo: exact (COUNT(*)), estimate (pg_class.reltuples sin filtros o COUNT
+  con tope si hay filtros) o none.
+"""
+
+from __future__ import annotations
+
+import base64
+import json
+from typing import Optional, Tuple
+
+from django.db import connection
+from django.db.models import Q
+
+LEAD_ORDERINGS = {"id", "-id", "nombre", "-nombre", "email", "-email"}
+DEFAULT_ORDERING = "-id"
+
+COUNT_MODES = ("exact", "estimate", "none")
+# con filtros no hay estadística fiable: se cuenta como mucho hasta aquí
+ESTIMATE_COUNT_CAP = 10_000
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def get_lead_ordering(value: Optional[str]) -> str:
+    value = (value or DEFAULT_ORDERING).strip()
+    return value if value in LEAD_ORDERINGS else DEFAULT_ORDERING
+
+
+# =========================
+# Keyset
+# =========================
+def encode_cursor(ordering: str, value, row_id: int) -> str:
+    raw = json.dumps({"o": ordering, "v": value, "id": row_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, ordering: str) -> Tuple[object, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        value, row_id = data["v"], int(data["id"])
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidCursor("cursor inválido") from e
+
+    # un cursor de otra ordenación no sirve para esta
+    if data.get("o") != ordering:
+        raise InvalidCursor("el cursor no corresponde a esta ordenación")
+    return value, row_id
+
+
+def keyset_page(qs, ordering: str, page_size: int, cursor: Optional[str] = None):
+    """
+    Devuelve (filas, next_cursor). `qs` sin ordenar; aquí se ordena por
+    (campo, id) en la dirección de `ordering`.
+    """
+    field = ordering.lstrip("-")
+    desc = ordering.startswith("-")
+    op = "lt" if desc else "gt"
+
+    if field == "id":
+        order_by = [ordering]
+    else:
+        order_by = [ordering, "-id" if desc else "id"]
+
+    if cursor:
+        value, row_id = decode_cursor(cursor, ordering)
+        if field == "id":
+            qs = qs.filter(**{f"id__{op}": row_id})
+        else:
+            # (campo, id) < (v, x) escrito como  campo <= v AND (campo < v OR id < x):
+            # el primer término acota el rango del índice (campo, id); con solo el
+            # OR PostgreSQL lee el índice desde el principio y descarta filas
+            bound = "lte" if desc else "gte"
+            qs = qs.filter(
+                Q(**{f"{field}__{bound}": value})
+                & (Q(**{f"{field}__{op}": value}) | Q(**{f"id__{op}": row_id}))
+            )
+
+    rows = list(qs.order_by(*order_by)[: page_size + 1])
+
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        next_cursor = encode_cursor(ordering, getattr(last, field), last.id)
+
+    return rows, next_cursor
+
+
+# =========================
+# Conteo
+# =========================
+def get_count_mode(value: Optional[str], default: str) -> str:
+    value = (value or "").strip().lower()
+    return value if value in COUNT_MODES else default
+
+
+def _table_estimate(model) -> Optional[int]:
+    if connection.vendor != "postgresql":
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+            [model._meta.db_table],
+        )
+        row = cursor.fetchone()
+    # -1 / 0 -> tabla sin ANALYZE todavía
+    if not row or row[0] is None or row[0] <= 0:
+        return None
+    return int(row[0])
+
+
+def count_leads(qs, mode: str, filtered: bool) -> dict:
+    """
+    {"count": n | None, "count_mode": ..., "count_is_estimate": bool}
+    + "count_capped": True si el conteo con tope se quedó corto.
+    """
+    if mode == "none":
+        return {"count": None, "count_mode": mode, "count_is_estimate": False}
+
+    if mode == "exact":
+        return {"count": qs.count(), "count_mode": mode, "count_is_estimate": False}
+
+    if not filtered:
+        estimate = _table_estimate(qs.model)
+        if estimate is not None:
+            return {"count": estimate, "count_mode": mode, "count_is_estimate": True}
+
+    capped = qs.order_by()[: ESTIMATE_COUNT_CAP + 1].count()
+    return {
+        "count": min(capped, ESTIMATE_COUNT_CAP),
+        "count_mode": mode,
+        "count_is_estimate": capped > ESTIMATE_COUNT_CAP,
+        "count_capped": capped > ESTIMATE_COUNT_CAP,
+    }
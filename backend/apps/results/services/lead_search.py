@@ -0,0 +1,57 @@
+"""
+Búsqueda de leads (InformeDataUsers).
+
+- nombre / email / movil: icontains -> en PostgreSQL es UPPER(col::text) LIKE,
+  que usa los índices GIN pg_trgm de la migración 0016 (en SQLite, scan normal).
+- evaluation uuid: nunca icontains (castea la columna). UUID completo -> igualdad;
+  prefijo hex -> rango [prefijo000..., prefijofff...] sobre el índice único.
+- Todo en un solo Q (un WHERE con OR), sin unir querysets.
+"""
+
+from __future__ import annotations
+
+import re
+import uuid as uuid_lib
+from typing import Optional, Tuple
+
+from django.db.models import Q
+
+from apps.results.api.models.index import Evaluation
+
+HEX_RE = re.compile(r"^[0-9a-f]+$")
+MIN_UUID_PREFIX = 4
+
+
+def uuid_prefix_range(term: str) -> Optional[Tuple[uuid_lib.UUID, uuid_lib.UUID]]:
+    """'4fe2e1c8-7c' -> (4fe2e1c87c000..., 4fe2e1c87cfff...). None si no parece un uuid."""
+    digits = term.strip().lower().replace("-", "")
+    if len(digits) < MIN_UUID_PREFIX or len(digits) > 32 or not HEX_RE.match(digits):
+        return None
+    low = uuid_lib.UUID(digits.ljust(32, "0"))
+    high = uuid_lib.UUID(digits.ljust(32, "f"))
+    return low, high
+
+
+def evaluation_uuid_q(term: str) -> Optional[Q]:
+    """Q sobre evaluation_id para un uuid completo o un prefijo hex."""
+    # subconsulta sobre Evaluation (índice único de uuid) -> IN por evaluation_id,
+    # así el OR queda sobre la propia tabla de leads (sin JOIN)
+    try:
+        evaluations = Evaluation.objects.filter(uuid=uuid_lib.UUID(term.strip()))
+    except ValueError:
+        bounds = uuid_prefix_range(term)
+        if bounds is None:
+            return None
+        evaluations = Evaluation.objects.filter(uuid__gte=bounds[0], uuid__lte=bounds[1])
+
+    return Q(evaluation_id__in=evaluations.values("id"))
+
+
+def lead_search_q(term: str) -> Q:
+    term = (term or "").strip()
+    q = Q(nombre__icontains=term) | Q(email__icontains=term) | Q(movil__icontains=term)
+
+    uuid_q = evaluation_uuid_q(term)
+    if uuid_q is not None:
+        q |= uuid_q
+    return q
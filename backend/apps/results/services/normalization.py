@@ -0,0 +1,132 @@
+"""
+Normalización de marcas / modelos compartida por parseo, scoring e informe.
+
+- Pipeline fijo: strip -> NFKC -> colapsar espacios (regex precompilada).
+- brand_forms() devuelve (clave, display) de una marca y queda memoizada en
+  una tabla LRU acotada: una marca repetida cuesta una búsqueda en dict.
+- split_brand_model() entiende el formato que piden los prompts
+  ("Brand | Model"); sin "|" cae al corte por el primer espacio.
+- BrandDisplay: nombre a mostrar de cada marca con una sola regla para
+  scoring (memoria y SQL), informe y rollups.
+"""
+
+from __future__ import annotations
+
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from functools import lru_cache
+from typing import Dict, Tuple
+
+# nº de marcas / textos distintos que se recuerdan por proceso
+INTERN_SIZE = 8192
+
+_WHITESPACE = re.compile(r"\s+")
+BRAND_MODEL_SEPARATOR = "|"
+
+
+@lru_cache(maxsize=INTERN_SIZE)
+def clean_text(s: str) -> str:
+    """
+    Normaliza espacios y unicode para evitar duplicados por caracteres raros.
+    """
+    s = (s or "").strip()
+    s = unicodedata.normalize("NFKC", s)
+    return _WHITESPACE.sub(" ", s)
+
+
+def _display(b: str) -> str:
+    if not b:
+        return ""
+
+    # Mantener acrónimos cortos (sin espacios): NB, ASICS
+    if b.isupper() and len(b) <= 8 and " " not in b:
+        return b
+
+    # Title Case palabra a palabra (sin lista fija)
+    return " ".join((w[:1].upper() + w[1:].lower()) if w else "" for w in b.split(" "))
+
+
+@lru_cache(maxsize=INTERN_SIZE)
+def brand_forms(brand: str) -> Tuple[str, str]:
+    """
+    (clave, display) de una marca:
+    - clave case-insensitive: 'Adidas', 'adidas', 'ADIDAS' -> 'adidas'
+    - display "bonito" sin lista fija
+    """
+    b = clean_text(brand or "")
+    return b.casefold(), _display(b)
+
+
+def normalize_brand_key(brand: str) -> str:
+    return brand_forms(brand or "")[0]
+
+
+def normalize_brand_display(brand: str) -> str:
+    return brand_forms(brand or "")[1]
+
+
+def normalize_model(model: str) -> str:
+    return clean_text(model or "")
+
+
+def text_key(s: str) -> str:
+    """Clave case-insensitive de texto libre (product_type, país, criterio)."""
+    return clean_text(s or "").casefold()
+
+
+def item_keys(brand: str, model: str) -> Tuple[str, str]:
+    """(brand_key, model_key) que se guardan en RankingItem."""
+    return normalize_brand_key(brand), normalize_model(model).casefold()
+
+
+def split_brand_model(raw_text: str) -> Tuple[str, str]:
+    """
+    "New Balance | 1080v13" -> ("New Balance", "1080v13")
+    Sin separador (respuestas antiguas): primera palabra = marca.
+    """
+    text = clean_text(raw_text or "")
+    if not text:
+        return ("", "")
+
+    if BRAND_MODEL_SEPARATOR in text:
+        brand, _, model = text.partition(BRAND_MODEL_SEPARATOR)
+        return (brand.strip(), model.strip())
+
+    parts = text.split(" ", 1)
+    if len(parts) == 1:
+        return (parts[0], "")
+    return (parts[0].strip(), parts[1].strip())
+
+
+class BrandDisplay:
+    """
+    Display de cada marca = su grafía más frecuente (empate -> la menor en
+    orden de texto), pasada por _display. No depende del orden en que se leen
+    los items: full run, resume e informe eligen el mismo nombre.
+    """
+
+    def __init__(self):
+        self._votes: Dict[str, Counter] = defaultdict(Counter)
+
+    def add(self, brand: str, count: int = 1) -> str:
+        """Cuenta `count` apariciones de la grafía; devuelve la clave de la marca."""
+        b = clean_text(brand or "")
+        key = brand_forms(b)[0]
+        if key:
+            self._votes[key][b] += count
+        return key
+
+    def get(self, key: str, default: str = "") -> str:
+        votes = self._votes.get(key)
+        if not votes:
+            return default
+        spelling = min(votes.items(), key=lambda kv: (-kv[1], kv[0]))[0]
+        return brand_forms(spelling)[1]
+
+
+def cache_info() -> dict:
+    return {
+        "clean_text": clean_text.cache_info()._asdict(),
+        "brand_forms": brand_forms.cache_info()._asdict(),
+    }
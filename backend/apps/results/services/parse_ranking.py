@@ -1,7 +1,24 @@
+import re
+from typing import Dict, List, Optional
+
+from toon_format import decode
+
+from apps.results.services.normalization import split_brand_model
+
+RANKING_SIZE = 5
+
+# forma fija que piden los prompts: ranking[5]: a,b,c,d,e
+# (como decode(): líneas en blanco delante sí, sangría no)
+_RANKING_HEADER = re.compile(r"^(?:\r?\n)*ranking\[(\d+)\]:")
+# valores que el decoder genérico convierte a número / bool / null
+_TOON_LITERAL = re.compile(r"^(?:true|false|null|-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?)$")
+
+
 def parse_ranking(decoded: dict):
     """
     Espera:
-      ranking => ["Nike Air Max", "Adidas Ultraboost", ...]
+      ranking => ["Nike | Air Max", "New Balance | 1080v13", ...]
+    (formato "Brand | Model" de los prompts; sin "|" -> primera palabra = marca)
     """
     ranking = decoded.get("ranking")
 
@@ -10,9 +27,7 @@ def parse_ranking(decoded: dict):
 
     parsed = []
     for idx, raw in enumerate(ranking, start=1):
-        parts = raw.split(" ", 1)
-        brand = parts[0].strip()
-        model = parts[1].strip() if len(parts) > 1 else ""
+        brand, model = split_brand_model(raw)
         parsed.append({
             "position": idx,
             "brand": brand,
@@ -21,3 +36,51 @@ def parse_ranking(decoded: dict):
         })
 
     return parsed
+
+
+def _split_ranking_fast(text: str, size: int) -> Optional[List[str]]:
+    """
+    Una pasada sobre `ranking[N]: a,b,c`. None si el texto no es el caso
+    simple (comillas, otro delimitador, literales...) y hay que usar decode().
+    """
+    match = _RANKING_HEADER.match(text)
+    if match is None or int(match.group(1)) != size:
+        return None
+
+    body = text[match.end():].rstrip()
+    if '"' in body or "\n" in body:
+        return None
+
+    values = [v.strip() for v in body.split(",")]
+    if len(values) != size or any(_TOON_LITERAL.match(v) for v in values):
+        return None
+    return values
+
+
+def _split_ranking_generic(text: str, size: int) -> Optional[List[str]]:
+    try:
+        decoded = decode(text)
+    except Exception:
+        return None
+    ranking = decoded.get("ranking") if isinstance(decoded, dict) else None
+    if not isinstance(ranking, list) or len(ranking) != size:
+        return None
+    if not all(isinstance(v, str) for v in ranking):
+        return None
+    return ranking
+
+
+def decode_ranking_toon(text: str, size: int = RANKING_SIZE) -> Optional[List[str]]:
+    """Lista de `size` strings del TOON `ranking[size]: ...`, o None si no es válido."""
+    values = _split_ranking_fast(text or "", size)
+    if values is None:
+        values = _split_ranking_generic(text or "", size)
+    return values
+
+
+def parse_toon_ranking5(text: str) -> Optional[List[Dict]]:
+    """Valida y parsea la respuesta del modelo en una pasada; None si no es un ranking[5] válido."""
+    values = decode_ranking_toon(text, RANKING_SIZE)
+    if values is None:
+        return None
+    return parse_ranking({"ranking": values})
@@ -0,0 +1,255 @@
+"""
+Caché en disco de los PDFs del informe (MEDIA_ROOT/report_pdfs).
+
+- Solo evaluaciones en SUCCESS (las demás cambian). La clave es el sha256 de
+  uuid + completed_at + SCORING_VERSION + renderer: un rerun o un cambio de
+  scoring generan otro fichero, nunca se sirve uno viejo.
+      report_pdfs/<uuid>/<clave>.pdf
+- Escritura atómica (tmp + os.replace): una descarga concurrente nunca ve
+  un PDF a medias.
+- Al guardar se borran las versiones anteriores de esa evaluación y se
+  aplica la expulsión: edad máxima y tamaño total (las menos usadas
+  primero; cada hit actualiza el mtime).
+- Con REPORT_PDF_CACHE["X_ACCEL_REDIRECT"] el fichero lo sirve nginx
+  (location interna) y gunicorn no lo lee.
+
+Configuración en settings.REPORT_PDF_CACHE.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+
+from apps.results.api.models.index import Evaluation
+from apps.results.services.scoring import SCORING_VERSION
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONFIG = {
+    "ENABLED": True,
+    "DIR": "report_pdfs",
+    "MAX_BYTES": 500 * 1024 * 1024,
+    "MAX_AGE_DAYS": 30,
+    "X_ACCEL_REDIRECT": "",
+}
+# ficheros temporales huérfanos (PDFs a medio escribir, NamedTemporaryFile antiguos)
+TEMP_MAX_AGE_SECONDS = 3600
+
+_PARTIAL_SUFFIX = ".part"
+
+
+def get_config() -> dict:
+    return {**DEFAULT_CONFIG, **(getattr(settings, "REPORT_PDF_CACHE", {}) or {})}
+
+
+def cache_root() -> Path:
+    return Path(settings.MEDIA_ROOT) / get_config()["DIR"]
+
+
+def cache_key(uuid, completed_at, renderer: str = "browser") -> str:
+    stamp = completed_at.isoformat() if completed_at else "-"
+    raw = f"{uuid}|{stamp}|v{SCORING_VERSION}|{renderer}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def cacheable_key(uuid, renderer: str = "browser") -> Optional[str]:
+    """Clave si el PDF de esta evaluación se puede cachear (SUCCESS), si no None."""
+    if not get_config()["ENABLED"]:
+        return None
+    row = Evaluation.objects.filter(uuid=uuid).values_list("status", "completed_at").first()
+    if row is None or row[0] != "SUCCESS":
+        return None
+    return cache_key(uuid, row[1], renderer)
+
+
+def _path(uuid, key: str) -> Path:
+    return cache_root() / str(uuid) / f"{key}.pdf"
+
+
+# =========================
+# Lectura / escritura
+# =========================
+def lookup(uuid, key: str) -> Optional[Path]:
+    path = _path(uuid, key)
+    try:
+        # mtime = último uso (LRU para la expulsión por tamaño)
+        os.utime(path)
+    except FileNotFoundError:
+        return None
+    return path
+
+
+def store(uuid, key: str, pdf: bytes) -> Path:
+    path = _path(uuid, key)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=_PARTIAL_SUFFIX)
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(pdf)
+        os.replace(tmp_path, path)
+    except BaseException:
+        Path(tmp_path).unlink(missing_ok=True)
+        raise
+
+    # versiones anteriores de esta evaluación ya no se van a pedir
+    for old in path.parent.glob("*.pdf"):
+        if old != path:
+            old.unlink(missing_ok=True)
+
+    try:
+        evict()
+    except OSError as e:
+        logger.warning(f"[PDF CACHE] expulsión: {e}")
+    return path
+
+
+def etag_for(key: str) -> str:
+    return f'"pdf-{key[:40]}"'
+
+
+def get_or_render(uuid, key: Optional[str], render: Callable[[], bytes]):
+    """
+    (path, None) si el PDF está o queda cacheado; (None, bytes) si no hay
+    clave (evaluación no cacheable, ver cacheable_key) o no se pudo guardar.
+    """
+    if key is None:
+        return None, render()
+
+    path = lookup(uuid, key)
+    if path is not None:
+        return path, None
+
+    pdf = render()
+    try:
+        return store(uuid, key, pdf), None
+    except OSError as e:
+        # disco lleno / sin permisos: se sirve igual, sin cachear
+        logger.warning(f"[PDF CACHE] no se pudo guardar {uuid}: {e}")
+        return None, pdf
+
+
+def file_response(path: Path, filename: str):
+    """Respuesta para un PDF cacheado: X-Accel-Redirect si está configurado."""
+    prefix = get_config()["X_ACCEL_REDIRECT"]
+    if prefix:
+        resp = HttpResponse(content_type="application/pdf")
+        resp["X-Accel-Redirect"] = f"{prefix.rstrip('/')}/{path.relative_to(cache_root()).as_posix()}"
+    else:
+        resp = FileResponse(open(path, "rb"), content_type="application/pdf")
+    resp["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return resp
+
+
+# =========================
+# Expulsión / limpieza
+# =========================
+def _cached_files():
+    root = cache_root()
+    if not root.exists():
+        return []
+    files = []
+    for path in root.glob("*/*.pdf"):
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            continue
+        files.append((st.st_mtime, st.st_size, path))
+    return files
+
+
+def evict(max_bytes: Optional[int] = None, max_age_days: Optional[float] = None) -> int:
+    """Borra PDFs más viejos que MAX_AGE_DAYS y luego los menos usados hasta MAX_BYTES."""
+    config = get_config()
+    max_bytes = int(config["MAX_BYTES"] if max_bytes is None else max_bytes)
+    max_age_days = float(config["MAX_AGE_DAYS"] if max_age_days is None else max_age_days)
+
+    cutoff = time.time() - max_age_days * 86400
+    removed = 0
+    kept = []
+    for mtime, size, path in _cached_files():
+        if mtime < cutoff:
+            path.unlink(missing_ok=True)
+            removed += 1
+        else:
+            kept.append((mtime, size, path))
+
+    total = sum(size for _, size, _ in kept)
+    for mtime, size, path in sorted(kept):
+        if total <= max_bytes:
+            break
+        path.unlink(missing_ok=True)
+        total -= size
+        removed += 1
+
+    _remove_empty_dirs()
+    return removed
+
+
+def _remove_empty_dirs() -> None:
+    root = cache_root()
+    if not root.exists():
+        return
+    for directory in root.iterdir():
+        if directory.is_dir():
+            try:
+                directory.rmdir()
+            except OSError:
+                # no está vacío
+                pass
+
+
+def clear() -> int:
+    files = _cached_files()
+    shutil.rmtree(cache_root(), ignore_errors=True)
+    return len(files)
+
+
+def cleanup_temp_files(max_age_seconds: int = TEMP_MAX_AGE_SECONDS) -> int:
+    """
+    Borra restos que nadie va a reclamar:
+    - *.part en la caché (proceso muerto a mitad de escritura)
+    - /tmp/tmp*.pdf del antiguo NamedTemporaryFile(delete=False)
+    - /tmp/goaiso-pdf-* del fallback por subprocess
+    """
+    cutoff = time.time() - max_age_seconds
+    candidates = list(cache_root().glob(f"*/*{_PARTIAL_SUFFIX}")) if cache_root().exists() else []
+    tmp_dir = Path(tempfile.gettempdir())
+    candidates += list(tmp_dir.glob("tmp*.pdf"))
+    candidates += list(tmp_dir.glob("goaiso-pdf-*"))
+
+    removed = 0
+    for path in candidates:
+        try:
+            if path.lstat().st_mtime >= cutoff:
+                continue
+            if path.is_dir():
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                path.unlink(missing_ok=True)
+            removed += 1
+        except FileNotFoundError:
+            continue
+    return removed
+
+
+def stats() -> dict:
+    files = _cached_files()
+    config = get_config()
+    return {
+        "files": len(files),
+        "bytes": sum(size for _, size, _ in files),
+        "max_bytes": int(config["MAX_BYTES"]),
+        "max_age_days": float(config["MAX_AGE_DAYS"]),
+        "path": str(cache_root()),
+    }
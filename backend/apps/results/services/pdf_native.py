@@ -0,0 +1,264 @@
+"""
+PDF del informe generado en proceso con reportlab, directamente desde el
+dict de build_report (sin navegador, sin frontend, sin otra llamada a la API).
+
+Mismas secciones que la página /results/<uuid>?pdf=1:
+  métricas -> 1 ranking general (cuota por marca + top modelos)
+  -> 2 detalle por criterio -> matriz de posicionamiento.
+
+Se importa de forma perezosa (pdf_renderer.render_report_pdf_native):
+reportlab solo hace falta si se usa este renderer.
+"""
+
+from __future__ import annotations
+
+import io
+from datetime import datetime
+from typing import Dict, List
+from xml.sax.saxutils import escape
+
+from reportlab.graphics.charts.barcharts import HorizontalBarChart
+from reportlab.graphics.charts.piecharts import Pie
+from reportlab.graphics.shapes import Drawing, Rect, String
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4, landscape
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import mm
+from reportlab.platypus import KeepTogether, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+PALETTE = [
+    colors.HexColor(c)
+    for c in (
+        "#6366F1", "#22C55E", "#F59E0B", "#EF4444", "#06B6D4",
+        "#A855F7", "#84CC16", "#F97316", "#EC4899", "#64748B",
+    )
+]
+HEADER_BG = colors.HexColor("#111827")
+GRID = colors.HexColor("#D1D5DB")
+RANK_BG = {1: colors.HexColor("#FDE68A"), 2: colors.HexColor("#E5E7EB"), 3: colors.HexColor("#FED7AA")}
+
+# con muchas columnas la matriz no cabe en vertical
+LANDSCAPE_FROM_CRITERIA = 6
+MAX_LABEL_CHARS = 32
+
+_styles = getSampleStyleSheet()
+TITLE = ParagraphStyle("GoaisoTitle", parent=_styles["Title"], fontSize=18, spaceAfter=2)
+SUBTITLE = ParagraphStyle("GoaisoSubtitle", parent=_styles["Normal"], textColor=colors.HexColor("#6B7280"))
+H2 = ParagraphStyle("GoaisoH2", parent=_styles["Heading2"], spaceBefore=10, spaceAfter=4)
+H3 = ParagraphStyle("GoaisoH3", parent=_styles["Heading4"], spaceBefore=6, spaceAfter=2)
+BODY = ParagraphStyle("GoaisoBody", parent=_styles["Normal"], fontSize=9, leading=12)
+CELL = ParagraphStyle("GoaisoCell", parent=_styles["Normal"], fontSize=8, leading=10)
+METRIC = ParagraphStyle("GoaisoMetric", parent=_styles["Normal"], fontName="Helvetica-Bold", fontSize=13, leading=16)
+HEAD_CELL = ParagraphStyle("GoaisoHeadCell", parent=CELL, textColor=colors.white, fontName="Helvetica-Bold")
+
+
+def _p(text, style=BODY) -> Paragraph:
+    return Paragraph(escape(str(text)), style)
+
+
+def _short(text: str, limit: int = MAX_LABEL_CHARS) -> str:
+    text = str(text or "")
+    return text if len(text) <= limit else text[: limit - 1] + "…"
+
+
+def _format_timestamp(value: str) -> str:
+    try:
+        return datetime.fromisoformat(value).strftime("%d/%m/%Y %H:%M")
+    except (TypeError, ValueError):
+        return str(value or "")
+
+
+# =========================
+# Gráficas
+# =========================
+def _no_data(width: float, height: float) -> Drawing:
+    drawing = Drawing(width, height)
+    drawing.add(String(width / 2, height / 2, "Sin datos", textAnchor="middle", fontName="Helvetica", fontSize=10, fillColor=colors.grey))
+    return drawing
+
+
+def _pie(data: List[Dict], width: float, height: float = 70 * mm) -> Drawing:
+    """Cuota de presencia por marca (100%) con leyenda a la derecha."""
+    data = [d for d in data if d.get("share")]
+    if not data:
+        return _no_data(width, height)
+
+    drawing = Drawing(width, height)
+    size = min(height - 10 * mm, width / 2)
+
+    pie = Pie()
+    pie.x, pie.y = 5 * mm, (height - size) / 2
+    pie.width = pie.height = size
+    pie.data = [float(d["share"]) for d in data]
+    pie.labels = None
+    pie.slices.strokeColor = colors.white
+    pie.slices.strokeWidth = 0.5
+    for idx in range(len(data)):
+        pie.slices[idx].fillColor = PALETTE[idx % len(PALETTE)]
+    drawing.add(pie)
+
+    legend_x = pie.x + size + 8 * mm
+    row_h = min(5 * mm, (height - 4 * mm) / len(data))
+    top = (height + row_h * len(data)) / 2
+    for idx, d in enumerate(data):
+        y = top - (idx + 1) * row_h
+        drawing.add(Rect(legend_x, y, 3 * mm, 3 * mm, fillColor=PALETTE[idx % len(PALETTE)], strokeColor=None))
+        drawing.add(String(legend_x + 4 * mm, y, f"{_short(d['name'])}  {d['share']}%", fontName="Helvetica", fontSize=8))
+    return drawing
+
+
+def _hbars(data: List[Dict], width: float, bar_height: float = 5 * mm) -> Drawing:
+    """Barras horizontales de cuota (%), mayor arriba."""
+    data = [d for d in data if d.get("share") is not None]
+    if not data:
+        return _no_data(width, 20 * mm)
+
+    label_w = 45 * mm
+    height = bar_height * len(data) + 10 * mm
+    drawing = Drawing(width, height)
+
+    chart = HorizontalBarChart()
+    chart.x, chart.y = label_w, 6 * mm
+    chart.width = width - label_w - 15 * mm
+    chart.height = bar_height * len(data)
+    # reportlab pinta la primera categoría abajo
+    rows = list(reversed(data))
+    chart.data = [[float(d["share"]) for d in rows]]
+    chart.categoryAxis.categoryNames = [_short(d["name"]) for d in rows]
+    chart.categoryAxis.labels.fontSize = 7
+    chart.categoryAxis.labels.fontName = "Helvetica"
+    chart.categoryAxis.labels.boxAnchor = "e"
+    chart.categoryAxis.strokeColor = GRID
+    chart.valueAxis.valueMin = 0
+    chart.valueAxis.valueMax = max(10.0, min(100.0, max(float(d["share"]) for d in data) * 1.15))
+    chart.valueAxis.labels.fontSize = 7
+    chart.valueAxis.labels.fontName = "Helvetica"
+    chart.valueAxis.labelTextFormat = "%d%%"
+    chart.valueAxis.strokeColor = GRID
+    chart.bars[0].fillColor = PALETTE[0]
+    chart.bars[0].strokeColor = None
+    chart.barLabelFormat = "%.1f%%"
+    chart.barLabels.fontSize = 7
+    chart.barLabels.fontName = "Helvetica"
+    chart.barLabels.boxAnchor = "w"
+    chart.barLabels.dx = 2
+    drawing.add(chart)
+    return drawing
+
+
+# =========================
+# Tablas
+# =========================
+def _metrics_table(metrics: Dict, width: float) -> Table:
+    cells = [
+        ("Marca Top", metrics.get("topBrand", "N/A")),
+        ("Cuota Top", f"{metrics.get('topShare', 0)}%"),
+        ("Número de marcas analizadas", metrics.get("uniqueBrands", 0)),
+    ]
+    table = Table(
+        [[_p(label, CELL) for label, _ in cells], [_p(value, METRIC) for _, value in cells]],
+        colWidths=[width / 3] * 3,
+    )
+    table.setStyle(
+        TableStyle(
+            [
+                ("BOX", (0, 0), (-1, -1), 0.5, GRID),
+                ("INNERGRID", (0, 0), (-1, -1), 0.5, GRID),
+                ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#F3F4F6")),
+                ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+            ]
+        )
+    )
+    return table
+
+
+def _matrix_table(matrix: Dict, width: float) -> Table:
+    brands = matrix.get("brands") or []
+    criteria = matrix.get("criteria") or []
+    ranks = matrix.get("ranks") or {}
+
+    brand_w = min(55 * mm, width * 0.3)
+    crit_w = (width - brand_w) / max(1, len(criteria))
+
+    rows = [[_p("Marcas", HEAD_CELL)] + [_p(f"#{c}", HEAD_CELL) for c in criteria]]
+    style = [
+        ("BACKGROUND", (0, 0), (-1, 0), HEADER_BG),
+        ("GRID", (0, 0), (-1, -1), 0.4, GRID),
+        ("ALIGN", (1, 1), (-1, -1), "CENTER"),
+        ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+        ("FONTSIZE", (0, 1), (-1, -1), 8),
+        ("ROWBACKGROUNDS", (0, 1), (-1, -1), [colors.white, colors.HexColor("#F9FAFB")]),
+    ]
+    for r, brand in enumerate(brands, start=1):
+        row = [_p(brand, CELL)]
+        for c, crit in enumerate(criteria, start=1):
+            rank = (ranks.get(crit) or {}).get(brand)
+            row.append(f"{rank}º" if rank else "—")
+            if rank in RANK_BG:
+                style.append(("BACKGROUND", (c, r), (c, r), RANK_BG[rank]))
+        rows.append(row)
+
+    table = Table(rows, colWidths=[brand_w] + [crit_w] * len(criteria), repeatRows=1)
+    table.setStyle(TableStyle(style))
+    return table
+
+
+# =========================
+# Documento
+# =========================
+def build_pdf(report: Dict) -> bytes:
+    """PDF (bytes) a partir del dict de build_report."""
+    matrix = report.get("matrix") or {}
+    pagesize = landscape(A4) if len(matrix.get("criteria") or []) > LANDSCAPE_FROM_CRITERIA else A4
+
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(
+        buffer,
+        pagesize=pagesize,
+        leftMargin=12 * mm,
+        rightMargin=12 * mm,
+        topMargin=12 * mm,
+        bottomMargin=12 * mm,
+        title=f"Informe GoAiso - {report.get('product_type', '')}",
+    )
+    width = doc.width
+    phase1 = report.get("phase1") or {}
+
+    story = [
+        _p(f"Producto/servicio: {report.get('product_type', '')}", TITLE),
+        _p(_format_timestamp(report.get("timestamp", "")), SUBTITLE),
+        Spacer(1, 6 * mm),
+        _metrics_table(report.get("metrics") or {}, width),
+        _p("1 — Ranking general", H2),
+        _p(
+            "Puntos por posición en cada ranking (1º=5, 2º=4, 3º=3, 4º=2, 5º=1), "
+            "sumados por marca y expresados como porcentaje sobre 100."
+        ),
+        KeepTogether([_p("Cuota de presencia por marca (100%)", H3), _pie(phase1.get("topBrands") or [], width)]),
+        KeepTogether([_p("Top modelos (cuota %)", H3), _hbars(phase1.get("topModels") or [], width)]),
+        _p("2 — Detalle por criterio", H2),
+        _p("Cómo cambian las cuotas (%) cuando el usuario busca por cada característica."),
+    ]
+
+    for criterion in report.get("phase2") or []:
+        story.append(
+            KeepTogether(
+                [
+                    _p(f"{criterion.get('criterion', '')} — cuota % por marca", H3),
+                    _hbars(criterion.get("topBrands") or [], width),
+                ]
+            )
+        )
+
+    story += [
+        _p("Resumen — Matriz de posicionamiento por criterio", H2),
+        _p("Puesto relativo de cada marca por criterio. ( — ) la marca no apareció en ese criterio."),
+        Spacer(1, 2 * mm),
+    ]
+    if matrix.get("brands") and matrix.get("criteria"):
+        story.append(_matrix_table(matrix, width))
+    else:
+        story.append(_p("Sin datos"))
+
+    doc.build(story)
+    return buffer.getvalue()
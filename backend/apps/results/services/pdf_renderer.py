@@ -0,0 +1,135 @@
+"""
+Render del PDF del informe (frontend ?pdf=1 -> Chromium -> PDF).
+
+- Si hay PDF_RENDERER_URL: POST al servicio render_server.js (pool de
+  pestañas caliente, cola acotada, timeout por job). Sin arranque de
+  Node/Chromium por petición.
+- Si el servicio no está configurado o no responde: fallback al CLI
+  render_report_pdf.js (un proceso por PDF, como antes).
+- renderer "native": reportlab en proceso desde el dict de build_report
+  (services/pdf_native.py), sin navegador ni frontend.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import subprocess
+import tempfile
+
+import httpx
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 150
+
+RENDERERS = ("browser", "native")
+DEFAULT_RENDERER = "browser"
+
+
+class PdfRenderError(Exception):
+    def __init__(self, message: str, status: int = 500):
+        super().__init__(message)
+        self.status = status
+
+
+class PdfRendererBusy(PdfRenderError):
+    """Cola del servicio llena: mejor pedir reintento que lanzar otro Chromium."""
+
+    def __init__(self, message: str, retry_after: str = "5"):
+        super().__init__(message, status=503)
+        self.retry_after = retry_after
+
+
+def report_url(uuid) -> str:
+    front_base = getattr(settings, "FRONTEND_BASE_URL", "http://localhost:3000")
+    return f"{front_base}/results/{uuid}?pdf=1"
+
+
+def get_renderer(value=None) -> str:
+    """?renderer= de la petición o settings.REPORT_PDF_RENDERER; valores desconocidos -> default."""
+    value = (value or getattr(settings, "REPORT_PDF_RENDERER", DEFAULT_RENDERER) or "").strip().lower()
+    return value if value in RENDERERS else DEFAULT_RENDERER
+
+
+def _timeout() -> float:
+    return float(getattr(settings, "PDF_RENDER_TIMEOUT", DEFAULT_TIMEOUT))
+
+
+# =========================
+# Servicio (pool caliente)
+# =========================
+def _render_via_service(base_url: str, url: str) -> bytes:
+    resp = httpx.post(
+        f"{base_url.rstrip('/')}/render",
+        json={"url": url},
+        timeout=httpx.Timeout(_timeout(), connect=2.0),
+    )
+    if resp.status_code == 200:
+        return resp.content
+    if resp.status_code == 503:
+        raise PdfRendererBusy("Servicio de PDF saturado", resp.headers.get("Retry-After", "5"))
+
+    try:
+        detail = resp.json().get("error", "")
+    except ValueError:
+        detail = resp.text[:500]
+    raise PdfRenderError(f"Error generando PDF ({resp.status_code}): {detail}", status=502)
+
+
+# =========================
+# Fallback: un proceso por PDF
+# =========================
+def _render_via_subprocess(url: str) -> bytes:
+    script_path = os.path.join(settings.BASE_DIR, "apps", "base", "scripts", "render_report_pdf.js")
+
+    # el directorio (y el PDF) se borran al salir: nada se queda en /tmp
+    with tempfile.TemporaryDirectory(prefix="goaiso-pdf-") as tmp_dir:
+        out_path = os.path.join(tmp_dir, "report.pdf")
+        try:
+            subprocess.run(
+                ["node", script_path, url, out_path],
+                capture_output=True,
+                text=True,
+                check=True,
+                timeout=_timeout(),
+            )
+        except subprocess.CalledProcessError as e:
+            raise PdfRenderError(
+                "Error generando PDF.\n\nSTDOUT:\n" + (e.stdout or "") + "\n\nSTDERR:\n" + (e.stderr or "")
+            )
+        except subprocess.TimeoutExpired:
+            raise PdfRenderError("Timeout generando PDF", status=504)
+
+        with open(out_path, "rb") as fh:
+            return fh.read()
+
+
+def render_report_pdf(uuid) -> bytes:
+    """PDF del informe `uuid`. Lanza PdfRenderError / PdfRendererBusy."""
+    url = report_url(uuid)
+    service_url = getattr(settings, "PDF_RENDERER_URL", "")
+
+    if service_url:
+        try:
+            return _render_via_service(service_url, url)
+        except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+            # servicio caído: mejor lento que nada
+            logger.warning(f"[PDF] renderer no disponible ({e}), usando subprocess")
+        except httpx.TimeoutException:
+            raise PdfRenderError("Timeout generando PDF", status=504)
+
+    return _render_via_subprocess(url)
+
+
+# =========================
+# Native (reportlab)
+# =========================
+def render_report_pdf_native(report: dict) -> bytes:
+    """PDF desde el dict de build_report. reportlab solo se importa aquí."""
+    try:
+        from apps.results.services.pdf_native import build_pdf
+    except ImportError as e:
+        raise PdfRenderError(f"Renderer nativo no disponible: {e}")
+    return build_pdf(report)
@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+from typing import Dict, List, Sequence, Tuple
+
+from django.db import transaction
+
+from apps.results.api.models.index import PromptRun, RankingItem
+from apps.results.services.evaluation_cache import invalidate_evaluation_cache
+from apps.results.services.normalization import item_keys
+
+BULK_BATCH_SIZE = 500
+
+# (spec, toon_text, sources, parsed)
+RunResult = Tuple[Dict, str, List[str], List[Dict]]
+
+
+def _ranking_item(run: PromptRun, item: Dict) -> RankingItem:
+    brand_key, model_key = item_keys(item["brand"], item["model"])
+    return RankingItem(
+        prompt_run=run,
+        position=item["position"],
+        brand=item["brand"],
+        model=item["model"],
+        raw_text=item["raw_text"],
+        brand_key=brand_key,
+        model_key=model_key,
+    )
+
+
+def persist_runs(evaluation, results: Sequence[RunResult]) -> List[PromptRun]:
+    """
+    Guarda un lote de respuestas (normalmente una fase) en una sola transacción:
+    - 1 bulk_create de PromptRun (devuelve PKs en PostgreSQL)
+    - 1 bulk_create de todos sus RankingItem (con brand_key / model_key)
+    El orden de `results` se conserva (created_at / id crecientes).
+    """
+    if not results:
+        return []
+
+    with transaction.atomic():
+        runs = PromptRun.objects.bulk_create(
+            [
+                PromptRun(
+                    evaluation=evaluation,
+                    phase=spec["phase"],
+                    criterion=spec.get("criterion"),
+                    slot=spec.get("slot"),
+                    prompt_text=spec["prompt"],
+                    response_raw=toon_text,
+                    sources=sources,
+                )
+                for spec, toon_text, sources, _ in results
+            ],
+            batch_size=BULK_BATCH_SIZE,
+        )
+
+        RankingItem.objects.bulk_create(
+            [
+                _ranking_item(run, item)
+                for run, (_, _, _, parsed) in zip(runs, results)
+                for item in parsed
+            ],
+            batch_size=BULK_BATCH_SIZE,
+        )
+
+    invalidate_evaluation_cache(evaluation)
+    return runs
+
+
+def persist_runs_by_phase(evaluation, results: Sequence[RunResult]) -> List[PromptRun]:
+    """Una transacción por fase (PHASE1 y luego PHASE2), en el orden recibido."""
+    runs: List[PromptRun] = []
+    for phase in ("PHASE1", "PHASE2"):
+        runs += persist_runs(evaluation, [r for r in results if r[0]["phase"] == phase])
+    return runs
@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from apps.results.api.models.index import Evaluation, EvaluationEvent
+
+# El stream se corta solo cada EVALUATION_EVENTS_MAX_SECONDS; EventSource
+# reconecta con Last-Event-ID y sigue donde lo dejó.
+DEFAULT_STREAM_MAX_SECONDS = 120
+DEFAULT_POLL_SECONDS = 1.0
+KEEPALIVE_SECONDS = 15
+RECONNECT_MS = 3000
+# evento (no comentario) para que el front vea que el stream sigue vivo
+PING = "event: ping\ndata: {}\n\n"
+
+FINAL_STATUSES = ("SUCCESS", "ERROR")
+
+
+# =========================
+# Escritura (runner / jobs)
+# =========================
+def clear_events(evaluation):
+    EvaluationEvent.objects.filter(evaluation=evaluation).delete()
+
+
+def record_event(evaluation, kind: str, payload: Dict) -> EvaluationEvent:
+    return EvaluationEvent.objects.create(evaluation=evaluation, kind=kind, payload=payload)
+
+
+def record_start_event(evaluation, total: int, resume: bool = False):
+    return record_event(evaluation, "start", {"total": total, "resume": resume})
+
+
+def record_run_event(evaluation, spec: Dict, *, latency: float, valid: bool, done: int, total: int):
+    criterion = spec.get("criterion")
+    return record_event(evaluation, "run", {
+        "phase": spec["phase"],
+        "criterion": criterion.name if criterion else None,
+        "slot": spec.get("slot"),
+        "latency": latency,
+        "valid": valid,
+        "done": done,
+        "total": total,
+    })
+
+
+def record_complete_event(evaluation):
+    return record_event(evaluation, "complete", {
+        "status": evaluation.status,
+        "completed_at": evaluation.completed_at.isoformat() if evaluation.completed_at else None,
+    })
+
+
+# =========================
+# Lectura (SSE)
+# =========================
+def format_sse(event_id: Optional[int], kind: str, payload: Dict) -> str:
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {kind}")
+    lines.append(f"data: {json.dumps(payload, ensure_ascii=False)}")
+    return "\n".join(lines) + "\n\n"
+
+
+def _events_after(evaluation_id: int, last_event_id: int) -> List[Tuple[int, str, Dict]]:
+    # solo la tabla de eventos (índice evaluation,id)
+    return list(
+        EvaluationEvent.objects.filter(evaluation_id=evaluation_id, id__gt=last_event_id)
+        .order_by("id")
+        .values_list("id", "kind", "payload")[:500]
+    )
+
+
+def _finished_payload(evaluation_id: int) -> Optional[Dict]:
+    """Payload de "complete" si la evaluación ya no va a emitir eventos, si no None."""
+    row = (
+        Evaluation.objects.filter(pk=evaluation_id)
+        .values_list("status", "completed_at")
+        .first()
+    )
+    # terminada sin eventos (p.ej. ejecutada antes de existir el stream) o sin encolar
+    if row is None or row[0] in FINAL_STATUSES or row[0] == "PENDING":
+        status, completed_at = row or ("ERROR", None)
+        return {"status": status, "completed_at": completed_at.isoformat() if completed_at else None}
+    return None
+
+
+def _poll_stream(evaluation_id: int, last_event_id: int) -> Tuple[List[str], int, bool]:
+    """Una consulta del stream: (mensajes SSE, último id, terminado)."""
+    events = _events_after(evaluation_id, last_event_id)
+
+    chunks = []
+    for event_id, kind, payload in events:
+        last_event_id = event_id
+        chunks.append(format_sse(event_id, kind, payload))
+        if kind == "complete":
+            return chunks, last_event_id, True
+
+    if not events:
+        payload = _finished_payload(evaluation_id)
+        if payload is not None:
+            return [format_sse(None, "complete", payload)], last_event_id, True
+
+    return chunks, last_event_id, False
+
+
+def _stream_limits() -> Tuple[float, float]:
+    return (
+        getattr(settings, "EVALUATION_EVENTS_POLL_SECONDS", DEFAULT_POLL_SECONDS),
+        getattr(settings, "EVALUATION_EVENTS_MAX_SECONDS", DEFAULT_STREAM_MAX_SECONDS),
+    )
+
+
+def iter_evaluation_events(evaluation_id: int, last_event_id: int = 0) -> Iterator[str]:
+    """
+    Genera el stream SSE de una evaluación (WSGI: ocupa un worker mientras dura;
+    en producción el stream lo sirve el proceso ASGI, ver aiter_evaluation_events).
+    - Reenvía los eventos con id > last_event_id (reconexiones)
+    - Consulta solo la tabla de eventos cada EVALUATION_EVENTS_POLL_SECONDS
+    - Termina tras "complete" o al agotar EVALUATION_EVENTS_MAX_SECONDS
+    """
+    poll, max_seconds = _stream_limits()
+    started = last_sent = time.monotonic()
+
+    yield f"retry: {RECONNECT_MS}\n\n"
+
+    while time.monotonic() - started < max_seconds:
+        chunks, last_event_id, finished = _poll_stream(evaluation_id, last_event_id)
+        yield from chunks
+        if finished:
+            return
+        if chunks:
+            last_sent = time.monotonic()
+            continue
+
+        if time.monotonic() - last_sent >= KEEPALIVE_SECONDS:
+            last_sent = time.monotonic()
+            yield PING
+
+        time.sleep(poll)
+
+
+async def aiter_evaluation_events(evaluation_id: int, last_event_id: int = 0) -> AsyncIterator[str]:
+    """
+    Mismo stream para ASGI: espera con asyncio.sleep y consulta vía
+    sync_to_async, así un proceso uvicorn atiende muchos streams abiertos
+    sin bloquear workers de la API.
+    """
+    poll, max_seconds = _stream_limits()
+    started = last_sent = time.monotonic()
+    poll_stream = sync_to_async(_poll_stream)
+
+    yield f"retry: {RECONNECT_MS}\n\n"
+
+    while time.monotonic() - started < max_seconds:
+        chunks, last_event_id, finished = await poll_stream(evaluation_id, last_event_id)
+        for chunk in chunks:
+            yield chunk
+        if finished:
+            return
+        if chunks:
+            last_sent = time.monotonic()
+            continue
+
+        if time.monotonic() - last_sent >= KEEPALIVE_SECONDS:
+            last_sent = time.monotonic()
+            yield PING
+
+        await asyncio.sleep(poll)
+
+
+# =========================
+# Lectura (polling JSON)
+# =========================
+def evaluation_progress(evaluation_id: int, last_event_id: int = 0) -> Dict:
+    """
+    Alternativa barata al stream (fallback del front): una petición corta con
+    los eventos nuevos y si la evaluación ya terminó.
+    """
+    events = _events_after(evaluation_id, last_event_id)
+    complete = next((payload for _, kind, payload in events if kind == "complete"), None)
+    if complete is None and not events:
+        complete = _finished_payload(evaluation_id)
+
+    return {
+        "events": [{"id": event_id, "kind": kind, "data": payload} for event_id, kind, payload in events],
+        "last_event_id": events[-1][0] if events else last_event_id,
+        "finished": complete is not None,
+        "status": complete["status"] if complete else None,
+    }
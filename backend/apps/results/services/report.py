@@ -1,92 +1,31 @@
 from __future__ import annotations
 
 from collections import defaultdict
-from typing import Dict, Optional, List, Tuple
-import re
-import unicodedata
+from typing import Dict, NamedTuple, Optional, List, Tuple
 
 from apps.results.api.models.index import (
     PromptRun,
     RankingItem,
     EvaluationCriterion,
 )
+from apps.results.services.normalization import (
+    BrandDisplay,
+    clean_text,
+    normalize_brand_display,
+    normalize_model,
+    split_brand_model,
+)
 
 # Regla de puntos (solo top 5)
 POSITION_SCORE = {1: 5, 2: 4, 3: 3, 4: 2, 5: 1}
 
 
-# =========================
-# Normalización (sin marcas fijas)
-# =========================
-def _clean(s: str) -> str:
-    s = (s or "").strip()
-    s = unicodedata.normalize("NFKC", s)
-    s = re.sub(r"\s+", " ", s)
-    return s
-
-
-def normalize_brand_key(brand: str) -> str:
-    """
-    Clave estable para agrupar: case-insensitive.
-    Evita duplicados tipo Adidas/adidas/ADIDAS.
-    """
-    return _clean(brand).casefold()
-
-
-def normalize_brand_display(brand: str) -> str:
-    """
-    Nombre "bonito" para mostrar, sin lista fija.
-    """
-    b = _clean(brand)
-    if not b:
-        return ""
-
-    # Si viene en mayúsculas y es corto, respetar (ASICS, NB)
-    if b.isupper() and len(b) <= 8 and " " not in b:
-        return b
-
-    # Title case suave
-    return " ".join(
-        (w[:1].upper() + w[1:].lower()) if w else ""
-        for w in b.split(" ")
-    )
-
-
-def normalize_model(model: str) -> str:
-    return _clean(model)
-
-
-# =========================
-# Iterador seguro (evita cargar todo)
-# =========================
-def items_por_iter(qs):
-    """
-    Evita cargar todo en memoria si hay muchos items.
-    """
-    try:
-        return qs.iterator()
-    except Exception:
-        return qs
-
-
-# =========================
-# Parse Brand/Model (fallback)
-# =========================
 def parse_brand_model_from_raw(raw_text: str) -> Tuple[str, str]:
     """
-    Fallback SOLO si no tienes brand/model en DB.
-
-    IMPORTANTE:
-    - No soporta marcas compuestas: "New Balance 9060" -> ("New", "Balance 9060")
-    - Lo ideal es guardar brand/model en DB desde el parser original.
+    Fallback SOLO si no tienes brand/model en DB: "Brand | Model" o,
+    sin separador, primera palabra = marca (ver split_brand_model).
     """
-    raw_text = _clean(raw_text)
-    if not raw_text:
-        return ("", "")
-    parts = raw_text.split(" ", 1)
-    if len(parts) == 1:
-        return (parts[0], "")
-    return (parts[0].strip(), parts[1].strip())
+    return split_brand_model(raw_text)
 
 
 def calc_share_percent(score: int, total: int) -> float:
@@ -98,16 +37,16 @@ def calc_share_percent(score: int, total: int) -> float:
 # =========================
 # Helpers: obtener brand/model por item
 # =========================
-def get_item_brand_model(item: RankingItem) -> Tuple[str, str, str]:
+def get_item_brand_model(item: RankingItem | ReportItem) -> Tuple[str, str, str]:
     """
     Devuelve (brand_raw, model_raw, raw_text)
     - Si RankingItem tiene brand/model -> usa eso
     - Si no -> intenta parsear raw_text (fallback)
     """
-    raw_text = _clean(getattr(item, "raw_text", "") or "")
+    raw_text = clean_text(getattr(item, "raw_text", "") or "")
 
-    brand = _clean(getattr(item, "brand", "") or "")
-    model = _clean(getattr(item, "model", "") or "")
+    brand = clean_text(getattr(item, "brand", "") or "")
+    model = clean_text(getattr(item, "model", "") or "")
 
     if brand or model:
         return (brand, model, raw_text)
@@ -117,6 +56,57 @@ def get_item_brand_model(item: RankingItem) -> Tuple[str, str, str]:
     return (b, m, raw_text)
 
 
+# =========================
+# Lectura en bloque (1 consulta)
+# =========================
+class ReportItem(NamedTuple):
+    """Fila ligera (sin instancia de modelo); compatible con get_item_brand_model."""
+    position: int
+    brand: str
+    model: str
+    raw_text: str
+
+
+# (phase, criterion_id) -> [run -> [ReportItem ordenados por posición]]
+RunsByGroup = Dict[Tuple[str, Optional[int]], List[List[ReportItem]]]
+
+
+def fetch_report_runs(evaluation) -> RunsByGroup:
+    """
+    Todos los runs + items de la evaluación en una sola consulta
+    (LEFT JOIN PromptRun -> RankingItem), ordenados por fase, criterio,
+    run y posición. Un run sin items aparece como lista vacía.
+    """
+    rows = (
+        PromptRun.objects.filter(evaluation=evaluation)
+        .order_by("phase", "criterion_id", "slot", "created_at", "id", "items__position")
+        .values_list(
+            "id",
+            "phase",
+            "criterion_id",
+            "items__position",
+            "items__brand",
+            "items__model",
+            "items__raw_text",
+        )
+    )
+
+    runs_by_group: RunsByGroup = defaultdict(list)
+    current_run_id = None
+    current_items: List[ReportItem] = []
+
+    for run_id, phase, criterion_id, position, brand, model, raw_text in rows.iterator(chunk_size=2000):
+        if run_id != current_run_id:
+            current_run_id = run_id
+            current_items = []
+            runs_by_group[(phase, criterion_id)].append(current_items)
+
+        if position is not None:
+            current_items.append(ReportItem(position, brand or "", model or "", raw_text or ""))
+
+    return runs_by_group
+
+
 # =========================
 # Report builder
 # =========================
@@ -130,41 +120,38 @@ def build_report(evaluation) -> dict:
     NOTA IMPORTANTE:
     - La matriz debe reflejar TODAS las marcas que aparecen en las gráficas
       (phase2_summary), no solo "top 12" arbitrario.
+
+    Consultas: 1 para runs+items (fetch_report_runs) + 1 para criterios.
     """
+    runs_by_group = fetch_report_runs(evaluation)
 
     # ==========================
     # Phase 1: runs + raw table + scoring (brands/models)
     # ==========================
-    phase1_runs = PromptRun.objects.filter(
-        evaluation=evaluation, phase="PHASE1"
-    ).order_by("created_at")
+    phase1_runs = runs_by_group.get(("PHASE1", None), [])
 
     phase1_results: List[Dict[str, str]] = []
 
     # brand_key -> score
     brand_score: Dict[str, int] = defaultdict(int)
-    # brand_key -> display
-    brand_display: Dict[str, str] = {}
+    # brand_key -> display (grafía más frecuente en toda la evaluación)
+    brand_display = BrandDisplay()
 
     # model_key -> score  (brand_key, model_norm)
     model_score: Dict[Tuple[str, str], int] = defaultdict(int)
-    # model_key -> display
-    model_display: Dict[Tuple[str, str], str] = {}
 
     total_points_phase1 = 0
 
-    for run in phase1_runs:
+    for items in phase1_runs:
         ranking: Dict[str, str] = {}
 
         # OJO: puede venir menos de 5 si hubo fallo en un run.
-        items = run.items.all().order_by("position")
-
-        for item in items_por_iter(items):
-            pos = int(getattr(item, "position", 0) or 0)
+        for item in items:
+            pos = int(item.position or 0)
             pts = POSITION_SCORE.get(pos, 0)
 
             # tabla raw para frontend
-            ranking[str(pos)] = getattr(item, "raw_text", "") or ""
+            ranking[str(pos)] = item.raw_text
 
             if pts <= 0:
                 continue
@@ -173,14 +160,11 @@ def build_report(evaluation) -> dict:
 
             b_raw, m_raw, raw_text = get_item_brand_model(item)
 
-            b_key = normalize_brand_key(b_raw) if b_raw else ""
-            b_disp = normalize_brand_display(b_raw) if b_raw else ""
+            b_key = brand_display.add(b_raw)
 
             # Marca
             if b_key:
                 brand_score[b_key] += pts
-                if b_key not in brand_display and b_disp:
-                    brand_display[b_key] = b_disp
 
             # Modelo
             model_norm = normalize_model(m_raw) if m_raw else ""
@@ -189,11 +173,7 @@ def build_report(evaluation) -> dict:
                 model_norm = raw_text
 
             if b_key and model_norm:
-                m_key = (b_key, model_norm)
-                model_score[m_key] += pts
-                if m_key not in model_display:
-                    brand_name = brand_display.get(b_key, b_disp or b_key)
-                    model_display[m_key] = f"{brand_name} {model_norm}".strip()
+                model_score[(b_key, model_norm)] += pts
 
         phase1_results.append(ranking)
 
@@ -210,7 +190,8 @@ def build_report(evaluation) -> dict:
     # Top models (por puntos, NO frecuencia)
     phase1_topModels = []
     for m_key, score in sorted(model_score.items(), key=lambda x: x[1], reverse=True)[:10]:
-        name = model_display.get(m_key) or ""
+        b_key, model_norm = m_key
+        name = f"{brand_display.get(b_key, b_key)} {model_norm}".strip()
         phase1_topModels.append({
             "name": name,
             "score": score,
@@ -219,7 +200,7 @@ def build_report(evaluation) -> dict:
 
     metrics = {
         # nº de runs en fase 1 (no "5" fijo)
-        "totalEvaluations": phase1_runs.count(),
+        "totalEvaluations": len(phase1_runs),
         "topBrand": phase1_topBrands[0]["name"] if phase1_topBrands else "N/A",
         "topShare": phase1_topBrands[0]["share"] if phase1_topBrands else 0.0,
         # marcas únicas (dedupe)
@@ -229,9 +210,11 @@ def build_report(evaluation) -> dict:
     # ==========================
     # Phase 2: por criterio (raw + scoring)
     # ==========================
-    criteria_qs = EvaluationCriterion.objects.filter(
-        evaluation=evaluation
-    ).order_by("order")
+    criteria_qs = list(
+        EvaluationCriterion.objects.filter(evaluation=evaluation)
+        .order_by("order")
+        .only("id", "name")
+    )
 
     phase2_results: List[Dict[str, object]] = []
     phase2_summary: List[Dict[str, object]] = []
@@ -239,31 +222,23 @@ def build_report(evaluation) -> dict:
     # score_by_criterion[criterion_name][brand_key] = score
     score_by_criterion: Dict[str, Dict[str, int]] = {}
 
-    # display_by_criterion[criterion_name][brand_key] = display
-    display_by_criterion: Dict[str, Dict[str, str]] = {}
-
     for crit in criteria_qs:
-        runs = PromptRun.objects.filter(
-            evaluation=evaluation,
-            phase="PHASE2",
-            criterion=crit
-        ).order_by("created_at")
+        runs = runs_by_group.get(("PHASE2", crit.id), [])
 
         criterion_rankings: List[Dict[str, str]] = []
         crit_brand_score: Dict[str, int] = defaultdict(int)
-        crit_brand_display: Dict[str, str] = {}
+        crit_brand_display = BrandDisplay()
 
         crit_total_points = 0
 
-        for run in runs:
+        for items in runs:
             ranking: Dict[str, str] = {}
-            items = run.items.all().order_by("position")
 
-            for item in items_por_iter(items):
-                pos = int(getattr(item, "position", 0) or 0)
+            for item in items:
+                pos = int(item.position or 0)
                 pts = POSITION_SCORE.get(pos, 0)
 
-                ranking[str(pos)] = getattr(item, "raw_text", "") or ""
+                ranking[str(pos)] = item.raw_text
 
                 if pts <= 0:
                     continue
@@ -271,17 +246,12 @@ def build_report(evaluation) -> dict:
                 crit_total_points += pts
 
                 b_raw, _, _ = get_item_brand_model(item)
-                b_key = normalize_brand_key(b_raw) if b_raw else ""
-                b_disp = normalize_brand_display(b_raw) if b_raw else ""
+                # display del criterio + también “aprendemos” el global
+                b_key = crit_brand_display.add(b_raw)
+                brand_display.add(b_raw)
 
                 if b_key:
                     crit_brand_score[b_key] += pts
-                    if b_key not in crit_brand_display and b_disp:
-                        crit_brand_display[b_key] = b_disp
-
-                    # también “aprendemos” display global si no existe
-                    if b_key not in brand_display and b_disp:
-                        brand_display[b_key] = b_disp
 
             criterion_rankings.append(ranking)
 
@@ -291,7 +261,6 @@ def build_report(evaluation) -> dict:
         })
 
         score_by_criterion[crit.name] = dict(crit_brand_score)
-        display_by_criterion[crit.name] = dict(crit_brand_display)
 
         # Resumen del criterio (top brands por puntos + share % sobre puntos reales)
         topBrands = []
@@ -0,0 +1,317 @@
+"""
+Rollup diario de marcas entre evaluaciones (BrandDailyRollup).
+
+- Grupo = (día de completed_at, product_type, país), con claves normalizadas.
+- Al terminar una evaluación en SUCCESS se recalcula su grupo entero desde
+  RankingItem (1 GROUP BY) y se reemplaza: idempotente, sin dobles conteos
+  aunque la evaluación se reejecute o termine dos veces.
+- Un rerun saca la evaluación de SUCCESS: la vista recalcula el grupo
+  anterior al confirmar el reset.
+- brand_trends() responde los dashboards desde estas filas (miles) en lugar
+  de millones de items.
+"""
+
+from __future__ import annotations
+
+import logging
+from collections import defaultdict
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from django.db import transaction
+from django.db.models import Count, F, Max, Sum, Value
+from django.db.models.functions import Coalesce, Lower, NullIf, Trim, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from apps.results.api.models.index import (
+    BrandDailyRollup,
+    Evaluation,
+    EvaluationCriterion,
+    PromptRun,
+    RankingItem,
+)
+from apps.results.services.normalization import BrandDisplay, brand_forms, text_key
+from apps.results.services.scoring import POINTS_EXPR, POSITION_SCORE
+
+logger = logging.getLogger(__name__)
+
+# (día, product_type, país)
+RollupGroup = Tuple[date, str, str]
+
+GRANULARITIES = ("day", "week", "month")
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+
+
+def rollup_group(evaluation) -> Optional[RollupGroup]:
+    """Grupo de la evaluación, o None si no cuenta (no SUCCESS / sin completed_at)."""
+    if evaluation.status != "SUCCESS" or not evaluation.completed_at:
+        return None
+    return (
+        timezone.localdate(evaluation.completed_at),
+        text_key(evaluation.product_type),
+        text_key(evaluation.country),
+    )
+
+
+def _group_evaluation_ids(group: RollupGroup) -> List[int]:
+    # pocas evaluaciones por día: la normalización se hace en Python,
+    # igual que al escribir las claves
+    day = group[0]
+    rows = Evaluation.objects.filter(status="SUCCESS", completed_at__date=day).only(
+        "id", "status", "completed_at", "product_type", "country"
+    )
+    return [e.id for e in rows if rollup_group(e) == group]
+
+
+def build_group_rows(group: RollupGroup) -> List[BrandDailyRollup]:
+    """Filas del grupo calculadas desde RankingItem (sin escribir nada)."""
+    day, product_type, country = group
+    evaluation_ids = _group_evaluation_ids(group)
+    if not evaluation_ids:
+        return []
+
+    criterion_keys = {
+        pk: text_key(name)
+        for pk, name in EvaluationCriterion.objects.filter(evaluation_id__in=evaluation_ids).values_list("id", "name")
+    }
+
+    def crit_key(phase: str, criterion_id: Optional[int]) -> str:
+        return criterion_keys.get(criterion_id, "") if phase == "PHASE2" else ""
+
+    total_runs: Dict[Tuple[str, str], int] = defaultdict(int)
+    for row in (
+        PromptRun.objects.filter(evaluation_id__in=evaluation_ids)
+        .values("phase", "criterion_id")
+        .annotate(n=Count("id"))
+    ):
+        total_runs[(row["phase"], crit_key(row["phase"], row["criterion_id"]))] += row["n"]
+
+    group_items = RankingItem.objects.filter(prompt_run__evaluation_id__in=evaluation_ids)
+
+    # display: misma regla que scoring (grafía más frecuente en posiciones con puntos)
+    displays: Dict[Tuple[str, str], BrandDisplay] = defaultdict(BrandDisplay)
+    for row in (
+        group_items.filter(position__in=list(POSITION_SCORE))
+        .values("prompt_run__phase", "prompt_run__criterion_id", "brand")
+        .annotate(n=Count("id"))
+        .order_by()
+    ):
+        phase = row["prompt_run__phase"]
+        displays[(phase, crit_key(phase, row["prompt_run__criterion_id"]))].add(row["brand"], row["n"])
+
+    # por clave de marca (runs distintos por marca, no por grafía)
+    items = (
+        group_items.annotate(brand_group=Coalesce(NullIf("brand_key", Value("")), Lower(Trim("brand"))))
+        .values("prompt_run__phase", "prompt_run__criterion_id", "brand_group")
+        .annotate(
+            points=Sum(POINTS_EXPR),
+            appearances=Count("id"),
+            runs=Count("prompt_run", distinct=True),
+        )
+        .order_by()
+    )
+
+    rows: Dict[Tuple[str, str, str], BrandDailyRollup] = {}
+    for row in items:
+        b_key = brand_forms(row["brand_group"] or "")[0]
+        if not b_key:
+            continue
+        phase = row["prompt_run__phase"]
+        criterion = crit_key(phase, row["prompt_run__criterion_id"])
+
+        key = (phase, criterion, b_key)
+        rollup = rows.get(key)
+        if rollup is None:
+            rollup = rows[key] = BrandDailyRollup(
+                day=day,
+                product_type=product_type,
+                country=country,
+                phase=phase,
+                criterion=criterion,
+                brand_key=b_key,
+                brand=displays[(phase, criterion)].get(b_key) or brand_forms(b_key)[1] or b_key,
+                total_runs=total_runs[(phase, criterion)],
+            )
+        rollup.points += int(row["points"] or 0)
+        rollup.appearances += row["appearances"]
+        rollup.runs += row["runs"]
+
+    return list(rows.values())
+
+
+def refresh_rollup_group(group: Optional[RollupGroup]) -> int:
+    """Recalcula y reemplaza las filas de un grupo. Devuelve nº de filas."""
+    if group is None:
+        return 0
+
+    rows = build_group_rows(group)
+    day, product_type, country = group
+    with transaction.atomic():
+        BrandDailyRollup.objects.filter(day=day, product_type=product_type, country=country).delete()
+        # upsert: otro worker puede estar recalculando el mismo grupo a la vez
+        BrandDailyRollup.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=["day", "product_type", "country", "phase", "criterion", "brand_key"],
+            update_fields=["brand", "points", "appearances", "runs", "total_runs", "updated_at"],
+        )
+    return len(rows)
+
+
+def refresh_evaluation_rollups(evaluation) -> int:
+    return refresh_rollup_group(rollup_group(evaluation))
+
+
+def safe_refresh_rollup_group(group: Optional[RollupGroup]) -> None:
+    """Para runner / vistas: un fallo del rollup no tumba la evaluación
+    (rebuild_brand_rollups lo repara)."""
+    try:
+        refresh_rollup_group(group)
+    except Exception:
+        logger.exception(f"[ROLLUP] no se pudo recalcular el grupo {group}")
+
+
+def safe_refresh_evaluation_rollups(evaluation) -> None:
+    safe_refresh_rollup_group(rollup_group(evaluation))
+
+
+def groups_in_range(date_from: Optional[date] = None, date_to: Optional[date] = None) -> Set[RollupGroup]:
+    """Grupos con evaluaciones en SUCCESS o con filas ya guardadas (para borrar las que sobran)."""
+    evaluations = Evaluation.objects.filter(status="SUCCESS", completed_at__isnull=False)
+    existing = BrandDailyRollup.objects.all()
+    if date_from:
+        evaluations = evaluations.filter(completed_at__date__gte=date_from)
+        existing = existing.filter(day__gte=date_from)
+    if date_to:
+        evaluations = evaluations.filter(completed_at__date__lte=date_to)
+        existing = existing.filter(day__lte=date_to)
+
+    groups = {
+        rollup_group(e)
+        for e in evaluations.only("id", "status", "completed_at", "product_type", "country").iterator()
+    }
+    groups.update(existing.values_list("day", "product_type", "country").distinct())
+    return groups
+
+
+# =========================
+# Consulta (endpoint de analytics)
+# =========================
+def _period_expr(granularity: str):
+    if granularity == "week":
+        return TruncWeek("day")
+    if granularity == "month":
+        return TruncMonth("day")
+    return F("day")
+
+
+def _pct(part: int, total: int) -> float:
+    return round((part / total) * 100.0, 2) if total else 0.0
+
+
+def brand_trends(
+    *,
+    date_from: date,
+    date_to: date,
+    product_type: str = "",
+    country: Optional[str] = None,
+    phase: str = "PHASE1",
+    criterion: str = "",
+    brands: Iterable[str] = (),
+    granularity: str = "day",
+    limit: int = DEFAULT_LIMIT,
+) -> Dict:
+    """
+    Serie por periodo de las marcas top (o de `brands`):
+      share    = puntos de la marca / puntos de todas las marcas del periodo
+      presence = runs con la marca / runs del periodo
+    """
+    qs = BrandDailyRollup.objects.filter(day__gte=date_from, day__lte=date_to, phase=phase)
+    if product_type:
+        qs = qs.filter(product_type=text_key(product_type))
+    if country is not None:
+        qs = qs.filter(country=text_key(country))
+    if phase == "PHASE2" and criterion:
+        qs = qs.filter(criterion=text_key(criterion))
+
+    period = _period_expr(granularity)
+
+    # totales por periodo: total_runs va repetido en cada fila de marca del grupo
+    period_points: Dict[date, int] = defaultdict(int)
+    period_runs: Dict[date, int] = defaultdict(int)
+    for row in (
+        qs.annotate(period=period)
+        .values("period", "day", "product_type", "country", "criterion")
+        .annotate(points=Sum("points"), total_runs=Max("total_runs"))
+        .order_by()
+    ):
+        period_points[row["period"]] += row["points"] or 0
+        period_runs[row["period"]] += row["total_runs"] or 0
+
+    brand_keys = [b for b in (brand_forms(b)[0] for b in brands) if b]
+    if not brand_keys:
+        brand_keys = list(
+            qs.values("brand_key")
+            .annotate(points=Sum("points"))
+            .order_by("-points", "brand_key")
+            .values_list("brand_key", flat=True)[:limit]
+        )
+
+    series: Dict[str, Dict] = {}
+    for row in (
+        qs.filter(brand_key__in=brand_keys)
+        .annotate(period=period)
+        .values("brand_key", "period")
+        .annotate(
+            points=Sum("points"),
+            appearances=Sum("appearances"),
+            runs=Sum("runs"),
+        )
+        .order_by("brand_key", "period")
+    ):
+        entry = series.setdefault(
+            row["brand_key"],
+            {"brand_key": row["brand_key"], "brand": "", "points": 0, "appearances": 0, "runs": 0, "series": []},
+        )
+        entry["points"] += row["points"]
+        entry["appearances"] += row["appearances"]
+        entry["runs"] += row["runs"]
+        entry["series"].append(
+            {
+                "period": row["period"].isoformat(),
+                "points": row["points"],
+                "appearances": row["appearances"],
+                "runs": row["runs"],
+                "share": _pct(row["points"], period_points[row["period"]]),
+                "presence": _pct(row["runs"], period_runs[row["period"]]),
+            }
+        )
+
+    # un nombre por marca en todo el rango, con la regla de BrandDisplay
+    names = BrandDisplay()
+    for brand, n in (
+        qs.filter(brand_key__in=brand_keys).values("brand").annotate(n=Sum("appearances")).values_list("brand", "n")
+    ):
+        names.add(brand, n)
+
+    total_points = sum(period_points.values())
+    total_runs = sum(period_runs.values())
+    result = []
+    for b_key in brand_keys:
+        entry = series.get(b_key)
+        if entry is None:
+            continue
+        entry["brand"] = names.get(b_key, b_key)
+        entry["share"] = _pct(entry["points"], total_points)
+        entry["presence"] = _pct(entry["runs"], total_runs)
+        result.append(entry)
+    result.sort(key=lambda e: (-e["points"], e["brand_key"]))
+
+    return {
+        "periods": [
+            {"period": p.isoformat(), "points": period_points[p], "runs": period_runs[p]}
+            for p in sorted(period_points)
+        ],
+        "brands": result,
+    }
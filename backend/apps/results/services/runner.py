@@ -0,0 +1,558 @@
+from __future__ import annotations
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import permutations
+import queue
+import random
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from django.conf import settings
+from django.db.models import Count
+from django.utils import timezone
+
+from apps.results.api.models.index import PromptRun
+from apps.results.services.persistence import persist_runs_by_phase
+from apps.results.services.progress import (
+    record_complete_event,
+    record_run_event,
+    record_start_event,
+)
+from apps.results.services.prompts import prompt_toon_phase1, prompt_toon_phase2
+from apps.results.services.scoring import compute_evaluation_summaries
+from apps.results.services.evaluation_cache import invalidate_evaluation_cache
+from apps.results.services.snapshots import safe_store_report_snapshot
+from apps.results.services.rollups import safe_refresh_evaluation_rollups
+from apps.results.utils import response_cache
+from apps.results.utils.open_ai_client import (
+    DEFAULT_MODEL,
+    acompletion_with_web_search,
+    cached_result,
+    completion_with_web_search,
+    new_async_client,
+)
+from apps.results.utils.response_cache import is_enabled as cache_enabled, sample_policy
+
+# (toon_text, sources, items parseados | None si TOON inválido)
+CompletionResult = Tuple[str, List[str], Optional[List[Dict]]]
+
+PHASE1_RUNS = 5
+PHASE2_SAMPLES = 5
+
+# Nº máximo de web_search en vuelo por evaluación (1 = secuencial)
+DEFAULT_CONCURRENCY = 5
+
+# "threads" (ThreadPoolExecutor + cliente sync) | "async" (asyncio + AsyncOpenAI)
+EXECUTION_MODES = ("threads", "async")
+DEFAULT_EXECUTION_MODE = "threads"
+
+
+class EvaluationRunError(Exception):
+    """
+    Fallo "esperado" de una ejecución (TOON inválido, criterios insuficientes...).
+    `payload` es el JSON que se devuelve al cliente.
+    """
+
+    def __init__(self, payload: dict, http_status: int = 400):
+        super().__init__(payload.get("error", ""))
+        self.payload = payload
+        self.http_status = http_status
+
+
+# ✅ helper para seleccionar 5 permutaciones sin repetir el mismo inicio
+def select_permutations_unique_start(permutations_list, count=5, used_first=None):
+    selected = []
+    used_first = set(used_first or ())
+
+    random.shuffle(permutations_list)
+
+    for perm in permutations_list:
+        if perm[0] not in used_first:
+            selected.append(perm)
+            used_first.add(perm[0])
+        if len(selected) == count:
+            break
+
+    for perm in permutations_list:
+        if perm not in selected:
+            selected.append(perm)
+        if len(selected) == count:
+            break
+
+    return selected
+
+
+def get_concurrency(value=None) -> int:
+    """
+    Límite de llamadas concurrentes. Si no se indica, usa
+    settings.EVALUATION_CONCURRENCY.
+    """
+    if value is None:
+        value = getattr(settings, "EVALUATION_CONCURRENCY", DEFAULT_CONCURRENCY)
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        value = DEFAULT_CONCURRENCY
+    return max(1, value)
+
+
+def get_execution_mode(value=None) -> str:
+    if value is None:
+        value = getattr(settings, "EVALUATION_EXECUTION_MODE", DEFAULT_EXECUTION_MODE)
+    value = (value or "").strip().lower()
+    return value if value in EXECUTION_MODES else DEFAULT_EXECUTION_MODE
+
+
+# =========================
+# Fan-out de prompts
+# =========================
+def _call_prompt(spec: Dict, evaluation_uuid: str) -> CompletionResult:
+    criterion = spec.get("criterion")
+    return completion_with_web_search(
+        spec["prompt"],
+        phase=spec["phase"],
+        criterion=criterion.name if criterion else "",
+        evaluation_uuid=evaluation_uuid,
+        cache=spec.get("cache"),
+        cache_variant=spec.get("cache_variant", ""),
+    )
+
+
+async def _acall_prompt(spec: Dict, evaluation_uuid: str, async_client) -> CompletionResult:
+    criterion = spec.get("criterion")
+    return await acompletion_with_web_search(
+        spec["prompt"],
+        async_client=async_client,
+        phase=spec["phase"],
+        criterion=criterion.name if criterion else "",
+        evaluation_uuid=evaluation_uuid,
+        cache=spec.get("cache"),
+        cache_variant=spec.get("cache_variant", ""),
+    )
+
+
+def _cache_key(spec: Dict) -> Optional[str]:
+    if not cache_enabled(spec.get("cache")):
+        return None
+    return response_cache.make_key(DEFAULT_MODEL, spec["prompt"], spec.get("cache_variant", ""))
+
+
+def _timed_call(spec: Dict, evaluation_uuid: str):
+    """(resultado | excepción, segundos)"""
+    start = time.monotonic()
+    try:
+        outcome = _call_prompt(spec, evaluation_uuid)
+    except Exception as e:
+        outcome = e
+    return outcome, round(time.monotonic() - start, 2)
+
+
+async def arun_prompts(
+    specs: List[Dict],
+    concurrency: int,
+    evaluation_uuid: str = "",
+    on_result: Optional[Callable] = None,
+) -> List[Union[CompletionResult, BaseException]]:
+    """
+    Orquestador async: todas las fases con asyncio.gather bajo un semáforo.
+    Un solo hilo mantiene `concurrency` web_search en vuelo.
+    gather conserva el orden de `specs`; los fallos vuelven como excepción.
+    `on_result(idx, outcome, elapsed)` se llama al terminar cada prompt
+    (dentro del loop: no debe bloquear ni tocar el ORM).
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    async_client = new_async_client()
+
+    async def bounded(idx: int, spec: Dict):
+        async with semaphore:
+            start = time.monotonic()
+            try:
+                outcome = await _acall_prompt(spec, evaluation_uuid, async_client)
+            except Exception as e:
+                outcome = e
+            if on_result is not None:
+                on_result(idx, outcome, round(time.monotonic() - start, 2))
+            return outcome
+
+    try:
+        return await asyncio.gather(*(bounded(idx, spec) for idx, spec in enumerate(specs)))
+    finally:
+        await async_client.close()
+
+
+def _run_async(specs: List[Dict], concurrency: int, evaluation_uuid: str, on_result: Optional[Callable]):
+    """
+    El event loop corre en un hilo aparte y pasa cada resultado por una cola,
+    así `on_result` (que escribe en DB) se ejecuta en el hilo que llama.
+    """
+    if on_result is None:
+        return list(asyncio.run(arun_prompts(specs, concurrency, evaluation_uuid)))
+
+    done: queue.Queue = queue.Queue()
+    holder: Dict = {}
+
+    def target():
+        try:
+            holder["results"] = asyncio.run(
+                arun_prompts(specs, concurrency, evaluation_uuid, on_result=lambda *args: done.put(args))
+            )
+        except BaseException as e:
+            holder["error"] = e
+        finally:
+            done.put(None)
+
+    loop_thread = threading.Thread(target=target, name="evaluation-async-loop", daemon=True)
+    loop_thread.start()
+
+    while True:
+        item = done.get()
+        if item is None:
+            break
+        on_result(*item)
+
+    loop_thread.join()
+    if "error" in holder:
+        raise holder["error"]
+    return list(holder["results"])
+
+
+def run_prompts(
+    specs: List[Dict],
+    concurrency: int,
+    evaluation_uuid: str = "",
+    mode: Optional[str] = None,
+    on_result: Optional[Callable] = None,
+) -> List[Union[CompletionResult, BaseException]]:
+    """
+    Ejecuta los prompts con como mucho `concurrency` llamadas en vuelo.
+
+    Devuelve [(toon_text, sources, parsed) | excepción, ...] en el MISMO orden que
+    `specs`, independientemente del orden en que terminen las llamadas.
+    Un fallo no cancela el resto: lo que salga bien se conserva (resume).
+
+    `on_result(idx, outcome, elapsed)` se llama en el hilo que invoca, en
+    cuanto termina cada prompt (progreso en vivo).
+    Los hilos / el event loop solo hablan con OpenAI: nada de ORM fuera del
+    hilo principal (la caché de respuestas se consulta y se escribe aquí).
+    """
+    results: List = [None] * len(specs)
+
+    # caché (ORM) resuelta aquí: lookup en lote antes de lanzar, store al recoger
+    keys = [_cache_key(spec) for spec in specs]
+    hits = response_cache.lookup_many(keys)
+
+    def collect(idx: int, outcome, elapsed: float):
+        results[idx] = outcome
+        key = keys[idx]
+        if key and key not in hits and isinstance(outcome, tuple) and outcome[2] is not None:
+            response_cache.store(key, DEFAULT_MODEL, outcome[0], outcome[1])
+        if on_result is not None:
+            on_result(idx, outcome, elapsed)
+
+    pending: List[int] = []
+    for idx, key in enumerate(keys):
+        if key in hits:
+            collect(idx, cached_result(hits[key]), 0.0)
+        else:
+            pending.append(idx)
+
+    # los hilos / el loop reciben cache=False: solo hablan con OpenAI
+    calls = [dict(specs[idx], cache=False) for idx in pending]
+
+    def collect_call(call_idx: int, outcome, elapsed: float):
+        collect(pending[call_idx], outcome, elapsed)
+
+    if not calls:
+        return results
+
+    if get_execution_mode(mode) == "async":
+        _run_async(calls, concurrency, evaluation_uuid, collect_call)
+        return results
+
+    if concurrency <= 1 or len(calls) <= 1:
+        for call_idx, spec in enumerate(calls):
+            collect_call(call_idx, *_timed_call(spec, evaluation_uuid))
+        return results
+
+    with ThreadPoolExecutor(max_workers=min(concurrency, len(calls))) as pool:
+        futures = {
+            pool.submit(_timed_call, spec, evaluation_uuid): call_idx
+            for call_idx, spec in enumerate(calls)
+        }
+        for future in as_completed(futures):
+            collect_call(futures[future], *future.result())
+
+    return results
+
+
+# =========================
+# Validación
+# =========================
+def checked_ranking(toon_text: str, parsed: Optional[List[Dict]], phase: str) -> List[Dict]:
+    """
+    Ranking ya parseado por el cliente (una sola pasada). Si viene None
+    (TOON inválido tras los reintentos) -> EvaluationRunError.
+    """
+    if not parsed or len(parsed) != 5:
+        raise EvaluationRunError({"error": f"ranking inválido {phase}", "toon": toon_text})
+    return parsed
+
+
+# =========================
+# Planificación (completa o resume)
+# =========================
+def _phase1_spec(evaluation, perm, slot: int) -> Dict:
+    return {
+        "phase": "PHASE1",
+        "criterion": None,
+        "slot": slot,
+        "prompt": prompt_toon_phase1(
+            evaluation.product_type,
+            ", ".join(perm),
+            country=evaluation.country,
+            location=evaluation.location,
+        ),
+    }
+
+
+def _phase2_spec(evaluation, criterion_obj, slot: int) -> Dict:
+    return {
+        "phase": "PHASE2",
+        "criterion": criterion_obj,
+        "slot": slot,
+        "prompt": prompt_toon_phase2(
+            evaluation.product_type,
+            criterion_obj.name,
+            country=evaluation.country,
+            location=evaluation.location,
+        ),
+    }
+
+
+def build_prompt_specs(evaluation, criteria_qs) -> List[Dict]:
+    """
+    PHASE1: 5 permutaciones de criterios.
+    PHASE2: 5 prompts por criterio SIEMPRE.
+    """
+    criteria = [c.name for c in criteria_qs]
+
+    all_perms = list(permutations(criteria, len(criteria)))
+    selected_perms = select_permutations_unique_start(all_perms, PHASE1_RUNS)
+
+    specs: List[Dict] = []
+
+    for slot, perm in enumerate(selected_perms):
+        specs.append(_phase1_spec(evaluation, perm, slot))
+
+    for criterion_obj in criteria_qs:
+        for slot in range(PHASE2_SAMPLES):
+            specs.append(_phase2_spec(evaluation, criterion_obj, slot))
+
+    return specs
+
+
+def _assign_slots(runs: List[Dict], total: int) -> set:
+    """
+    Devuelve los slots ocupados. Runs antiguos sin slot (anteriores a resume)
+    reciben el primer slot libre, en orden de creación, y se guarda.
+    """
+    taken = {r["slot"] for r in runs if r["slot"] is not None}
+    free = [i for i in range(total) if i not in taken]
+
+    for run in runs:
+        if run["slot"] is not None:
+            continue
+        if not free:
+            break
+        run["slot"] = free.pop(0)
+        PromptRun.objects.filter(pk=run["id"]).update(slot=run["slot"])
+        taken.add(run["slot"])
+
+    return taken
+
+
+def plan_missing_specs(evaluation, criteria_qs) -> List[Dict]:
+    """
+    Resume: conserva los runs válidos y devuelve solo los prompts que faltan.
+
+    - Un run es válido si tiene sus 5 items; los demás se borran y se repiten.
+    - PHASE1: slots 0..4 libres -> permutaciones no usadas todavía
+      (prefiriendo criterios iniciales que aún no abren ninguna).
+    - PHASE2: slots 0..4 libres de cada criterio.
+    """
+    runs = list(
+        PromptRun.objects.filter(evaluation=evaluation)
+        .annotate(n_items=Count("items"))
+        .order_by("created_at", "id")
+        .values("id", "phase", "criterion_id", "slot", "prompt_text", "n_items")
+    )
+
+    invalid_ids = [r["id"] for r in runs if r["n_items"] != 5]
+    if invalid_ids:
+        PromptRun.objects.filter(pk__in=invalid_ids).delete()
+    runs = [r for r in runs if r["n_items"] == 5]
+
+    specs: List[Dict] = []
+
+    # ✅ PHASE 1
+    phase1_runs = [r for r in runs if r["phase"] == "PHASE1"]
+    taken = _assign_slots(phase1_runs, PHASE1_RUNS)
+    missing = [i for i in range(PHASE1_RUNS) if i not in taken]
+
+    if missing:
+        criteria = [c.name for c in criteria_qs]
+        all_perms = list(permutations(criteria, len(criteria)))
+
+        prompt_to_perm = {_phase1_spec(evaluation, perm, 0)["prompt"]: perm for perm in all_perms}
+        used_perms = [prompt_to_perm[r["prompt_text"]] for r in phase1_runs if r["prompt_text"] in prompt_to_perm]
+
+        candidates = [perm for perm in all_perms if perm not in used_perms] or all_perms
+        selected_perms = select_permutations_unique_start(
+            candidates, len(missing), used_first={perm[0] for perm in used_perms}
+        )
+        for slot, perm in zip(missing, selected_perms):
+            specs.append(_phase1_spec(evaluation, perm, slot))
+
+    # ✅ PHASE 2
+    for criterion_obj in criteria_qs:
+        crit_runs = [r for r in runs if r["phase"] == "PHASE2" and r["criterion_id"] == criterion_obj.id]
+        taken = _assign_slots(crit_runs, PHASE2_SAMPLES)
+        for slot in range(PHASE2_SAMPLES):
+            if slot not in taken:
+                specs.append(_phase2_spec(evaluation, criterion_obj, slot))
+
+    return specs
+
+
+def apply_cache_policy(specs: List[Dict], cache: Optional[bool] = None, samples: Optional[str] = None):
+    """
+    Marca en cada spec si usa la caché de respuestas y con qué variante.
+    - PHASE1: cada permutación es un prompt distinto -> caché normal.
+    - PHASE2: las 5 muestras son el MISMO prompt -> `samples` decide
+      (bypass / per_sample / shared, ver response_cache).
+    """
+    enabled = cache_enabled(cache)
+    for spec in specs:
+        if not enabled:
+            spec["cache"], spec["cache_variant"] = False, ""
+        elif spec["phase"] == "PHASE2":
+            spec["cache"], spec["cache_variant"] = sample_policy(spec.get("slot"), samples)
+        else:
+            spec["cache"], spec["cache_variant"] = True, ""
+    return specs
+
+
+# =========================
+# Orquestador
+# =========================
+def execute_evaluation(
+    evaluation,
+    concurrency: Optional[int] = None,
+    mode: Optional[str] = None,
+    resume: bool = False,
+    cache: Optional[bool] = None,
+    cache_samples: Optional[str] = None,
+):
+    """
+    Ejecuta PHASE1 + PHASE2 de una evaluación en PROCESSING.
+
+    - resume=False: la evaluación ya viene reseteada y se lanzan todos los prompts.
+    - resume=True: se conservan los runs válidos y solo se lanzan los que faltan.
+    - Todas las llamadas (PHASE1 y PHASE2) son independientes -> se despachan
+      juntas con concurrencia acotada (hilos o asyncio según `mode`).
+    - Cada respuesta válida se persiste (en el orden de los prompts) aunque
+      otra falle, para que un resume posterior no repita web_search pagados.
+    - Summaries de todas las fases se recalculan al final (1 delete + 1 bulk_create).
+    - cache / cache_samples: caché de respuestas (None -> settings).
+    - Marca SUCCESS / ERROR en la evaluación. Lanza EvaluationRunError si
+      alguna respuesta del modelo no es válida.
+    """
+    try:
+        criteria_qs = list(evaluation.criteria.all().order_by("order"))
+
+        if len(criteria_qs) < 2:
+            raise EvaluationRunError({"error": "Se requieren mínimo 2 criterios"})
+
+        if resume:
+            specs = plan_missing_specs(evaluation, criteria_qs)
+        else:
+            specs = build_prompt_specs(evaluation, criteria_qs)
+
+        apply_cache_policy(specs, cache, cache_samples)
+
+        record_start_event(evaluation, total=len(specs), resume=resume)
+
+        # ✅ cada respuesta se valida al llegar (evento de progreso incluido)
+        checked: Dict[int, object] = {}
+
+        def on_result(idx: int, outcome, elapsed: float):
+            spec = specs[idx]
+            try:
+                if isinstance(outcome, BaseException):
+                    raise outcome
+                toon_text, sources, parsed = outcome
+                checked[idx] = (toon_text, sources, checked_ranking(toon_text, parsed, spec["phase"]))
+            except Exception as e:
+                checked[idx] = e
+            record_run_event(
+                evaluation,
+                spec,
+                latency=elapsed,
+                valid=not isinstance(checked[idx], Exception),
+                done=len(checked),
+                total=len(specs),
+            )
+
+        run_prompts(
+            specs,
+            get_concurrency(concurrency),
+            str(evaluation.uuid),
+            mode=mode,
+            on_result=on_result,
+        )
+
+        # ✅ persistir todo lo válido (en el orden de los prompts, bulk por fase),
+        #    recordar el primer fallo
+        first_error: Optional[BaseException] = None
+        valid_results = []
+        for idx, spec in enumerate(specs):
+            result = checked[idx]
+            if isinstance(result, Exception):
+                first_error = first_error or result
+                continue
+            valid_results.append((spec, *result))
+
+        persist_runs_by_phase(evaluation, valid_results)
+
+        if first_error is not None:
+            raise first_error
+
+        # ✅ summaries: PHASE1 y luego cada criterio
+        #    ejecución completa -> desde lo parseado en memoria (0 lecturas)
+        #    resume -> hay runs de antes: una sola agregación en SQL
+        parsed_results = None
+        if not resume:
+            parsed_results = [
+                (spec["phase"], spec["criterion"].pk if spec.get("criterion") else None, parsed)
+                for spec, _, _, parsed in valid_results
+            ]
+        compute_evaluation_summaries(evaluation, criteria_qs, parsed_results=parsed_results)
+
+    except Exception:
+        evaluation.status = "ERROR"
+        evaluation.save()
+        invalidate_evaluation_cache(evaluation)
+        record_complete_event(evaluation)
+        raise
+
+    # ✅ SUCCESS (+ informe materializado: ya no cambia, + rollup diario de marcas)
+    evaluation.status = "SUCCESS"
+    evaluation.completed_at = timezone.now()
+    evaluation.save()
+    safe_store_report_snapshot(evaluation)
+    safe_refresh_evaluation_rollups(evaluation)
+    invalidate_evaluation_cache(evaluation)
+    record_complete_event(evaluation)
+    return evaluation
@@ -1,63 +1,126 @@
 from __future__ import annotations
 
 from collections import defaultdict
-import re
-import unicodedata
-from typing import Iterable, Optional
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.db import transaction
+from django.db.models import Case, Count, IntegerField, Sum, Value, When
 
 from apps.results.api.models.index import RankingSummary, RankingItem
+from apps.results.services.evaluation_cache import invalidate_evaluation_cache
+from apps.results.services.normalization import BrandDisplay
 
 # Regla de puntos (solo top 5)
 POSITION_SCORE = {1: 5, 2: 4, 3: 3, 4: 2, 5: 1}
 
+# ✅ Subir al cambiar puntos, normalización de marcas o el formato del informe:
+#    los ReportSnapshot con otra versión se reconstruyen (rebuild_report_snapshots)
+#    v2: display de marca = grafía más frecuente (BrandDisplay)
+SCORING_VERSION = 2
 
-def _clean(s: str) -> str:
-    """
-    Normaliza espacios y unicode para evitar duplicados por caracteres raros.
-    """
-    s = (s or "").strip()
-    s = unicodedata.normalize("NFKC", s)
-    s = re.sub(r"\s+", " ", s)
-    return s
 
+# =========================
+# Agregación
+# =========================
+# points: CASE position WHEN 1 THEN 5 ... ELSE 0
+POINTS_EXPR = Case(
+    *[When(position=pos, then=Value(pts)) for pos, pts in POSITION_SCORE.items()],
+    default=Value(0),
+    output_field=IntegerField(),
+)
 
-def normalize_brand_key(brand: str) -> str:
-    """
-    Clave para deduplicar marcas de forma case-insensitive:
-    'Adidas', 'adidas', 'ADIDAS' -> 'adidas'
-    """
-    return _clean(brand).casefold()
+# (phase, criterion_id)
+GroupKey = Tuple[str, Optional[int]]
 
 
-def normalize_brand_display(brand: str) -> str:
+class _BrandTally:
     """
-    Versión bonita para mostrar:
-    - Acrónimos cortos en mayúsculas se respetan (NB, ASICS)
-    - Resto: Title Case suave por palabras
+    Acumula puntos por marca de un conjunto (fase o fase+criterio).
+    - total_points: total REAL repartido (incluye items sin marca)
+    - dedup por clave normalizada; display = grafía más frecuente (BrandDisplay)
     """
-    b = _clean(brand)
-    if not b:
-        return ""
 
-    # Mantener acrónimos cortos (sin espacios)
-    if b.isupper() and len(b) <= 8 and " " not in b:
-        return b
+    def __init__(self):
+        self.scores = defaultdict(int)   # brand_key -> score
+        self.display = BrandDisplay()
+        self.total_points = 0
 
-    # Title Case palabra a palabra (sin lista fija)
-    return " ".join((w[:1].upper() + w[1:].lower()) if w else "" for w in b.split(" "))
+    def add(self, brand: str, points: int, count: int = 1):
+        """`points` de `count` apariciones de la grafía `brand` (SQL agrupa varias)."""
+        # En teoría solo guardas top5, pero si entra algo fuera: pts=0
+        if points <= 0:
+            return
 
+        self.total_points += points
 
-def items_por_iter(qs):
+        b_key = self.display.add(brand, count)
+        if not b_key:
+            return
+
+        self.scores[b_key] += points
+
+    def to_summaries(self, evaluation, phase: str, criterion=None) -> List[RankingSummary]:
+        # evitar división por 0
+        total_points = self.total_points or 1
+
+        # ordenado por score desc
+        return [
+            RankingSummary(
+                evaluation=evaluation,
+                phase=phase,
+                criterion=criterion,
+                brand=self.display.get(b_key, b_key),
+                score=score,
+                share=round((score / total_points) * 100.0, 2),
+            )
+            # empates por clave: mismo orden venga de memoria o de SQL
+            for b_key, score in sorted(self.scores.items(), key=lambda x: (-x[1], x[0]))
+        ]
+
+
+def tally_from_parsed(results: Iterable[Tuple[str, Optional[int], List[Dict]]]) -> Dict[GroupKey, _BrandTally]:
     """
-    Evita cargar todo en memoria si hay muchos items.
+    Desde los rankings ya parseados en memoria:
+    results = [(phase, criterion_id, [{"position", "brand", ...}, ...]), ...]
     """
-    try:
-        return qs.iterator()
-    except Exception:
-        return qs
+    tallies: Dict[GroupKey, _BrandTally] = defaultdict(_BrandTally)
+    for phase, criterion_id, parsed in results:
+        tally = tallies[(phase, criterion_id)]
+        for item in parsed:
+            pos = int(item.get("position") or 0)
+            tally.add(item.get("brand") or "", POSITION_SCORE.get(pos, 0))
+    return tallies
+
+
+def tally_from_db(evaluation, phase: Optional[str] = None, criterion=None) -> Dict[GroupKey, _BrandTally]:
+    """
+    Un solo GROUP BY en SQL: puntos y apariciones por (fase, criterio, grafía).
+    Pocas grafías por marca; _BrandTally las unifica por clave y elige el
+    display con la misma regla que tally_from_parsed.
+    Solo posiciones con puntos, igual que el camino en memoria.
+    """
+    qs = RankingItem.objects.filter(
+        prompt_run__evaluation=evaluation, position__in=list(POSITION_SCORE)
+    )
+    if phase:
+        qs = qs.filter(prompt_run__phase=phase)
+    if criterion is not None:
+        qs = qs.filter(prompt_run__criterion=criterion)
+
+    rows = (
+        qs.values("prompt_run__phase", "prompt_run__criterion_id", "brand")
+        .annotate(points=Sum(POINTS_EXPR), n=Count("id"))
+        .order_by()
+    )
 
+    tallies: Dict[GroupKey, _BrandTally] = defaultdict(_BrandTally)
+    for row in rows:
+        tally = tallies[(row["prompt_run__phase"], row["prompt_run__criterion_id"])]
+        tally.add(row["brand"] or "", int(row["points"] or 0), row["n"])
+    return tallies
 
-def compute_brand_summary(evaluation, phase: str, criterion=None):
+
+def compute_brand_summary(evaluation, phase: str, criterion=None, parsed_results=None):
     """
     Calcula scores por marca para PHASE1 o PHASE2 (por criterio).
     Guarda en RankingSummary.
@@ -67,62 +130,50 @@ def compute_brand_summary(evaluation, phase: str, criterion=None):
     - share (%) se calcula sobre el total REAL de puntos del conjunto filtrado
       (no 75 fijo, porque puede haber menos/más runs/items)
     - dedup por marca (case-insensitive) sin lista fija
-    """
 
-    # borrar summaries anteriores para evitar duplicados
-    RankingSummary.objects.filter(
-        evaluation=evaluation, phase=phase, criterion=criterion
-    ).delete()
-
-    # filtrar items según fase
-    items_qs = RankingItem.objects.filter(
-        prompt_run__evaluation=evaluation,
-        prompt_run__phase=phase
-    )
-
-    if criterion:
-        items_qs = items_qs.filter(prompt_run__criterion=criterion)
-
-    # scoring
-    brand_scores = defaultdict(int)   # brand_key -> score
-    brand_display = {}               # brand_key -> display
+    `parsed_results` ([(phase, criterion_id, parsed)]) evita releer los items;
+    sin él se agrega con una sola consulta. Escritura: 1 delete + 1 bulk_create.
+    """
+    criterion_id = criterion.pk if criterion else None
 
-    total_points = 0  # total real de puntos distribuidos en este subconjunto
+    if parsed_results is not None:
+        tallies = tally_from_parsed(
+            r for r in parsed_results if r[0] == phase and r[1] == criterion_id
+        )
+    else:
+        tallies = tally_from_db(evaluation, phase=phase, criterion=criterion)
 
-    for item in items_por_iter(items_qs):
-        pos = int(getattr(item, "position", 0) or 0)
-        pts = POSITION_SCORE.get(pos, 0)
+    tally = tallies.get((phase, criterion_id)) or _BrandTally()
 
-        # En teoría solo guardas top5, pero si entra algo fuera: pts=0
-        if pts <= 0:
-            continue
+    with transaction.atomic():
+        # borrar summaries anteriores para evitar duplicados
+        RankingSummary.objects.filter(
+            evaluation=evaluation, phase=phase, criterion=criterion
+        ).delete()
+        RankingSummary.objects.bulk_create(tally.to_summaries(evaluation, phase, criterion))
 
-        total_points += pts
+    invalidate_evaluation_cache(evaluation)
 
-        b_raw = getattr(item, "brand", "") or ""
-        b_key = normalize_brand_key(b_raw)
-        b_disp = normalize_brand_display(b_raw)
 
-        if not b_key:
-            continue
-
-        brand_scores[b_key] += pts
-        # guardamos el primer display "bonito" que veamos
-        if b_key not in brand_display and b_disp:
-            brand_display[b_key] = b_disp
-
-    # evitar división por 0
-    total_points = total_points or 1
-
-    # persistimos ordenado por score desc
-    for b_key, score in sorted(brand_scores.items(), key=lambda x: x[1], reverse=True):
-        share = round((score / total_points) * 100.0, 2)
-
-        RankingSummary.objects.create(
-            evaluation=evaluation,
-            phase=phase,
-            criterion=criterion,
-            brand=brand_display.get(b_key, b_key),
-            score=score,
-            share=share
-        )
+def compute_evaluation_summaries(evaluation, criteria, parsed_results=None):
+    """
+    Todos los summaries de la evaluación de una vez: PHASE1 + PHASE2 por criterio.
+    1 consulta de agregación (o ninguna con `parsed_results`), 1 delete, 1 bulk_create.
+    """
+    if parsed_results is not None:
+        tallies = tally_from_parsed(parsed_results)
+    else:
+        tallies = tally_from_db(evaluation)
+
+    summaries: List[RankingSummary] = []
+    summaries += (tallies.get(("PHASE1", None)) or _BrandTally()).to_summaries(evaluation, "PHASE1")
+    for criterion_obj in criteria:
+        tally = tallies.get(("PHASE2", criterion_obj.pk)) or _BrandTally()
+        summaries += tally.to_summaries(evaluation, "PHASE2", criterion_obj)
+
+    with transaction.atomic():
+        RankingSummary.objects.filter(evaluation=evaluation).delete()
+        RankingSummary.objects.bulk_create(summaries)
+
+    invalidate_evaluation_cache(evaluation)
+    return summaries
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+from typing import Optional, Tuple
+
+from apps.results.api.models.index import ReportSnapshot
+from apps.results.services.report import build_report
+from apps.results.services.scoring import SCORING_VERSION
+
+logger = logging.getLogger(__name__)
+
+
+def compute_etag(payload: dict) -> str:
+    """ETag fuerte: versión de scoring + hash del JSON canónico."""
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    digest = hashlib.sha256(raw.encode("utf-8")).hexdigest()[:40]
+    return f'"v{SCORING_VERSION}-{digest}"'
+
+
+def store_report_snapshot(evaluation) -> ReportSnapshot:
+    """Construye el informe una vez y lo guarda (o reemplaza) como snapshot."""
+    payload = build_report(evaluation)
+    snapshot, _ = ReportSnapshot.objects.update_or_create(
+        evaluation=evaluation,
+        defaults={
+            "scoring_version": SCORING_VERSION,
+            "payload": payload,
+            "etag": compute_etag(payload),
+        },
+    )
+    return snapshot
+
+
+def safe_store_report_snapshot(evaluation) -> Optional[ReportSnapshot]:
+    """Para el runner: un fallo aquí no debe tumbar una evaluación ya en SUCCESS
+    (el endpoint lo reconstruye bajo demanda)."""
+    try:
+        return store_report_snapshot(evaluation)
+    except Exception:
+        logger.exception(f"[SNAPSHOT] no se pudo guardar el informe de {evaluation.uuid}")
+        return None
+
+
+def invalidate_report_snapshot(evaluation) -> None:
+    ReportSnapshot.objects.filter(evaluation=evaluation).delete()
+
+
+def get_snapshot_row(uuid) -> Optional[Tuple[str, dict]]:
+    """(etag, payload) del snapshot vigente en una sola consulta, o None."""
+    return (
+        ReportSnapshot.objects.filter(evaluation__uuid=uuid, scoring_version=SCORING_VERSION)
+        .values_list("etag", "payload")
+        .first()
+    )
+
+
+def get_report_payload(evaluation) -> Tuple[dict, str]:
+    """
+    (payload, etag) cuando get_snapshot_row no encontró snapshot vigente:
+    - SUCCESS -> se (re)construye y se guarda el snapshot
+    - resto   -> informe en vivo (todavía puede cambiar)
+    """
+    if evaluation.status == "SUCCESS":
+        snapshot = store_report_snapshot(evaluation)
+        return snapshot.payload, snapshot.etag
+
+    payload = build_report(evaluation)
+    return payload, compute_etag(payload)
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [c.strip() for c in if_none_match.split(",")]
+    return any(c == etag or c == f"W/{etag}" for c in candidates)
@@ -1,3 +1,397 @@
-from django.test import TestCase
+import os
+import tempfile
+import threading
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from apps.results.api.models.index import (
+    BrandDailyRollup,
+    CompletionCacheEntry,
+    Evaluation,
+    EvaluationCriterion,
+    EvaluationEvent,
+    InformeDataUsers,
+    PromptRun,
+    RankingItem,
+)
+from apps.results.services import scoring
+from apps.results.services.lead_pagination import InvalidCursor, keyset_page
+from apps.results.services.parse_ranking import (
+    _split_ranking_fast,
+    _split_ranking_generic,
+    decode_ranking_toon,
+    parse_toon_ranking5,
+)
+from apps.results.services.normalization import BrandDisplay
+from apps.results.services.persistence import persist_runs
+from apps.results.services.progress import aiter_evaluation_events, iter_evaluation_events
+from apps.results.services.report import build_report
+from apps.results.services.rollups import refresh_evaluation_rollups
+from apps.results.services.runner import run_prompts
+from apps.results.utils import response_cache
+from apps.results.utils.attempt_log import AttemptLogSink, JsonlSink
+
+
+# =========================
+# Parser TOON (ranking[5])
+# =========================
+RANKING_SAMPLES = [
+    "ranking[5]: Nike | Pegasus 41,Adidas | Boston 12,ASICS | Novablast 4,Hoka | Clifton 9,On | Cloudmonster",
+    "ranking[5]:Nike|Pegasus,Adidas|Boston,ASICS|Nova,Hoka|Clifton,On|Cloud",
+    "ranking[5]: New Balance 1080v13,Brooks Ghost 16,Saucony,Puma | Velocity,Mizuno | Wave Rider",
+    "\r\n\nranking[5]: Nike | Pegasus,Adidas | Boston,ASICS | Nova,Hoka | Clifton,On | Cloud  \n",
+    'ranking[5]: "Nike, Inc | Pegasus",Adidas | Boston,ASICS | Nova,Hoka | Clifton,On | Cloud',
+    "ranking[5]: Nike | 1080,Adidas | 2,true,Hoka | C9,On | Cloud",
+    "ranking[5]: 1080,Adidas | 2,ASICS | Nova,Hoka | C9,On | Cloud",
+    "  ranking[5]: Nike | Pegasus,Adidas | Boston,ASICS | Nova,Hoka | Clifton,On | Cloud",
+    "ranking[5]: Nike | Pegasus,Adidas | Boston\nASICS | Nova,Hoka | Clifton,On | Cloud",
+    "ranking[5|]: Nike | Pegasus|Adidas | Boston|ASICS | Nova|Hoka | Clifton|On | Cloud",
+    "ranking[5]: Nike | Pegasus,Adidas | Boston",
+    "ranking[4]: Nike | Pegasus,Adidas | Boston,ASICS | Nova,Hoka | Clifton",
+    "ranking[5]: Nike | Pegasus,Adidas | Boston,ASICS | Nova,Hoka | Clifton,On | Cloud,Puma | Velocity",
+    "Lo siento, no puedo ayudar con eso.",
+    "",
+]
+
+
+class ParseRankingTests(SimpleTestCase):
+    def test_parses_brand_model_and_positions(self):
+        items = parse_toon_ranking5(RANKING_SAMPLES[0])
+        self.assertEqual([i["position"] for i in items], [1, 2, 3, 4, 5])
+        self.assertEqual(items[0]["brand"], "Nike")
+        self.assertEqual(items[0]["model"], "Pegasus 41")
+        self.assertEqual(items[2]["raw_text"], "ASICS | Novablast 4")
+
+    def test_without_separator_first_word_is_brand(self):
+        items = parse_toon_ranking5(RANKING_SAMPLES[2])
+        self.assertEqual((items[0]["brand"], items[0]["model"]), ("New", "Balance 1080v13"))
+        self.assertEqual((items[2]["brand"], items[2]["model"]), ("Saucony", ""))
+
+    def test_quoted_values_use_generic_decoder(self):
+        self.assertIsNone(_split_ranking_fast(RANKING_SAMPLES[4], 5))
+        items = parse_toon_ranking5(RANKING_SAMPLES[4])
+        self.assertEqual(items[0]["brand"], "Nike, Inc")
+
+    def test_invalid_rankings(self):
+        for text in RANKING_SAMPLES[7:]:
+            with self.subTest(text=text):
+                self.assertIsNone(parse_toon_ranking5(text))
+
+    def test_fast_path_matches_generic_decoder(self):
+        for text in RANKING_SAMPLES:
+            with self.subTest(text=text):
+                fast = _split_ranking_fast(text, 5)
+                if fast is not None:
+                    self.assertEqual(fast, _split_ranking_generic(text, 5))
+                self.assertEqual(decode_ranking_toon(text), _split_ranking_generic(text, 5))
+
+
+# =========================
+# Scoring: en memoria vs SQL
+# =========================
+PHASE1_TEXTS = [
+    "ranking[5]: Nike | Pegasus,ADIDAS | Boston,ASICS | Nova,Hoka | Clifton,On | Cloud",
+    "ranking[5]: adidas | Adizero,Nike | Vomero,Brooks | Ghost,ASICS | Kayano,Puma | Velocity",
+    "ranking[5]: Hoka | Bondi,Nike | Pegasus,Adidas | Boston,On | Cloud,Brooks | Glycerin",
+]
+PHASE2_TEXTS = [
+    "ranking[5]: Puma | Velocity,Nike | Pegasus,nike | Vomero,Hoka | Mach,ASICS | Nova",
+    "ranking[5]: Brooks | Ghost,Adidas | Boston,ＮＩＫＥ | Pegasus,On | Cloud,Saucony | Ride",
+]
+
+
+def create_evaluation_with_runs():
+    evaluation = Evaluation.objects.create(product_type="zapatillas", status="SUCCESS")
+    criteria = [
+        EvaluationCriterion.objects.create(evaluation=evaluation, name=name, order=idx)
+        for idx, name in enumerate(["precio", "confort"], start=1)
+    ]
+
+    results = []
+    for slot, text in enumerate(PHASE1_TEXTS):
+        spec = {"phase": "PHASE1", "criterion": None, "slot": slot, "prompt": "p1"}
+        results.append((spec, text, [], parse_toon_ranking5(text)))
+    for criterion in criteria:
+        for slot, text in enumerate(PHASE2_TEXTS):
+            spec = {"phase": "PHASE2", "criterion": criterion, "slot": slot, "prompt": "p2"}
+            results.append((spec, text, [], parse_toon_ranking5(text)))
+
+    persist_runs(evaluation, results)
+    parsed_results = [
+        (spec["phase"], spec["criterion"].pk if spec["criterion"] else None, parsed)
+        for spec, _, _, parsed in results
+    ]
+    return evaluation, criteria, parsed_results
+
+
+class ScoringParityTests(TestCase):
+    def test_tally_from_db_matches_tally_from_parsed(self):
+        evaluation, _, parsed_results = create_evaluation_with_runs()
+
+        from_parsed = scoring.tally_from_parsed(parsed_results)
+        from_db = scoring.tally_from_db(evaluation)
+
+        self.assertEqual(set(from_parsed), set(from_db))
+        for key, tally in from_parsed.items():
+            with self.subTest(group=key):
+                self.assertEqual(dict(tally.scores), dict(from_db[key].scores))
+                self.assertEqual(tally.total_points, from_db[key].total_points)
+
+    def test_brand_variants_are_merged(self):
+        evaluation, _, parsed_results = create_evaluation_with_runs()
+        tally = scoring.tally_from_db(evaluation)[("PHASE1", None)]
+
+        # ADIDAS / adidas / Adidas -> una sola marca
+        self.assertEqual(tally.scores["adidas"], 4 + 5 + 3)
+        self.assertEqual(tally.total_points, 3 * 15)
+
+    def test_summaries_same_from_memory_and_db(self):
+        evaluation, criteria, parsed_results = create_evaluation_with_runs()
+
+        def rows(summaries):
+            return [(s.phase, s.criterion_id, s.brand, s.score, s.share) for s in summaries]
+
+        in_memory = rows(scoring.compute_evaluation_summaries(evaluation, criteria, parsed_results=parsed_results))
+        from_db = rows(scoring.compute_evaluation_summaries(evaluation, criteria))
+        # mismo nombre y mismo orden (también en empates), venga de memoria o de SQL
+        self.assertEqual(in_memory, from_db)
+
+    def test_report_and_rollup_use_the_same_brand_names(self):
+        evaluation, criteria, parsed_results = create_evaluation_with_runs()
+        evaluation.completed_at = timezone.now()
+        evaluation.save()
+        summaries = scoring.compute_evaluation_summaries(evaluation, criteria, parsed_results=parsed_results)
+        refresh_evaluation_rollups(evaluation)
+
+        phase1 = {s.brand: s.score for s in summaries if s.phase == "PHASE1"}
+        report = build_report(evaluation)
+        self.assertEqual({b["name"]: b["score"] for b in report["phase1"]["topBrands"]}, phase1)
+        rollup = dict(BrandDailyRollup.objects.filter(phase="PHASE1").values_list("brand", "points"))
+        self.assertEqual(rollup, phase1)
+
+
+class BrandDisplayTests(SimpleTestCase):
+    def test_most_frequent_spelling_wins(self):
+        names = BrandDisplay()
+        for brand in ["ADIDAS", "Adidas", "adidas ", "Adidas"]:
+            names.add(brand)
+        self.assertEqual(names.get("adidas"), "Adidas")
+
+    def test_ties_do_not_depend_on_order(self):
+        spellings = ["Nike", "NIKE", "nike"]
+        results = set()
+        for shift in range(len(spellings)):
+            names = BrandDisplay()
+            for brand in spellings[shift:] + spellings[:shift]:
+                names.add(brand)
+            results.add(names.get("nike"))
+        self.assertEqual(len(results), 1)
+
+
+# =========================
+# Leads: paginación keyset
+# =========================
+class LeadKeysetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        evaluation = Evaluation.objects.create(product_type="zapatillas")
+        # nombres repetidos: el desempate por id tiene que funcionar
+        InformeDataUsers.objects.bulk_create(
+            InformeDataUsers(
+                evaluation=evaluation,
+                nombre=f"Lead {i % 7}",
+                email=f"lead{i:03d}@example.com",
+                movil=str(600000000 + i),
+            )
+            for i in range(53)
+        )
+
+    def _walk(self, ordering, page_size):
+        qs = InformeDataUsers.objects.all()
+        ids, cursor = [], None
+        while True:
+            rows, cursor = keyset_page(qs, ordering, page_size, cursor=cursor)
+            ids += [r.id for r in rows]
+            if cursor is None:
+                return ids
+
+    def test_pages_cover_every_row_in_order(self):
+        for ordering in ("id", "-id", "nombre", "-nombre", "email", "-email"):
+            field = ordering.lstrip("-")
+            tiebreak = "-id" if ordering.startswith("-") else "id"
+            order_by = [ordering] if field == "id" else [ordering, tiebreak]
+            expected = list(InformeDataUsers.objects.order_by(*order_by).values_list("id", flat=True))
+            for page_size in (1, 5, 20, 100):
+                with self.subTest(ordering=ordering, page_size=page_size):
+                    self.assertEqual(self._walk(ordering, page_size), expected)
+
+    def test_keyset_predicate_has_leading_range_bound(self):
+        qs = InformeDataUsers.objects.all()
+        _, cursor = keyset_page(qs, "-nombre", 5)
+        with CaptureQueriesContext(connection) as queries:
+            keyset_page(qs, "-nombre", 5, cursor=cursor)
+        where = queries[0]["sql"].split("WHERE", 1)[1]
+        # nombre <= v AND (nombre < v OR id < x)
+        self.assertRegex(where, r'"nombre" <= .* AND \(.*"nombre" < .* OR .*"id" < ')
+
+    def test_cursor_is_bound_to_ordering(self):
+        _, cursor = keyset_page(InformeDataUsers.objects.all(), "nombre", 5)
+        with self.assertRaises(InvalidCursor):
+            keyset_page(InformeDataUsers.objects.all(), "email", 5, cursor=cursor)
+        with self.assertRaises(InvalidCursor):
+            keyset_page(InformeDataUsers.objects.all(), "nombre", 5, cursor="no-es-un-cursor")
+
+    def test_api_cursor_mode(self):
+        resp = self.client.get("/api/results/report/users/", {"cursor": "", "page_size": 20, "ordering": "nombre"})
+        self.assertEqual(resp.status_code, 200)
+        body = resp.json()
+        self.assertEqual(len(body["results"]), 20)
+        self.assertTrue(body["next_cursor"])
+
+        resp = self.client.get("/api/results/report/users/", {"cursor": "???", "ordering": "nombre"})
+        self.assertEqual(resp.status_code, 400)
+
+
+# =========================
+# Listado de evaluaciones: ?include=
+# =========================
+class EvaluationListIncludeTests(TestCase):
+    def test_aliases_of_the_same_relation(self):
+        create_evaluation_with_runs()
+
+        resp = self.client.get("/api/results/", {"include": "runs,prompt_runs,criteria,runs"})
+        self.assertEqual(resp.status_code, 200)
+        row = resp.json()["results"][0]
+        self.assertEqual(len(row["prompt_runs"]), len(PHASE1_TEXTS) + 2 * len(PHASE2_TEXTS))
+        self.assertEqual(len(row["criteria"]), 2)
+        self.assertEqual(len(row["prompt_runs"][0]["items"]), 5)
+
+    def test_without_include_only_counts(self):
+        create_evaluation_with_runs()
+
+        resp = self.client.get("/api/results/")
+        self.assertEqual(resp.status_code, 200)
+        row = resp.json()["results"][0]
+        self.assertNotIn("prompt_runs", row)
+        self.assertEqual(row["criteria_count"], 2)
+
+
+# =========================
+# RankingItem: claves normalizadas
+# =========================
+class RankingItemKeysTests(TestCase):
+    def test_keys_follow_brand_and_model_on_save(self):
+        evaluation = Evaluation.objects.create(product_type="zapatillas")
+        run = PromptRun.objects.create(evaluation=evaluation, phase="PHASE1", prompt_text="p")
+        item = RankingItem.objects.create(prompt_run=run, position=1, brand="NIKE ", model="Pegasus 41", raw_text="x")
+        self.assertEqual((item.brand_key, item.model_key), ("nike", "pegasus 41"))
+
+        item.brand = "Adidas"
+        item.save()
+        item.refresh_from_db()
+        self.assertEqual(item.brand_key, "adidas")
+
+        item.model = "Boston 12"
+        item.save(update_fields=["model"])
+        item.refresh_from_db()
+        self.assertEqual(item.model_key, "boston 12")
+
+
+# =========================
+# Log de intentos
+# =========================
+class JsonlSinkTests(SimpleTestCase):
+    def test_short_writes_are_completed(self):
+        real_write = os.write
+
+        def short_write(fd, data):
+            # como un write() interrumpido: nunca más de 7 bytes por llamada
+            return real_write(fd, bytes(data[:7]))
+
+        records = [{"prompt": f"p{i}", "output_text": "ranking[5]: ñ,b,c,d,e"} for i in range(3)]
+        with tempfile.TemporaryDirectory() as tmp:
+            sink = JsonlSink(os.path.join(tmp, "attempts.jsonl"))
+            with mock.patch("apps.results.utils.attempt_log.os.write", side_effect=short_write):
+                sink.write_many(records)
+            self.assertEqual(list(sink.read()), records)
+
+    def test_base_sink_is_abstract(self):
+        with self.assertRaises(TypeError):
+            AttemptLogSink()
+
+
+# =========================
+# Progreso: stream SSE (sync / async) y polling
+# =========================
+class EvaluationProgressTests(TestCase):
+    def setUp(self):
+        self.evaluation = Evaluation.objects.create(product_type="zapatillas", status="PROCESSING")
+        self.events = [
+            EvaluationEvent.objects.create(evaluation=self.evaluation, kind=kind, payload=payload)
+            for kind, payload in [
+                ("start", {"total": 2, "resume": False}),
+                ("run", {"done": 1, "total": 2}),
+                ("run", {"done": 2, "total": 2}),
+                ("complete", {"status": "SUCCESS", "completed_at": None}),
+            ]
+        ]
+
+    def test_async_stream_matches_sync_stream(self):
+        async def collect():
+            return [chunk async for chunk in aiter_evaluation_events(self.evaluation.id, self.events[0].id)]
+
+        chunks = async_to_sync(collect)()
+        self.assertEqual(chunks, list(iter_evaluation_events(self.evaluation.id, self.events[0].id)))
+        self.assertEqual(len(chunks), 4)
+        self.assertTrue(chunks[-1].startswith(f"id: {self.events[-1].id}\nevent: complete"))
+
+    def test_polling_endpoint(self):
+        url = f"/api/results/{self.evaluation.uuid}/progress/"
+
+        data = self.client.get(url, {"last_event_id": self.events[0].id}).json()
+        self.assertEqual([e["kind"] for e in data["events"]], ["run", "run", "complete"])
+        self.assertEqual(data["last_event_id"], self.events[-1].id)
+        self.assertTrue(data["finished"])
+        self.assertEqual(data["status"], "SUCCESS")
+
+        EvaluationEvent.objects.filter(kind="complete").delete()
+        data = self.client.get(url, {"last_event_id": self.events[2].id}).json()
+        self.assertEqual(data, {"events": [], "last_event_id": self.events[2].id, "finished": False, "status": None})
+
+        self.assertEqual(self.client.get("/api/results/00000000-0000-0000-0000-000000000000/progress/").status_code, 404)
+
+
+# =========================
+# Caché de respuestas en el runner
+# =========================
+class RunnerCacheTests(TestCase):
+    def test_cache_is_resolved_on_the_calling_thread(self):
+        main = threading.current_thread()
+        specs = [{"phase": "PHASE1", "prompt": f"prompt {i}", "cache": True} for i in range(3)]
+        calls = []
+
+        def fake_completion(prompt, **kwargs):
+            calls.append((prompt, kwargs["cache"]))
+            return RANKING_SAMPLES[0], [], parse_toon_ranking5(RANKING_SAMPLES[0])
+
+        real_store = response_cache.store
+        store_threads = []
+
+        def store(*args):
+            store_threads.append(threading.current_thread())
+            real_store(*args)
+
+        with mock.patch("apps.results.services.runner.completion_with_web_search", side_effect=fake_completion), \
+                mock.patch.object(response_cache, "store", side_effect=store):
+            first = run_prompts(specs, concurrency=3, mode="threads")
+            second = run_prompts(specs, concurrency=3, mode="threads")
+
+        self.assertEqual(sorted(calls), [(f"prompt {i}", False) for i in range(3)])
+        self.assertEqual(store_threads, [main] * 3)
+        self.assertEqual(CompletionCacheEntry.objects.count(), 3)
+        self.assertEqual(second, first)
@@ -0,0 +1,349 @@
+"""
+Log de intentos de web_search (antes: websearch_logs.xlsx reescrito en cada llamada).
+
+- log_attempt() solo encola: el hilo de la llamada nunca espera al disco.
+- Un hilo de fondo vacía la cola por lotes en un sink append-only:
+    "jsonl"  -> una línea JSON por intento (O_APPEND, seguro entre procesos)
+    "sqlite" -> tabla `attempts` en un fichero SQLite (WAL)
+    "none"   -> desactivado
+- El Excel se genera solo bajo demanda (manage.py export_attempt_log).
+
+Configuración en settings.OPENAI_ATTEMPT_LOG.
+"""
+import atexit
+import json
+from abc import ABC, abstractmethod
+import logging
+import os
+import queue
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONFIG = {
+    "BACKEND": "jsonl",
+    "PATH": "websearch_logs.jsonl",
+    "QUEUE_SIZE": 10_000,
+}
+BATCH_SIZE = 200
+
+# mismo orden de columnas que tenía el Excel
+FIELDS = [
+    "timestamp",
+    "model",
+    "phase",
+    "criterion",
+    "evaluation_uuid",
+    "attempt",
+    "elapsed_seconds",
+    "toon_valid",
+    "prompt",
+    "output_text",
+    "sources",
+]
+
+
+# -------------------------
+# Sinks
+# -------------------------
+class AttemptLogSink(ABC):
+    """Interfaz: write_many() añade registros, read() los devuelve en orden."""
+
+    @abstractmethod
+    def write_many(self, records: List[Dict]) -> None:
+        ...
+
+    @abstractmethod
+    def read(self) -> Iterator[Dict]:
+        ...
+
+    def close(self) -> None:
+        pass
+
+
+class NullSink(AttemptLogSink):
+    def write_many(self, records):
+        pass
+
+    def read(self):
+        return iter(())
+
+
+class JsonlSink(AttemptLogSink):
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def write_many(self, records):
+        data = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records)
+        payload = memoryview(data.encode("utf-8"))
+        # una write() por lote con O_APPEND: las líneas de otros procesos no se mezclan;
+        # si el kernel escribe menos bytes (señal, disco casi lleno) se completa el resto
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            while payload:
+                written = os.write(fd, payload)
+                payload = payload[written:]
+        finally:
+            os.close(fd)
+
+    def read(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as fh:
+            for line in fh:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # línea cortada (proceso muerto a mitad de write)
+                    continue
+
+
+class SqliteSink(AttemptLogSink):
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = None
+
+    def _connect(self):
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            columns = ", ".join(f"{f} TEXT" for f in FIELDS)
+            conn.execute(f"CREATE TABLE IF NOT EXISTS attempts (id INTEGER PRIMARY KEY, {columns})")
+            self._conn = conn
+        return self._conn
+
+    def write_many(self, records):
+        conn = self._connect()
+        placeholders = ", ".join("?" for _ in FIELDS)
+        with conn:
+            conn.executemany(
+                f"INSERT INTO attempts ({', '.join(FIELDS)}) VALUES ({placeholders})",
+                [[json.dumps(r.get(f)) if f == "sources" else r.get(f) for f in FIELDS] for r in records],
+            )
+
+    def read(self):
+        if not os.path.exists(self.path):
+            return
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            for row in conn.execute(f"SELECT {', '.join(FIELDS)} FROM attempts ORDER BY id"):
+                record = dict(zip(FIELDS, row))
+                try:
+                    record["sources"] = json.loads(record["sources"] or "[]")
+                except ValueError:
+                    record["sources"] = []
+                yield record
+        finally:
+            conn.close()
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+SINKS = {
+    "jsonl": JsonlSink,
+    "sqlite": SqliteSink,
+}
+
+
+def get_config() -> dict:
+    from django.conf import settings
+
+    return {**DEFAULT_CONFIG, **(getattr(settings, "OPENAI_ATTEMPT_LOG", {}) or {})}
+
+
+def build_sink(backend: Optional[str] = None, path: Optional[str] = None) -> AttemptLogSink:
+    config = get_config()
+    backend = (backend or config["BACKEND"] or "").strip().lower()
+    sink_class = SINKS.get(backend)
+    if sink_class is None:
+        return NullSink()
+    return sink_class(str(path or config["PATH"]))
+
+
+# -------------------------
+# Escritor en segundo plano
+# -------------------------
+class AttemptLogWriter:
+    """
+    Cola + hilo daemon. put() no bloquea nunca: si la cola está llena
+    (disco muy lento) el registro se descarta con un warning.
+    """
+
+    def __init__(self, sink: AttemptLogSink, queue_size: int = DEFAULT_CONFIG["QUEUE_SIZE"]):
+        self.sink = sink
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._run, name="attempt-log-writer", daemon=True)
+        self._thread.start()
+
+    def put(self, record: Dict) -> None:
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            logger.warning("[ATTEMPT LOG] cola llena, intento descartado")
+
+    def _run(self):
+        while True:
+            record = self._queue.get()
+            if record is None:
+                self._queue.task_done()
+                return
+
+            batch = [record]
+            stop = False
+            while len(batch) < BATCH_SIZE:
+                try:
+                    record = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if record is None:
+                    stop = True
+                    break
+                batch.append(record)
+
+            try:
+                self.sink.write_many(batch)
+            except Exception as e:
+                logger.warning(f"[ATTEMPT LOG] no se pudo escribir ({len(batch)} registros): {e}")
+            finally:
+                for _ in range(len(batch) + (1 if stop else 0)):
+                    self._queue.task_done()
+
+            if stop:
+                return
+
+    def flush(self) -> None:
+        """Espera a que todo lo encolado esté en disco."""
+        self._queue.join()
+
+    def close(self, timeout: float = 5.0) -> None:
+        if not self._thread.is_alive():
+            return
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout=timeout)
+        self.sink.close()
+
+
+_WRITER: Optional[AttemptLogWriter] = None
+_WRITER_LOCK = threading.Lock()
+
+
+def get_writer() -> AttemptLogWriter:
+    global _WRITER
+    with _WRITER_LOCK:
+        if _WRITER is None:
+            config = get_config()
+            _WRITER = AttemptLogWriter(build_sink(), int(config["QUEUE_SIZE"]))
+            atexit.register(_WRITER.close)
+        return _WRITER
+
+
+def log_attempt(
+    *,
+    model: str,
+    attempt: int,
+    elapsed: float,
+    toon_valid: bool,
+    prompt: str,
+    output_text: str,
+    sources: list[str],
+    phase: str = "",
+    criterion: str = "",
+    evaluation_uuid: str = "",
+) -> None:
+    """Encola un intento (no toca disco en el hilo que llama)."""
+    get_writer().put({
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "model": model,
+        "phase": phase,
+        "criterion": criterion,
+        "evaluation_uuid": evaluation_uuid,
+        "attempt": attempt,
+        "elapsed_seconds": float(elapsed),
+        "toon_valid": bool(toon_valid),
+        "prompt": prompt,
+        "output_text": output_text,
+        "sources": list(sources),
+    })
+
+
+# -------------------------
+# Export a Excel (bajo demanda)
+# -------------------------
+COLUMN_WIDTHS = {
+    "timestamp": 20,
+    "model": 14,
+    "phase": 10,
+    "criterion": 18,
+    "evaluation_uuid": 38,
+    "attempt": 8,
+    "elapsed_seconds": 14,
+    "toon_valid": 10,
+    "prompt": 70,
+    "output_text": 70,
+    "sources": 70,
+}
+
+
+def export_xlsx(records, path: str) -> int:
+    """
+    Escribe los intentos en un .xlsx con el mismo formato que el log antiguo.
+    Workbook write-only: memoria constante aunque haya miles de filas.
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Alignment, Font
+    from openpyxl.utils import get_column_letter
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("logs")
+
+    for idx, field in enumerate(FIELDS, start=1):
+        ws.column_dimensions[get_column_letter(idx)].width = COLUMN_WIDTHS[field]
+    ws.freeze_panes = "A2"
+
+    header = []
+    for field in FIELDS:
+        cell = WriteOnlyCell(ws, value=field)
+        cell.font = Font(bold=True)
+        cell.alignment = Alignment(vertical="center")
+        header.append(cell)
+    ws.append(header)
+
+    count = 0
+    for record in records:
+        ws.append([
+            record.get("timestamp"),
+            record.get("model"),
+            record.get("phase"),
+            record.get("criterion"),
+            record.get("evaluation_uuid"),
+            record.get("attempt"),
+            record.get("elapsed_seconds"),
+            "YES" if record.get("toon_valid") in (True, 1, "1", "YES") else "NO",
+            record.get("prompt"),
+            record.get("output_text"),
+            " | ".join(record.get("sources") or []),
+        ])
+        count += 1
+
+    ws.auto_filter.ref = f"A1:{get_column_letter(len(FIELDS))}{count + 1}"
+    wb.save(path)
+    return count
@@ -1,14 +1,21 @@
 import os
 import time
+import asyncio
 import logging
-from datetime import datetime
+from asgiref.sync import sync_to_async
 from dotenv import load_dotenv
-from openai import OpenAI
-from toon_format import decode
-
-from openpyxl import Workbook, load_workbook
-from openpyxl.utils import get_column_letter
-from openpyxl.styles import Font, Alignment
+from openai import (
+    OpenAI,
+    AsyncOpenAI,
+    APIConnectionError,
+    APITimeoutError,
+    InternalServerError,
+    RateLimitError,
+)
+from apps.results.services.parse_ranking import parse_toon_ranking5
+from apps.results.utils import response_cache
+from apps.results.utils.attempt_log import log_attempt
+from apps.results.utils.rate_limiter import get_rate_limiter
 
 load_dotenv()
 
@@ -32,103 +39,19 @@ if not logger.handlers:
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 DEFAULT_MODEL = "gpt-4o-mini"
 
+# Errores de red/servidor que merece la pena reintentar (versión async)
+TRANSIENT_ERRORS = (APIConnectionError, APITimeoutError, InternalServerError)
 
-# -------------------------
-# Excel helpers
-# -------------------------
-DEFAULT_XLSX_PATH = "websearch_logs.xlsx"
-
-HEADERS = [
-    "timestamp",
-    "model",
-    "phase",
-    "criterion",
-    "evaluation_uuid",
-    "attempt",
-    "elapsed_seconds",
-    "toon_valid",
-    "prompt",
-    "output_text",
-    "sources",
-]
-
-def ensure_workbook(path: str) -> tuple[Workbook, any]:
-    """Crea o abre el Excel y asegura header + estilos."""
-    if os.path.exists(path):
-        wb = load_workbook(path)
-        ws = wb.active
-    else:
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "logs"
-        ws.append(HEADERS)
-
-        # estilo header
-        header_font = Font(bold=True)
-        for col_idx in range(1, len(HEADERS) + 1):
-            cell = ws.cell(row=1, column=col_idx)
-            cell.font = header_font
-            cell.alignment = Alignment(vertical="center")
-
-        # anchos razonables
-        widths = {
-            "A": 20,  # timestamp
-            "B": 14,  # model
-            "C": 10,  # phase
-            "D": 18,  # criterion
-            "E": 38,  # evaluation_uuid
-            "F": 8,   # attempt
-            "G": 14,  # elapsed
-            "H": 10,  # valid
-            "I": 70,  # prompt
-            "J": 70,  # output
-            "K": 70,  # sources
-        }
-        for col_letter, w in widths.items():
-            ws.column_dimensions[col_letter].width = w
-
-        ws.freeze_panes = "A2"
-        ws.auto_filter.ref = ws.dimensions
-
-    return wb, ws
-
-def append_log_row(
-    xlsx_path: str,
-    *,
-    model: str,
-    attempt: int,
-    elapsed: float,
-    toon_valid: bool,
-    prompt: str,
-    output_text: str,
-    sources: list[str],
-    phase: str = "",
-    criterion: str = "",
-    evaluation_uuid: str = "",
-):
-    wb, ws = ensure_workbook(xlsx_path)
-
-    ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    sources_str = " | ".join(sources)  # una celda
+# 429 que sobreviven a los reintentos del SDK: no cuentan como intento de TOON
+MAX_RATE_LIMIT_RETRIES = 5
 
-    ws.append([
-        ts,
-        model,
-        phase,
-        criterion,
-        evaluation_uuid,
-        attempt,
-        float(elapsed),
-        "YES" if toon_valid else "NO",
-        prompt,
-        output_text,
-        sources_str,
-    ])
 
-    # refresca autofiltro (por si crece)
-    ws.auto_filter.ref = ws.dimensions
-
-    wb.save(xlsx_path)
+def new_async_client() -> AsyncOpenAI:
+    """
+    Cliente async nuevo. El pool httpx queda ligado al event loop donde se usa,
+    así que cada orquestador (asyncio.run) crea el suyo y lo cierra al terminar.
+    """
+    return AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
 
 # -------------------------
@@ -156,16 +79,101 @@ def _extract_sources(res) -> list[str]:
 
     return list(dict.fromkeys(sources))[:10]
 
-def _is_valid_toon_ranking5(output_text: str) -> bool:
+def _inspect_response(res, elapsed: float) -> tuple[str, list[str], list[dict] | None]:
+    output_text = _clean_output_text(res.output_text)
+    sources = _extract_sources(res)
+
+    # ✅ valida y parsea en una sola pasada (None -> TOON inválido)
+    parsed = parse_toon_ranking5(output_text)
+    valid = parsed is not None
+
+    logger.debug(f"[OUTPUT RAW] {output_text[:400]}...")
+    logger.debug(f"[TIME] {elapsed}s")
+    logger.debug(f"[SOURCES] {len(sources)} found")
+    logger.debug(f"[TOON VALID] {valid}")
+
+    return output_text, sources, parsed
+
+
+def cached_result(cached):
+    """Hit de caché -> mismo formato que una llamada: (text, sources, parsed)."""
+    output_text, sources = cached
+    return output_text, sources, parse_toon_ranking5(output_text)
+
+
+# -------------------------
+# Llamada con rate limit
+# -------------------------
+def _usage_tokens(res):
+    usage = getattr(res, "usage", None)
+    return getattr(usage, "total_tokens", None)
+
+
+def _rate_limit_delay(error: RateLimitError, retry: int) -> float:
+    """Retry-After del proveedor si viene; si no, backoff exponencial."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
     try:
-        decoded = decode(output_text)
-        return (
-            "ranking" in decoded
-            and isinstance(decoded["ranking"], list)
-            and len(decoded["ranking"]) == 5
-        )
-    except Exception:
-        return False
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000.0
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        pass
+    return min(2 ** retry, 30)
+
+
+def _create_response(prompt: str, model: str):
+    """
+    responses.create respetando el limiter compartido del nodo (RPM/TPM +
+    llamadas en vuelo). Un 429 frena a todos los procesos y se reintenta.
+    """
+    limiter = get_rate_limiter(model)
+    estimated = limiter.estimate_tokens(prompt)
+
+    for retry in range(MAX_RATE_LIMIT_RETRIES + 1):
+        limiter.acquire(estimated)
+        with limiter.slot():
+            try:
+                res = client.responses.create(
+                    model=model,
+                    input=prompt,
+                    tools=[{"type": "web_search", "search_context_size": "low"}],
+                )
+            except RateLimitError as e:
+                if retry >= MAX_RATE_LIMIT_RETRIES:
+                    raise
+                delay = _rate_limit_delay(e, retry + 1)
+                limiter.penalize(delay)
+                logger.warning(f"[RATE LIMIT] 429 de OpenAI, pausa de {delay:.1f}s")
+                continue
+
+        limiter.record_usage(estimated, _usage_tokens(res))
+        return res
+
+
+async def _acreate_response(async_client: AsyncOpenAI, prompt: str, model: str):
+    limiter = get_rate_limiter(model)
+    estimated = limiter.estimate_tokens(prompt)
+
+    for retry in range(MAX_RATE_LIMIT_RETRIES + 1):
+        await limiter.aacquire(estimated)
+        async with limiter.aslot():
+            try:
+                res = await async_client.responses.create(
+                    model=model,
+                    input=prompt,
+                    tools=[{"type": "web_search", "search_context_size": "low"}],
+                )
+            except RateLimitError as e:
+                if retry >= MAX_RATE_LIMIT_RETRIES:
+                    raise
+                delay = _rate_limit_delay(e, retry + 1)
+                await asyncio.to_thread(limiter.penalize, delay)
+                logger.warning(f"[RATE LIMIT] 429 de OpenAI, pausa de {delay:.1f}s")
+                continue
+
+        await asyncio.to_thread(limiter.record_usage, estimated, _usage_tokens(res))
+        return res
 
 
 def completion_with_web_search(
@@ -173,16 +181,28 @@ def completion_with_web_search(
     model: str = DEFAULT_MODEL,
     max_retries: int = 2,
     *,
-    xlsx_path: str = DEFAULT_XLSX_PATH,
     phase: str = "",
     criterion: str = "",
     evaluation_uuid: str = "",
+    cache: bool | None = None,
+    cache_variant: str = "",
 ):
     """
     ✅ web_search + logs + retry
-    ✅ guarda CADA intento en Excel (para pruebas)
+    ✅ rate limit compartido por modelo (RPM/TPM/concurrencia) + 429
+    ✅ guarda CADA intento en el log de intentos (Excel bajo demanda)
+    ✅ caché opt-in (cache=None -> settings.OPENAI_RESPONSE_CACHE); solo TOON válido
+      (run_prompts la resuelve en el hilo principal y llama con cache=False)
+    ✅ devuelve (output_text, sources, parsed); parsed = items del ranking o None
     """
 
+    cache_key = None
+    if response_cache.is_enabled(cache):
+        cache_key = response_cache.make_key(model, prompt, cache_variant)
+        cached = response_cache.lookup(cache_key)
+        if cached is not None:
+            return cached_result(cached)
+
     last_output_text = ""
     last_sources: list[str] = []
 
@@ -194,27 +214,15 @@ def completion_with_web_search(
         logger.debug(f"[WEBSEARCH] Model: {model}")
         logger.debug(f"[PROMPT PREVIEW] {prompt[:250]}...")
 
-        res = client.responses.create(
-            model=model,
-            input=prompt,
-            tools=[{"type": "web_search", "search_context_size": "low"}],
-        )
+        res = _create_response(prompt, model)
 
         elapsed = round(time.time() - start, 2)
 
-        output_text = _clean_output_text(res.output_text)
-        sources = _extract_sources(res)
-
-        valid = _is_valid_toon_ranking5(output_text)
+        output_text, sources, parsed = _inspect_response(res, elapsed)
+        valid = parsed is not None
 
-        logger.debug(f"[OUTPUT RAW] {output_text[:400]}...")
-        logger.debug(f"[TIME] {elapsed}s")
-        logger.debug(f"[SOURCES] {len(sources)} found")
-        logger.debug(f"[TOON VALID] {valid}")
-
-        # ✅ guarda SIEMPRE el intento en Excel
-        append_log_row(
-            xlsx_path,
+        # ✅ guarda SIEMPRE el intento (cola -> sink en segundo plano)
+        log_attempt(
             model=model,
             attempt=attempt,
             elapsed=elapsed,
@@ -231,10 +239,106 @@ def completion_with_web_search(
         last_sources = sources
 
         if valid:
-            return output_text, sources
+            if cache_key:
+                response_cache.store(cache_key, model, output_text, sources)
+            return output_text, sources, parsed
 
         logger.warning("[RETRYING] TOON inválido, intentando de nuevo...")
         time.sleep(1)
 
     logger.error("[FAILED] No se obtuvo TOON válido tras varios intentos")
-    return last_output_text, last_sources
+    return last_output_text, last_sources, None
+
+
+# -------------------------
+# Async (AsyncOpenAI)
+# -------------------------
+def _retry_delay(attempt: int) -> float:
+    # backoff exponencial: 1s, 2s, 4s... (máx 20s)
+    return min(2 ** (attempt - 1), 20)
+
+
+async def acompletion_with_web_search(
+    prompt: str,
+    model: str = DEFAULT_MODEL,
+    max_retries: int = 2,
+    *,
+    async_client: AsyncOpenAI | None = None,
+    phase: str = "",
+    criterion: str = "",
+    evaluation_uuid: str = "",
+    cache: bool | None = None,
+    cache_variant: str = "",
+):
+    """
+    ✅ Igual que completion_with_web_search pero sin bloquear un hilo por llamada.
+    ✅ Reintenta TOON inválido y errores transitorios (red/timeout/5xx).
+    ✅ La caché (ORM) se consulta vía sync_to_async.
+    """
+    cache_key = None
+    if response_cache.is_enabled(cache):
+        cache_key = response_cache.make_key(model, prompt, cache_variant)
+        cached = await sync_to_async(response_cache.lookup)(cache_key)
+        if cached is not None:
+            return cached_result(cached)
+
+    owns_client = async_client is None
+    if owns_client:
+        async_client = new_async_client()
+
+    last_output_text = ""
+    last_sources: list[str] = []
+
+    try:
+        for attempt in range(1, max_retries + 2):
+            start = time.time()
+
+            logger.debug("=" * 60)
+            logger.debug(f"[WEBSEARCH ASYNC] Attempt {attempt}")
+            logger.debug(f"[WEBSEARCH ASYNC] Model: {model}")
+            logger.debug(f"[PROMPT PREVIEW] {prompt[:250]}...")
+
+            try:
+                res = await _acreate_response(async_client, prompt, model)
+            except TRANSIENT_ERRORS as e:
+                if attempt > max_retries:
+                    raise
+                logger.warning(f"[RETRYING] Error transitorio ({type(e).__name__}): {e}")
+                await asyncio.sleep(_retry_delay(attempt))
+                continue
+
+            elapsed = round(time.time() - start, 2)
+
+            output_text, sources, parsed = _inspect_response(res, elapsed)
+            valid = parsed is not None
+
+            # ✅ guarda SIEMPRE el intento (solo encola, no bloquea el loop)
+            log_attempt(
+                model=model,
+                attempt=attempt,
+                elapsed=elapsed,
+                toon_valid=valid,
+                prompt=prompt,
+                output_text=output_text,
+                sources=sources,
+                phase=phase,
+                criterion=criterion,
+                evaluation_uuid=evaluation_uuid,
+            )
+
+            last_output_text = output_text
+            last_sources = sources
+
+            if valid:
+                if cache_key:
+                    await sync_to_async(response_cache.store)(cache_key, model, output_text, sources)
+                return output_text, sources, parsed
+
+            logger.warning("[RETRYING] TOON inválido, intentando de nuevo...")
+            await asyncio.sleep(1)
+    finally:
+        if owns_client:
+            await async_client.close()
+
+    logger.error("[FAILED] No se obtuvo TOON válido tras varios intentos")
+    return last_output_text, last_sources, None
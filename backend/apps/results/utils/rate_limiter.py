@@ -0,0 +1,257 @@
+"""
+Rate limiter compartido para las llamadas a OpenAI.
+
+- Token bucket de peticiones/minuto (RPM) y tokens/minuto (TPM) por modelo.
+- Gobernador de concurrencia: como mucho N llamadas en vuelo por modelo.
+
+Todos los procesos del nodo (workers de gunicorn + run_evaluation_worker)
+coordinan a través de ficheros con flock en OPENAI_RATE_LIMIT_DIR.
+Sin fcntl (Windows) cae a un limitador en memoria, solo por proceso.
+"""
+import asyncio
+import json
+import logging
+import os
+import re
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LIMITS = {
+    "rpm": 500,
+    "tpm": 200_000,
+    "max_concurrency": 16,
+    # estimación previa por llamada (web_search mete bastante contexto);
+    # se corrige con el usage real al terminar
+    "tokens_per_call": 3_000,
+}
+DEFAULT_STATE_DIR = "/tmp/goaiso-ratelimit"
+SLOT_POLL_SECONDS = 0.05
+
+
+def _safe_name(name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", name) or "default"
+
+
+# -------------------------
+# Estado compartido
+# -------------------------
+class _FileState:
+    """Estado JSON en un fichero; cada transacción va bajo flock exclusivo."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    @contextmanager
+    def transaction(self):
+        with open(self.path, "a+", encoding="utf-8") as fh:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                fh.seek(0)
+                raw = fh.read()
+                try:
+                    state = json.loads(raw) if raw else {}
+                except ValueError:
+                    state = {}
+
+                yield state
+
+                fh.seek(0)
+                fh.truncate()
+                fh.write(json.dumps(state))
+                fh.flush()
+            finally:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+class _MemoryState:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = {}
+
+    @contextmanager
+    def transaction(self):
+        with self._lock:
+            yield self._state
+
+
+class _FileSlots:
+    """N ficheros de lock: tener uno bloqueado = tener una llamada en vuelo.
+    Si el proceso muere, el kernel libera el lock solo."""
+
+    def __init__(self, directory: str, name: str, limit: int):
+        self.paths = [os.path.join(directory, f"{name}.slot{i}") for i in range(limit)]
+
+    def try_acquire(self):
+        for path in self.paths:
+            fh = open(path, "a+")
+            try:
+                fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return fh
+            except OSError:
+                fh.close()
+        return None
+
+    def release(self, handle):
+        try:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+        finally:
+            handle.close()
+
+
+class _MemorySlots:
+    def __init__(self, limit: int):
+        self._sem = threading.BoundedSemaphore(limit)
+
+    def try_acquire(self):
+        return True if self._sem.acquire(blocking=False) else None
+
+    def release(self, handle):
+        self._sem.release()
+
+
+# -------------------------
+# Limiter
+# -------------------------
+class RateLimiter:
+    """
+    Token bucket con reserva: cada llamada descuenta 1 petición y sus tokens
+    estimados aunque el bucket quede en negativo, y espera lo que tarde en
+    reponerse. Así las esperas se reparten en orden entre procesos y no hay
+    ráfagas al vencer el minuto.
+    """
+
+    def __init__(self, name: str, limits: dict, state_dir: str = DEFAULT_STATE_DIR):
+        self.name = _safe_name(name)
+        self.rpm = float(limits.get("rpm") or 0)
+        self.tpm = float(limits.get("tpm") or 0)
+        self.max_concurrency = int(limits.get("max_concurrency") or 0)
+        self.tokens_per_call = int(limits.get("tokens_per_call") or DEFAULT_LIMITS["tokens_per_call"])
+
+        if fcntl is not None:
+            os.makedirs(state_dir, exist_ok=True)
+            self._state = _FileState(os.path.join(state_dir, f"{self.name}.bucket"))
+            self._slots = _FileSlots(state_dir, self.name, self.max_concurrency) if self.max_concurrency else None
+        else:
+            self._state = _MemoryState()
+            self._slots = _MemorySlots(self.max_concurrency) if self.max_concurrency else None
+
+    # ---- tokens ----
+    def estimate_tokens(self, prompt: str) -> int:
+        # ~4 caracteres por token + salida/contexto de web_search
+        return len(prompt or "") // 4 + self.tokens_per_call
+
+    def _refill(self, state: dict, now: float):
+        elapsed = max(0.0, now - state.get("ts", now))
+        state["ts"] = now
+        if self.rpm:
+            state["req"] = min(self.rpm, state.get("req", self.rpm) + elapsed * self.rpm / 60.0)
+        if self.tpm:
+            state["tok"] = min(self.tpm, state.get("tok", self.tpm) + elapsed * self.tpm / 60.0)
+
+    def reserve(self, tokens: int) -> float:
+        """Reserva capacidad y devuelve los segundos que hay que esperar."""
+        if not self.rpm and not self.tpm:
+            return 0.0
+
+        now = time.time()
+        with self._state.transaction() as state:
+            self._refill(state, now)
+            wait = max(0.0, state.get("blocked_until", 0.0) - now)
+
+            if self.rpm:
+                state["req"] -= 1
+                if state["req"] < 0:
+                    wait = max(wait, -state["req"] * 60.0 / self.rpm)
+            if self.tpm:
+                state["tok"] -= min(tokens, self.tpm)
+                if state["tok"] < 0:
+                    wait = max(wait, -state["tok"] * 60.0 / self.tpm)
+
+        return wait
+
+    def record_usage(self, estimated: int, actual) -> None:
+        """Corrige el bucket de tokens con el usage real de la respuesta."""
+        if not self.tpm or not actual:
+            return
+        with self._state.transaction() as state:
+            self._refill(state, time.time())
+            state["tok"] -= actual - min(estimated, self.tpm)
+
+    def penalize(self, seconds: float) -> None:
+        """429 del proveedor: todo el nodo se frena `seconds`."""
+        if seconds <= 0:
+            return
+        with self._state.transaction() as state:
+            state["blocked_until"] = max(state.get("blocked_until", 0.0), time.time() + seconds)
+
+    def acquire(self, tokens: int) -> None:
+        wait = self.reserve(tokens)
+        if wait > 0:
+            logger.debug(f"[RATE LIMIT] {self.name}: esperando {wait:.2f}s")
+            time.sleep(wait)
+
+    async def aacquire(self, tokens: int) -> None:
+        wait = await asyncio.to_thread(self.reserve, tokens)
+        if wait > 0:
+            logger.debug(f"[RATE LIMIT] {self.name}: esperando {wait:.2f}s")
+            await asyncio.sleep(wait)
+
+    # ---- concurrencia ----
+    @contextmanager
+    def slot(self):
+        if self._slots is None:
+            yield
+            return
+        handle = self._slots.try_acquire()
+        while handle is None:
+            time.sleep(SLOT_POLL_SECONDS)
+            handle = self._slots.try_acquire()
+        try:
+            yield
+        finally:
+            self._slots.release(handle)
+
+    @asynccontextmanager
+    async def aslot(self):
+        if self._slots is None:
+            yield
+            return
+        handle = self._slots.try_acquire()
+        while handle is None:
+            await asyncio.sleep(SLOT_POLL_SECONDS)
+            handle = self._slots.try_acquire()
+        try:
+            yield
+        finally:
+            self._slots.release(handle)
+
+
+_LIMITERS = {}
+_LIMITERS_LOCK = threading.Lock()
+
+
+def get_rate_limiter(model: str) -> RateLimiter:
+    """
+    Limiter del modelo según settings.OPENAI_RATE_LIMITS[model]
+    (o la entrada "default"). Uno por proceso y modelo.
+    """
+    with _LIMITERS_LOCK:
+        limiter = _LIMITERS.get(model)
+        if limiter is None:
+            from django.conf import settings
+
+            configured = getattr(settings, "OPENAI_RATE_LIMITS", {}) or {}
+            limits = {**DEFAULT_LIMITS, **configured.get("default", {}), **configured.get(model, {})}
+            state_dir = getattr(settings, "OPENAI_RATE_LIMIT_DIR", DEFAULT_STATE_DIR)
+
+            limiter = RateLimiter(model, limits, state_dir)
+            _LIMITERS[model] = limiter
+        return limiter
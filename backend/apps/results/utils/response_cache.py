@@ -0,0 +1,242 @@
+"""
+Caché de respuestas de web_search (opt-in).
+
+- Clave: sha256(modelo + prompt normalizado + ventana de tiempo + variante).
+  La ventana (BUCKET_SECONDS) hace que "la misma pregunta el mismo día"
+  comparta respuesta y que al día siguiente se vuelva a buscar.
+- TTL por entrada + recorte LRU (last_used_at) a MAX_ENTRIES.
+- Backend en DB -> compartido por todos los workers / nodos.
+- Contadores diarios de hits/misses (CompletionCacheStats).
+- Solo se guardan respuestas con TOON válido.
+
+Configuración en settings.OPENAI_RESPONSE_CACHE.
+"""
+import hashlib
+import logging
+import re
+import time
+from datetime import timedelta
+from typing import Optional
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONFIG = {
+    "ENABLED": False,
+    "TTL_SECONDS": 24 * 3600,
+    "BUCKET_SECONDS": 24 * 3600,
+    "MAX_ENTRIES": 5000,
+    # Muestras repetidas del mismo prompt (PHASE2):
+    #   "bypass"     -> solo la primera muestra usa caché, el resto va a OpenAI
+    #   "per_sample" -> cada muestra tiene su propia entrada (diversidad intacta)
+    #   "shared"     -> todas las muestras comparten la misma respuesta
+    "SAMPLES": "bypass",
+}
+SAMPLE_MODES = ("bypass", "per_sample", "shared")
+
+# cada cuántas escrituras se recorta la tabla (expiradas + LRU)
+EVICT_EVERY = 50
+
+_WS_RE = re.compile(r"\s+")
+_writes = 0
+
+
+def get_config() -> dict:
+    return {**DEFAULT_CONFIG, **(getattr(settings, "OPENAI_RESPONSE_CACHE", {}) or {})}
+
+
+def is_enabled(override: Optional[bool] = None) -> bool:
+    """`override` (opción de la ejecución) manda sobre settings."""
+    if override is not None:
+        return bool(override)
+    return bool(get_config()["ENABLED"])
+
+
+def get_sample_mode(value: Optional[str] = None) -> str:
+    value = (value or get_config()["SAMPLES"] or "").strip().lower()
+    return value if value in SAMPLE_MODES else DEFAULT_CONFIG["SAMPLES"]
+
+
+def sample_policy(slot: Optional[int], mode: Optional[str] = None):
+    """
+    Para una muestra repetida (slot) devuelve (usar_cache, variante).
+    """
+    mode = get_sample_mode(mode)
+    slot = slot or 0
+
+    if mode == "per_sample":
+        return True, str(slot)
+    if mode == "shared":
+        return True, ""
+    return slot == 0, ""
+
+
+def normalize_prompt(prompt: str) -> str:
+    return _WS_RE.sub(" ", prompt or "").strip()
+
+
+def make_key(model: str, prompt: str, variant: str = "", now: Optional[float] = None) -> str:
+    bucket_seconds = max(1, int(get_config()["BUCKET_SECONDS"]))
+    bucket = int((now if now is not None else time.time()) // bucket_seconds)
+    raw = "\x1f".join([model, normalize_prompt(prompt), str(bucket), variant or ""])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+# -------------------------
+# Contadores
+# -------------------------
+def _count(field: str, n: int = 1):
+    from apps.results.api.models.index import CompletionCacheStats
+
+    if n <= 0:
+        return
+    try:
+        today = timezone.localdate()
+        updated = CompletionCacheStats.objects.filter(day=today).update(**{field: F(field) + n})
+        if not updated:
+            try:
+                with transaction.atomic():
+                    CompletionCacheStats.objects.create(day=today, **{field: n})
+            except IntegrityError:
+                # otro worker la creó a la vez
+                CompletionCacheStats.objects.filter(day=today).update(**{field: F(field) + n})
+    except Exception as e:
+        logger.warning(f"[CACHE] contador {field}: {e}")
+
+
+# -------------------------
+# Lectura / escritura
+# -------------------------
+def lookup(key: str):
+    """(output_text, sources) o None. Un hit refresca last_used_at (LRU)."""
+    from apps.results.api.models.index import CompletionCacheEntry
+
+    now = timezone.now()
+    try:
+        row = (
+            CompletionCacheEntry.objects.filter(key=key, expires_at__gt=now)
+            .values_list("id", "output_text", "sources")
+            .first()
+        )
+    except Exception as e:
+        logger.warning(f"[CACHE] lectura: {e}")
+        return None
+
+    if row is None:
+        _count("misses")
+        return None
+
+    entry_id, output_text, sources = row
+    CompletionCacheEntry.objects.filter(pk=entry_id).update(hits=F("hits") + 1, last_used_at=now)
+    _count("hits")
+    logger.debug(f"[CACHE HIT] {key[:12]}")
+    return output_text, list(sources or [])
+
+
+def lookup_many(keys) -> dict:
+    """
+    {key: (output_text, sources)} de las claves con entrada vigente.
+    Para el runner: 1 SELECT + 1 UPDATE por lote, en el hilo principal.
+    """
+    from apps.results.api.models.index import CompletionCacheEntry
+
+    keys = set(k for k in keys if k)
+    if not keys:
+        return {}
+
+    now = timezone.now()
+    try:
+        rows = list(
+            CompletionCacheEntry.objects.filter(key__in=keys, expires_at__gt=now)
+            .values_list("id", "key", "output_text", "sources")
+        )
+    except Exception as e:
+        logger.warning(f"[CACHE] lectura: {e}")
+        return {}
+
+    if rows:
+        CompletionCacheEntry.objects.filter(pk__in=[r[0] for r in rows]).update(
+            hits=F("hits") + 1, last_used_at=now
+        )
+    _count("hits", len(rows))
+    _count("misses", len(keys) - len(rows))
+    logger.debug(f"[CACHE] {len(rows)}/{len(keys)} hits")
+    return {key: (output_text, list(sources or [])) for _, key, output_text, sources in rows}
+
+
+def store(key: str, model: str, output_text: str, sources: list[str]) -> None:
+    from apps.results.api.models.index import CompletionCacheEntry
+
+    global _writes
+
+    now = timezone.now()
+    ttl = max(1, int(get_config()["TTL_SECONDS"]))
+    try:
+        CompletionCacheEntry.objects.update_or_create(
+            key=key,
+            defaults={
+                "model": model,
+                "output_text": output_text,
+                "sources": sources,
+                "last_used_at": now,
+                "expires_at": now + timedelta(seconds=ttl),
+            },
+        )
+    except Exception as e:
+        logger.warning(f"[CACHE] escritura: {e}")
+        return
+
+    _writes += 1
+    if _writes % EVICT_EVERY == 1:
+        evict()
+
+
+def evict(max_entries: Optional[int] = None) -> int:
+    """Borra expiradas y, si sobran, las menos usadas recientemente."""
+    from apps.results.api.models.index import CompletionCacheEntry
+
+    max_entries = max_entries if max_entries is not None else int(get_config()["MAX_ENTRIES"])
+
+    deleted, _ = CompletionCacheEntry.objects.filter(expires_at__lte=timezone.now()).delete()
+
+    stale_ids = list(
+        CompletionCacheEntry.objects.order_by("-last_used_at", "-id")
+        .values_list("id", flat=True)[max_entries:]
+    )
+    if stale_ids:
+        deleted += CompletionCacheEntry.objects.filter(pk__in=stale_ids).delete()[0]
+
+    if deleted:
+        logger.debug(f"[CACHE] {deleted} entradas eliminadas")
+    return deleted
+
+
+def clear() -> int:
+    from apps.results.api.models.index import CompletionCacheEntry
+
+    return CompletionCacheEntry.objects.all().delete()[0]
+
+
+def stats(days: int = 7) -> dict:
+    from apps.results.api.models.index import CompletionCacheEntry, CompletionCacheStats
+
+    since = timezone.localdate() - timedelta(days=days - 1)
+    rows = list(
+        CompletionCacheStats.objects.filter(day__gte=since)
+        .order_by("day")
+        .values("day", "hits", "misses")
+    )
+    hits = sum(r["hits"] for r in rows)
+    misses = sum(r["misses"] for r in rows)
+
+    return {
+        "entries": CompletionCacheEntry.objects.count(),
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+        "days": [{**r, "day": r["day"].isoformat()} for r in rows],
+    }
@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/6.0/ref/settings/
 
 from pathlib import Path
 import os
+import sys
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -70,6 +71,95 @@ SECURE_PROXY_SSL_HEADER = ("HTTP_X_FORWARDED_PROTO", "https")
 ROOT_URLCONF = "backend.urls"
 FRONTEND_BASE_URL = "https://mvpgoaiso.com/assistant"
 
+# Nº máximo de llamadas web_search en vuelo por evaluación (1 = secuencial)
+EVALUATION_CONCURRENCY = int(os.environ.get("EVALUATION_CONCURRENCY", "5"))
+# "threads" (cliente OpenAI sync en un pool) | "async" (AsyncOpenAI + asyncio.gather)
+EVALUATION_EXECUTION_MODE = os.environ.get("EVALUATION_EXECUTION_MODE", "threads")
+
+# /run/ encola un job (202) y lo ejecuta `manage.py run_evaluation_worker`.
+# False -> se ejecuta dentro de la request (útil en local sin worker)
+EVALUATION_BACKGROUND_JOBS = os.environ.get("EVALUATION_BACKGROUND_JOBS", "True").lower() == "true"
+# Job RUNNING sin heartbeat durante este tiempo -> se re-encola (o FAILED)
+EVALUATION_JOB_STALE_SECONDS = int(os.environ.get("EVALUATION_JOB_STALE_SECONDS", "300"))
+EVALUATION_JOB_HEARTBEAT_SECONDS = int(os.environ.get("EVALUATION_JOB_HEARTBEAT_SECONDS", "30"))
+EVALUATION_JOB_MAX_ATTEMPTS = int(os.environ.get("EVALUATION_JOB_MAX_ATTEMPTS", "2"))
+
+# Rate limit OpenAI por modelo, compartido por todos los procesos del nodo
+# (ficheros con flock en OPENAI_RATE_LIMIT_DIR). rpm/tpm = 0 -> sin límite.
+OPENAI_RATE_LIMITS = {
+    "default": {
+        "rpm": int(os.environ.get("OPENAI_RPM", "500")),
+        "tpm": int(os.environ.get("OPENAI_TPM", "200000")),
+        "max_concurrency": int(os.environ.get("OPENAI_MAX_CONCURRENCY", "16")),
+        "tokens_per_call": int(os.environ.get("OPENAI_TOKENS_PER_CALL", "3000")),
+    },
+}
+OPENAI_RATE_LIMIT_DIR = os.environ.get("OPENAI_RATE_LIMIT_DIR", "/tmp/goaiso-ratelimit")
+
+# Log de intentos de web_search: append-only, escrito por un hilo de fondo.
+# BACKEND: jsonl | sqlite | none. Excel bajo demanda: manage.py export_attempt_log
+OPENAI_ATTEMPT_LOG = {
+    "BACKEND": os.environ.get("OPENAI_ATTEMPT_LOG_BACKEND", "jsonl"),
+    "PATH": os.environ.get("OPENAI_ATTEMPT_LOG_PATH", str(BASE_DIR / "logs" / "websearch_attempts.jsonl")),
+    "QUEUE_SIZE": int(os.environ.get("OPENAI_ATTEMPT_LOG_QUEUE_SIZE", "10000")),
+}
+
+# Caché de respuestas de web_search (opt-in, en DB -> compartida por workers).
+# SAMPLES: bypass (las muestras repetidas de PHASE2 van siempre a OpenAI)
+#          | per_sample (una entrada por muestra) | shared (misma respuesta)
+OPENAI_RESPONSE_CACHE = {
+    "ENABLED": os.environ.get("OPENAI_RESPONSE_CACHE", "False").lower() in ("1", "true", "yes"),
+    "TTL_SECONDS": int(os.environ.get("OPENAI_RESPONSE_CACHE_TTL", str(24 * 3600))),
+    "BUCKET_SECONDS": int(os.environ.get("OPENAI_RESPONSE_CACHE_BUCKET", str(24 * 3600))),
+    "MAX_ENTRIES": int(os.environ.get("OPENAI_RESPONSE_CACHE_MAX_ENTRIES", "5000")),
+    "SAMPLES": os.environ.get("OPENAI_RESPONSE_CACHE_SAMPLES", "bypass"),
+}
+
+# Stream SSE de progreso (/events/, servido por el proceso ASGI "events"): se
+# corta cada EVALUATION_EVENTS_MAX_SECONDS y el navegador reconecta con Last-Event-ID
+EVALUATION_EVENTS_MAX_SECONDS = int(os.environ.get("EVALUATION_EVENTS_MAX_SECONDS", "120"))
+EVALUATION_EVENTS_POLL_SECONDS = float(os.environ.get("EVALUATION_EVENTS_POLL_SECONDS", "1"))
+
+# ✅ Caché: "default" compartida entre procesos del nodo (fichero; se puede
+#    cambiar a DB -> DatabaseCache + createcachetable, o Redis -> RedisCache)
+#    y "local" en memoria por proceso delante (solo payloads inmutables).
+CACHES = {
+    "default": {
+        "BACKEND": os.environ.get("CACHE_BACKEND", "django.core.cache.backends.filebased.FileBasedCache"),
+        "LOCATION": os.environ.get("CACHE_LOCATION", "/tmp/goaiso-cache"),
+        "TIMEOUT": int(os.environ.get("CACHE_TIMEOUT", "3600")),
+        "OPTIONS": {"MAX_ENTRIES": int(os.environ.get("CACHE_MAX_ENTRIES", "5000"))},
+    },
+    "local": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "goaiso-local",
+        "TIMEOUT": int(os.environ.get("LOCAL_CACHE_TIMEOUT", "300")),
+        "OPTIONS": {"MAX_ENTRIES": int(os.environ.get("LOCAL_CACHE_MAX_ENTRIES", "500"))},
+    },
+}
+
+# Informe / detalle por evaluación (services/evaluation_cache.py)
+EVALUATION_CACHE_ALIAS = "default"
+EVALUATION_CACHE_LOCAL_ALIAS = "local"
+EVALUATION_CACHE_TIMEOUT = int(os.environ.get("EVALUATION_CACHE_TIMEOUT", "3600"))
+
+# PDF del informe (services/pdf_renderer.py): servicio render_server.js con pool
+# de Chromium caliente. Vacío -> un `node render_report_pdf.js` por petición.
+PDF_RENDERER_URL = os.environ.get("PDF_RENDERER_URL", "")
+PDF_RENDER_TIMEOUT = int(os.environ.get("PDF_RENDER_TIMEOUT", "150"))
+# "browser" (frontend + Chromium) | "native" (reportlab desde build_report); ?renderer= lo sobrescribe
+REPORT_PDF_RENDERER = os.environ.get("REPORT_PDF_RENDERER", "browser")
+
+# Caché de PDFs en MEDIA_ROOT/report_pdfs (services/pdf_cache.py).
+# X_ACCEL_REDIRECT: prefijo de la location interna de nginx ("" -> FileResponse)
+REPORT_PDF_CACHE = {
+    "ENABLED": os.environ.get("REPORT_PDF_CACHE_ENABLED", "True").lower() == "true",
+    "DIR": "report_pdfs",
+    "MAX_BYTES": int(os.environ.get("REPORT_PDF_CACHE_MAX_MB", "500")) * 1024 * 1024,
+    "MAX_AGE_DAYS": float(os.environ.get("REPORT_PDF_CACHE_MAX_AGE_DAYS", "30")),
+    "X_ACCEL_REDIRECT": os.environ.get("REPORT_PDF_X_ACCEL_REDIRECT", ""),
+}
+
 TEMPLATES = [
     {
         "BACKEND": "django.template.backends.django.DjangoTemplates",
@@ -110,6 +200,16 @@ DATABASES = {
     }
 }
 
+# `manage.py test` sin Postgres configurado -> SQLite (las migraciones solo
+# de PostgreSQL, como los índices trigram, no hacen nada ahí)
+if sys.argv[1:2] == ["test"] and not os.environ.get("POSTGRES_DB"):
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": BASE_DIR / "test_db.sqlite3",
+        }
+    }
+
 # Static/media
 STATIC_URL = "/static/"
 STATIC_ROOT = BASE_DIR / "staticfiles"
@@ -7,8 +7,10 @@ while ! nc -z db 5432; do
 done
 echo "Postgres is up."
 
-# Migraciones
-python manage.py migrate --noinput
+# Migraciones (solo el backend web; los workers arrancan con SKIP_MIGRATIONS=1)
+if [ "${SKIP_MIGRATIONS:-0}" != "1" ]; then
+  python manage.py migrate --noinput
+fi
 
 # Static
 python manage.py collectstatic --noinput || true
@@ -9,6 +9,102 @@ import UseCaseModal from "../../components/modals/useCaseModal";
 ========================= */
 const API_BASE_URL = process.env.NEXT_PUBLIC_API_URL;
 
+/* ✅ /run/ responde 202 y un worker ejecuta la evaluación:
+   seguimos el progreso por SSE (/events/) hasta el evento "complete".
+   Si el stream falla o se queda mudo (sin "ping" del servidor), pasamos a
+   polling de /progress/ desde el último evento recibido. */
+const STREAM_IDLE_MS = 45000;
+const POLL_INTERVAL_MS = 3000;
+const WAIT_MAX_MS = 30 * 60 * 1000;
+
+const waitForEvaluation = (
+  uuid: string,
+  onProgress?: (done: number, total: number) => void
+) =>
+  new Promise<void>((resolve, reject) => {
+    const startedAt = Date.now();
+    let lastEventId = 0;
+    let finished = false;
+    let idleTimer: ReturnType<typeof setTimeout> | undefined;
+
+    const es = new EventSource(`${API_BASE_URL}/api/results/${uuid}/events/`);
+
+    const finish = (status: string) => {
+      if (finished) return;
+      finished = true;
+      clearTimeout(idleTimer);
+      es.close();
+      if (status === "SUCCESS") resolve();
+      else reject(new Error("Error al ejecutar evaluación"));
+    };
+
+    const poll = async () => {
+      if (finished) return;
+      if (Date.now() - startedAt > WAIT_MAX_MS) {
+        finished = true;
+        reject(new Error("La evaluación está tardando demasiado"));
+        return;
+      }
+      try {
+        const res = await fetch(
+          `${API_BASE_URL}/api/results/${uuid}/progress/?last_event_id=${lastEventId}`
+        );
+        if (res.ok) {
+          const data = await res.json();
+          lastEventId = data.last_event_id;
+          for (const event of data.events) {
+            if (event.kind === "run") onProgress?.(event.data.done, event.data.total);
+          }
+          if (data.finished) return finish(data.status);
+        }
+      } catch {
+        // error de red puntual: se reintenta en el siguiente ciclo
+      }
+      setTimeout(poll, POLL_INTERVAL_MS);
+    };
+
+    const fallbackToPolling = () => {
+      if (finished) return;
+      clearTimeout(idleTimer);
+      es.close();
+      poll();
+    };
+
+    // el servidor manda "ping" cada 15s: sin señales -> stream roto
+    const touch = () => {
+      clearTimeout(idleTimer);
+      idleTimer = setTimeout(fallbackToPolling, STREAM_IDLE_MS);
+    };
+    touch();
+
+    const track = (e: Event) => {
+      const id = Number((e as MessageEvent).lastEventId);
+      if (id) lastEventId = id;
+      touch();
+    };
+
+    es.onopen = touch;
+    es.addEventListener("ping", touch);
+    es.addEventListener("start", track);
+
+    es.addEventListener("run", (e) => {
+      track(e);
+      const data = JSON.parse((e as MessageEvent).data);
+      onProgress?.(data.done, data.total);
+    });
+
+    es.addEventListener("complete", (e) => {
+      const data = JSON.parse((e as MessageEvent).data);
+      finish(data.status);
+    });
+
+    // CLOSED = el navegador no va a reconectar (404, 5xx, content-type
+    // incorrecto...). Si está reconectando, el idle timer decide.
+    es.onerror = () => {
+      if (es.readyState === EventSource.CLOSED) fallbackToPolling();
+    };
+  });
+
 /* =========================
    PAGE
 ========================= */
@@ -50,6 +146,7 @@ export default function Assistant() {
   const [loading, setLoading] = useState(false);
   const [step, setStep] = useState<"idle" | "creating" | "running">("idle");
   const [error, setError] = useState<string | null>(null);
+  const [progress, setProgress] = useState<{ done: number; total: number } | null>(null);
   const [useCaseOpen, setUseCaseOpen] = useState(false);
   const promptPreview = buildPromptES(product, features, country, location);
 
@@ -141,6 +238,9 @@ const handleCopyPrompt = async () => {
       if (!runRes.ok)
         throw new Error(runJson?.error || "Error al ejecutar evaluación");
 
+      if (runRes.status === 202)
+        await waitForEvaluation(uuid, (done, total) => setProgress({ done, total }));
+
       /* 3️⃣ REDIRECT */
       router.push(`/results/${uuid}`);
     } catch (err: any) {
@@ -171,6 +271,8 @@ const handleCopyPrompt = async () => {
                 <p className="loading-sub">
                   {step === "creating"
                     ? "Preparando criterios y generando prompts."
+                    : progress
+                    ? `Consultando web y calculando rankings (${progress.done}/${progress.total}).`
                     : "Consultando web y calculando rankings en tiempo real."}
                 </p>
               </div>